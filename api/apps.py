@@ -8,4 +8,9 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
+        from django.db.backends.signals import connection_created
+        from api.middleware import install_query_counter
+
+        # Compte les requêtes SQL de chaque thread pour MetricsMiddleware (vues sync et async)
+        connection_created.connect(install_query_counter, dispatch_uid="api_query_counter")
         logger.info("✅ Application API prête (modèle CLIP en attente)")
@@ -0,0 +1,210 @@
+"""
+Téléchargement asynchrone (httpx + asyncio) des images du catalogue
+
+Une seule boucle d'événements garde un pool de connexions keep-alive. Deux limites
+s'appliquent: une concurrence globale (saturer le lien) et une concurrence par hôte
+(ne pas marteler le CDN). Les corps sont reçus par morceaux, les erreurs réseau,
+429 et 5xx sont retentés avec un backoff exponentiel (Retry-After respecté).
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Mapping, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_PER_HOST_LIMIT = 8
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+CHUNK_SIZE = 64 * 1024
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RetryableStatusError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    status_code: int
+    headers: Mapping[str, str]  # httpx.Headers: lecture insensible à la casse (httpx met les noms en minuscules)
+    content: Optional[bytes]  # None quand le corps a été envoyé au sink
+    size: int
+    attempts: int
+    elapsed: float
+
+
+@dataclass
+class DownloadStats:
+    started_at: float = field(default_factory=time.perf_counter)
+    files: int = 0
+    bytes: int = 0
+    retries: int = 0
+    errors: int = 0
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.started_at, 1e-9)
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "errors": self.errors,
+            "elapsed": round(elapsed, 2),
+            "files_per_sec": round(self.files / elapsed, 1),
+            "mb_per_sec": round(self.bytes / elapsed / 1e6, 2),
+        }
+
+
+def _retry_after_seconds(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncImageDownloader:
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, transport=None):
+        """
+        Args:
+            max_concurrency: Téléchargements simultanés au total (et taille du pool de connexions)
+            per_host_limit: Téléchargements simultanés par hôte
+            timeout: Délai en secondes pour la connexion et chaque lecture
+            retries: Nouvelles tentatives après la première
+            backoff: Délai de base en secondes, doublé à chaque tentative (avec gigue)
+            transport: Transport httpx à la place du réseau (httpx.MockTransport dans les tests)
+        """
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        self.stats = DownloadStats()
+        self._client = None
+        self._global_limit = None
+        self._host_limits = {}
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            follow_redirects=True,
+            transport=self.transport,
+        )
+        self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        self._host_limits = {}
+        self.stats = DownloadStats()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+        self._client = None
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    def _delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, MAX_BACKOFF)
+        delay = self.backoff * 2 ** attempt
+        return min(delay * (0.5 + random.random() / 2), MAX_BACKOFF)
+
+    async def fetch(self, url, headers=None, sink=None) -> DownloadResult:
+        """
+        Télécharge une URL
+        Args:
+            headers: En-têtes supplémentaires (requêtes conditionnelles)
+            sink: Objet avec write(chunk) et reset() recevant le corps au fil de l'eau; sinon le corps est renvoyé
+        Raises:
+            httpx.HTTPError: Échec définitif (statut d'erreur ou réseau après toutes les tentatives)
+        """
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._global_limit, self._host_limit(url):
+                    result = await self._fetch_once(url, headers, sink)
+                result.attempts = attempt + 1
+                result.elapsed = time.perf_counter() - start
+                self.stats.files += 1
+                self.stats.bytes += result.size
+                return result
+            except (httpx.TransportError, RetryableStatusError) as e:
+                if attempt >= self.retries:
+                    self.stats.errors += 1
+                    if isinstance(e, RetryableStatusError):
+                        raise httpx.HTTPStatusError(str(e), request=httpx.Request("GET", url), response=httpx.Response(e.status_code)) from e
+                    raise
+                delay = self._delay(attempt, getattr(e, "retry_after", None))
+                self.stats.retries += 1
+                logger.warning(f"⚠️ {url}: {e.__class__.__name__} {e}, nouvel essai dans {delay:.1f}s")
+                if sink is not None:
+                    sink.reset()
+                await asyncio.sleep(delay)
+            except httpx.HTTPError:
+                self.stats.errors += 1
+                raise
+
+    async def _fetch_once(self, url, headers, sink):
+        async with self._client.stream("GET", url, headers=headers) as response:
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableStatusError(response.status_code, _retry_after_seconds(response.headers.get("Retry-After")))
+            if response.status_code != 304:
+                response.raise_for_status()
+
+            size = 0
+            chunks = [] if sink is None else None
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                size += len(chunk)
+                if sink is not None:
+                    sink.write(chunk)
+                else:
+                    chunks.append(chunk)
+            return DownloadResult(
+                url=url,
+                status_code=response.status_code,
+                headers=response.headers,
+                content=b"".join(chunks) if chunks is not None else None,
+                size=size,
+                attempts=1,
+                elapsed=0.0,
+            )
+
+
+class BackgroundDownloader:
+    """
+    Fait tourner un AsyncImageDownloader dans une boucle d'événements dédiée
+    Les threads du pipeline de précalcul y soumettent leurs coroutines et attendent le résultat.
+    """
+
+    def __init__(self, **downloader_options):
+        self.downloader = AsyncImageDownloader(**downloader_options)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-downloader", daemon=True)
+        self._thread.start()
+        self.run(self.downloader.__aenter__())
+
+    def run(self, coroutine, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def close(self):
+        self.run(self.downloader.__aexit__(None, None, None))
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
@@ -0,0 +1,175 @@
+"""
+Compare les vignettes (images.small) et les images pleine taille (images.large) comme source des features:
+octets téléchargés, temps de décodage et de prétraitement CLIP, et rappel de l'identification
+Le rappel est mesuré sur des photos simulées (perspective, flou, couleurs, JPEG) tirées de l'image large,
+cherchées dans un index d'embeddings construit à partir de chaque résolution.
+Utilisation: python api/benchmark_artwork_resolution.py [--catalog 200 | --images api/yolo11/test_image] [--queries 3] [--runs 3]
+"""
+import sys
+import os
+import time
+import random
+import argparse
+from io import BytesIO
+import django
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from api.image_cache import get_image_cache
+from api.models import Card
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+# Largeur des vignettes images.small de l'API Pokémon TCG
+SMALL_WIDTH = 245
+EMBED_BATCH_SIZE = 32
+
+
+def load_catalog_pairs(limit):
+    """Contenu brut (small, large) des cartes qui ont les deux URL, via le cache disque partagé du catalogue"""
+    cache = get_image_cache()
+    pairs = []
+    cards = Card.objects.exclude(image_url='').exclude(image_url_small='').order_by('id')[:limit]
+    for card in cards:
+        try:
+            small = cache.fetch(card.image_url_small).read_bytes()
+            large = cache.fetch(card.image_url).read_bytes()
+            pairs.append((str(card), small, large))
+        except Exception as e:
+            print(f"Erreur téléchargement {card}: {e}")
+    return pairs
+
+
+def load_folder_pairs(folder):
+    """Sans catalogue: la vignette est la grande image réduite à SMALL_WIDTH et réencodée en PNG"""
+    pairs = []
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        with open(os.path.join(folder, name), 'rb') as f:
+            large = f.read()
+        image = Image.open(BytesIO(large)).convert("RGB")
+        image.thumbnail((SMALL_WIDTH, image.height), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        pairs.append((name, buffer.getvalue(), large))
+    return pairs
+
+
+def simulate_photo(image, rng):
+    """Photo approximative d'une carte: perspective, légère rotation, fond, couleurs, flou et compression JPEG"""
+    width, height = image.size
+    image = image.resize((600, int(600 * height / width)), Image.BILINEAR)
+    width, height = image.size
+
+    margin = 0.08
+    quad = []
+    for x, y in ((0, 0), (0, height), (width, height), (width, 0)):
+        quad.extend((x + rng.uniform(-margin, margin) * width, y + rng.uniform(-margin, margin) * height))
+    image = image.transform((width, height), Image.QUAD, quad, Image.BILINEAR, fillcolor=(rng.randint(0, 255),) * 3)
+    image = image.rotate(rng.uniform(-6, 6), Image.BILINEAR, expand=False, fillcolor=(rng.randint(0, 255),) * 3)
+
+    image = ImageEnhance.Brightness(image).enhance(rng.uniform(0.7, 1.3))
+    image = ImageEnhance.Contrast(image).enhance(rng.uniform(0.7, 1.3))
+    image = ImageEnhance.Color(image).enhance(rng.uniform(0.7, 1.3))
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.0, 2.0)))
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=rng.randint(40, 85))
+    return Image.open(BytesIO(buffer.getvalue())).convert("RGB")
+
+
+def measure_decode(extractor, contents, runs):
+    """Meilleur temps total (s) sur runs passes: décodage, puis prétraitement CLIP des images décodées"""
+    decode_times, preprocess_times = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        images = [extractor.decode_image(content) for content in contents]
+        decode_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(0, len(images), EMBED_BATCH_SIZE):
+            extractor.clip_processor(images=images[i:i + EMBED_BATCH_SIZE], return_tensors="pt")
+        preprocess_times.append(time.perf_counter() - start)
+    return min(decode_times), min(preprocess_times), images
+
+
+def embed(extractor, images):
+    embeddings = []
+    for i in range(0, len(images), EMBED_BATCH_SIZE):
+        embeddings.extend(extractor.extract_clip_embeddings_batch(images[i:i + EMBED_BATCH_SIZE]))
+    return np.stack(embeddings).astype(np.float32)
+
+
+def recall_at(index, queries, labels, k):
+    """Proportion des requêtes dont la bonne carte est parmi les k plus proches (cosinus, embeddings normalisés)"""
+    scores = queries @ index.T
+    top_k = np.argsort(-scores, axis=1)[:, :k]
+    return float(np.mean([label in row for label, row in zip(labels, top_k)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vignettes contre images pleine taille pour le précalcul des features')
+    parser.add_argument('--catalog', type=int, default=0, help='Utiliser N cartes du catalogue (image_url et image_url_small)')
+    parser.add_argument('--images', type=str, default=os.path.join(os.path.dirname(__file__), 'yolo11', 'test_image'))
+    parser.add_argument('--queries', type=int, default=3, help='Photos simulées par carte')
+    parser.add_argument('--runs', type=int, default=3, help='Passes pour la mesure du décodage')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from precompute_features import OptimizedFeatureExtractor
+
+    extractor = OptimizedFeatureExtractor()
+    pairs = load_catalog_pairs(args.catalog) if args.catalog else load_folder_pairs(args.images)
+    if not pairs:
+        print("Aucune image à comparer")
+        return
+    print(f"{len(pairs)} cartes, {args.queries} photos simulées par carte\n")
+
+    rng = random.Random(args.seed)
+    results = {}
+    large_images = None
+    for resolution, position in (('small', 1), ('large', 2)):
+        contents = [pair[position] for pair in pairs]
+        decode_time, preprocess_time, images = measure_decode(extractor, contents, args.runs)
+        if resolution == 'large':
+            large_images = images
+        results[resolution] = {
+            'bytes': sum(len(content) for content in contents),
+            'pixels': sum(image.width * image.height for image in images),
+            'decode': decode_time,
+            'preprocess': preprocess_time,
+            'index': embed(extractor, images),
+        }
+
+    queries, labels = [], []
+    for label, image in enumerate(large_images):
+        for _ in range(args.queries):
+            queries.append(simulate_photo(image, rng))
+            labels.append(label)
+    query_embeddings = embed(extractor, queries)
+
+    count = len(pairs)
+    print(f"{'résolution':<12}{'Ko/carte':>10}{'Mpx/carte':>11}{'décodage ms':>13}{'prétrait. ms':>14}"
+          f"{'rappel@1':>10}{'rappel@5':>10}")
+    for resolution, result in results.items():
+        result['recall@1'] = recall_at(result['index'], query_embeddings, labels, 1)
+        result['recall@5'] = recall_at(result['index'], query_embeddings, labels, 5)
+        print(f"{resolution:<12}{result['bytes'] / count / 1024:>10.1f}{result['pixels'] / count / 1e6:>11.2f}"
+              f"{result['decode'] / count * 1000:>13.2f}{result['preprocess'] / count * 1000:>14.2f}"
+              f"{result['recall@1']:>10.1%}{result['recall@5']:>10.1%}")
+
+    small, large = results['small'], results['large']
+    agreement = float(np.mean(np.sum(small['index'] * large['index'], axis=1)))
+    print(f"\nVignettes: {large['bytes'] / small['bytes']:.1f}x moins d'octets, "
+          f"décodage {large['decode'] / small['decode']:.1f}x plus rapide, "
+          f"rappel@1 {small['recall@1'] - large['recall@1']:+.1%}")
+    print(f"Cosinus moyen entre l'embedding small et large d'une même carte: {agreement:.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Débit de l'import des cartes depuis le seed JSON: import groupé (api/card_ingestion.py) contre l'ancien import carte par carte
+Chaque mesure tourne dans une transaction annulée à la fin: la base n'est pas modifiée.
+Passes: import initial, réimport à l'identique, puis réimport avec 1% des entrées modifiées (import différentiel).
+Utilisation: python api/benchmark_card_import.py [--seed seeds/pokemon_cards_seed.json|.ndjson.gz] [--repeat 4] [--batch-size 500]
+"""
+import sys
+import os
+import time
+import argparse
+import django
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from django.db import connection, transaction
+from api.card_ingestion import CardIngestor, DEFAULT_BATCH_SIZE
+from api.models import Card, CardPrice, Set
+from pokemon.seed_io import find_seed, iter_seed
+
+DEFAULT_SEED = find_seed('pokemon_cards_seed')
+
+
+def load_seed(path, repeat):
+    """Entrées du seed, dupliquées repeat fois avec des numéros distincts pour grossir le jeu"""
+    cards_data = list(iter_seed(path))
+    copies = []
+    for copy in range(repeat):
+        for card_data in cards_data:
+            copies.append({**card_data, 'number': f"{card_data.get('number', '0')}-{copy}" if copy else card_data.get('number', '0')})
+    return copies
+
+
+def import_row_by_row(cards_data):
+    """L'ancien import: get_or_create du set, update_or_create de la carte et de son prix (CardPrice.save) par carte"""
+    parser = CardIngestor()
+    for card_data in cards_data:
+        card, (avg1, avg7, avg30) = parser.build(card_data)
+        set_obj, _ = Set.objects.get_or_create(code=card.set.code, defaults={
+            'title': card.set.title, 'tcg': 'pokemon', 'release_date': card.release_date,
+            'total_cards': 0, 'image_url': '', 'symbol_url': ''
+        })
+        card, _ = Card.objects.update_or_create(
+            set=set_obj,
+            number=card.number,
+            defaults={
+                'name': card.name,
+                'rarity': card.rarity,
+                'image_url': card.image_url,
+                'image_url_small': card.image_url_small,
+                'price': card.price,
+                'description': card.description,
+                'release_date': card.release_date
+            }
+        )
+        CardPrice.objects.update_or_create(
+            card=card,
+            defaults={'avg1': avg1, 'avg7': avg7, 'avg30': avg30, 'daily_price': {}}
+        )
+
+
+def import_batched(cards_data, batch_size, force=False):
+    CardIngestor(batch_size=batch_size, force=force).ingest(cards_data)
+
+
+def modify_some(cards_data, ratio=0.01):
+    """Copie des entrées avec le prix cardmarket avg1 changé pour une entrée sur 1/ratio"""
+    step = max(1, int(1 / ratio))
+    modified = []
+    for index, card_data in enumerate(cards_data):
+        if index % step == 0:
+            prices = dict((card_data.get('cardmarket') or {}).get('prices') or {})
+            prices['avg1'] = round(float(prices.get('avg1') or 0) + 1, 2)
+            card_data = {**card_data, 'cardmarket': {**(card_data.get('cardmarket') or {}), 'prices': prices}}
+        modified.append(card_data)
+    return modified
+
+
+def measure(label, function, cards_data):
+    """Importe, réimporte à l'identique puis avec 1% d'entrées modifiées, dans une transaction annulée"""
+    passes = (("import", cards_data), ("réimport", cards_data), ("1% modifié", modify_some(cards_data)))
+    query_count = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal query_count
+        query_count += 1
+        return execute(sql, params, many, context)
+
+    timings = []
+    with transaction.atomic():
+        with connection.execute_wrapper(count):
+            for _, data in passes:
+                query_count_before = query_count
+                start = time.perf_counter()
+                function(data)
+                timings.append((time.perf_counter() - start, query_count - query_count_before))
+        transaction.set_rollback(True)
+
+    for (name, _), (elapsed, queries) in zip(passes, timings):
+        print(f"{label:<24}{name:<12}{len(cards_data) / elapsed:>10.0f}{elapsed:>10.2f}"
+              f"{queries:>10}{queries / len(cards_data):>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Débit de l\'import des cartes: groupé contre carte par carte')
+    parser.add_argument('--seed', type=str, default=DEFAULT_SEED, help='Fichier seed (.json ou .ndjson.gz)')
+    parser.add_argument('--repeat', type=int, default=1, help='Dupliquer le seed N fois (numéros distincts)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--skip-row-by-row', action='store_true', help='Ne mesurer que l\'import groupé')
+    args = parser.parse_args()
+
+    cards_data = load_seed(args.seed, args.repeat)
+    print(f"{len(cards_data)} cartes, base {connection.vendor}\n")
+    print(f"{'mode':<24}{'passe':<12}{'cartes/s':>10}{'durée s':>10}{'requêtes':>10}{'req./carte':>12}")
+    if not args.skip_row_by_row:
+        measure("carte par carte", import_row_by_row, cards_data)
+    measure("groupé forcé", lambda data: import_batched(data, args.batch_size, force=True), cards_data)
+    measure(f"différentiel ({args.batch_size}/lot)", lambda data: import_batched(data, args.batch_size), cards_data)
+
+
+if __name__ == '__main__':
+    main()
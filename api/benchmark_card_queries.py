@@ -0,0 +1,93 @@
+"""
+Volume lu en base par une page de la liste des cartes (/api/cards/), comparé au même chargement avec les features jointes
+(équivalent de l'ancienne ligne Card qui portait clip_embedding, histogram et descriptors)
+Utilisation: python api/benchmark_card_queries.py [--limit 100] [--runs 5]
+"""
+import sys
+import os
+import time
+import argparse
+import django
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from api.models import Card
+
+
+def row_bytes(rows):
+    total = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (bytes, str, memoryview)):
+                total += len(value)
+            elif value is not None:
+                total += 8
+    return total
+
+
+def replay_bytes(queries):
+    """Rejoue les requêtes capturées et compte les octets des lignes renvoyées"""
+    total = 0
+    with connection.cursor() as cursor:
+        for sql, params in queries:
+            cursor.execute(sql, params)
+            if cursor.description:
+                total += row_bytes(cursor.fetchall())
+    return total
+
+
+def measure_endpoint(limit, runs):
+    queries = []
+
+    def capture(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    client = Client()
+    latencies = []
+    with override_settings(ALLOWED_HOSTS=['*']):
+        client.get(f'/api/cards/?limit={limit}')  # échauffement
+        for run in range(runs):
+            del queries[:]
+            start = time.perf_counter()
+            with connection.execute_wrapper(capture):
+                response = client.get(f'/api/cards/?limit={limit}')
+            latencies.append(time.perf_counter() - start)
+    return response.status_code, len(queries), replay_bytes(queries), min(latencies)
+
+
+def measure_joined(limit, runs):
+    queryset = Card.objects.select_related('set', 'features').order_by('-created_at')[:limit]
+    sql, params = queryset.query.sql_with_params()
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        list(queryset.all())
+        latencies.append(time.perf_counter() - start)
+    return replay_bytes([(sql, params)]), min(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Volume lu par la liste des cartes avec et sans les features')
+    parser.add_argument('--limit', type=int, default=100, help='Taille de page')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    status, query_count, endpoint_bytes, endpoint_latency = measure_endpoint(args.limit, args.runs)
+    joined_bytes, joined_latency = measure_joined(args.limit, args.runs)
+
+    print(f"/api/cards/?limit={args.limit}: HTTP {status}, {query_count} requêtes, "
+          f"{endpoint_bytes / 1024:.1f} Ko lus, {endpoint_latency * 1000:.1f} ms")
+    print(f"Cartes + features jointes:    {joined_bytes / 1024:.1f} Ko lus, {joined_latency * 1000:.1f} ms")
+    if endpoint_bytes:
+        print(f"Rapport: {joined_bytes / endpoint_bytes:.0f}x moins de données lues par la liste")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Mesure le passage à l'échelle des features CV (phash, histogramme, ORB) de 1 à N cœurs, en threads et en processus
+Utilisation: python api/benchmark_cv_features.py [--images api/yolo11/test_image | --catalog 100] [--count 200] [--max-workers 8]
+"""
+import sys
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import django
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from api.cv_features import CVFeaturePool, CVFeatureThreads
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def load_folder_images(folder):
+    paths = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return [Image.open(path).convert("RGB") for path in paths]
+
+
+def load_catalog_images(limit):
+    """Images des cartes en base, lues via le cache disque du catalogue"""
+    from io import BytesIO
+    from api.image_cache import get_image_cache
+    from api.models import Card
+
+    cache = get_image_cache()
+    images = []
+    for url in Card.objects.exclude(image_url='').values_list('image_url', flat=True)[:limit]:
+        try:
+            images.append(Image.open(BytesIO(cache.fetch(url).read_bytes())).convert("RGB"))
+        except Exception as e:
+            print(f"Erreur téléchargement {url}: {e}")
+    return images
+
+
+def worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+def run(backend, images, workers):
+    backend.warm_up()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(backend.extract, images))
+    elapsed = time.perf_counter() - start
+    assert all(result is not None for result in results)
+    return len(images) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Passage à l\'échelle des features CV: threads contre processus')
+    parser.add_argument('--images', type=str, default=os.path.join(os.path.dirname(__file__), 'yolo11', 'test_image'))
+    parser.add_argument('--catalog', type=int, default=0, help='Utiliser N images du catalogue au lieu du dossier')
+    parser.add_argument('--count', type=int, default=200, help='Nombre d\'images traitées par mesure')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    images = load_catalog_images(args.catalog) if args.catalog else load_folder_images(args.images)
+    if not images:
+        print("Aucune image à traiter")
+        return
+    images = (images * (args.count // len(images) + 1))[:args.count]
+    print(f"{len(images)} images, {os.cpu_count()} cœurs disponibles\n")
+
+    print(f"{'workers':>8} {'threads img/s':>14} {'accél.':>7} {'processus img/s':>16} {'accél.':>7}")
+    baseline = {}
+    for workers in worker_counts(args.max_workers):
+        throughput = {}
+        for mode in ("threads", "processus"):
+            backend = CVFeatureThreads() if mode == "threads" else CVFeaturePool(workers)
+            try:
+                throughput[mode] = run(backend, images, workers)
+            finally:
+                backend.shutdown()
+            baseline.setdefault(mode, throughput[mode])
+        print(f"{workers:>8} {throughput['threads']:>14.1f} {throughput['threads'] / baseline['threads']:>6.2f}x "
+              f"{throughput['processus']:>16.1f} {throughput['processus'] / baseline['processus']:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
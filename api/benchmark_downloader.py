@@ -0,0 +1,159 @@
+"""
+Débit du téléchargeur asynchrone contre un serveur HTTP local qui sert des images de test
+Le serveur peut simuler la latence du CDN et des erreurs 503, et mesure la concurrence réellement reçue.
+Volontairement sans get_image_cache(): chaque mesure doit télécharger, et les URL du serveur local
+(port aléatoire) n'ont rien à faire dans le cache du catalogue.
+Utilisation: python api/benchmark_downloader.py [--images api/yolo11/test_image] [--count 200] [--concurrency 1,8,32] [--per-host 8] [--latency-ms 50] [--fail-rate 0.05]
+"""
+import sys
+import os
+import time
+import random
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.async_downloader import AsyncImageDownloader
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+class StandInServer:
+    """Serveur local qui répond à /<n>/<fichier> avec le fichier de test correspondant"""
+
+    def __init__(self, folder, latency=0.0, fail_rate=0.0):
+        self.files = {
+            name: open(os.path.join(folder, name), 'rb').read()
+            for name in os.listdir(folder) if name.lower().endswith(IMAGE_EXTENSIONS)
+        }
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.active = 0
+        self.max_active = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server._lock:
+                    server.active += 1
+                    server.requests += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    time.sleep(server.latency)
+                    body = server.files.get(self.path.rsplit('/', 1)[-1])
+                    if body is None:
+                        self.send_response(404)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                    elif random.random() < server.fail_rate:
+                        self.send_response(503)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                    else:
+                        self.send_response(200)
+                        self.send_header("Content-Type", "image/png")
+                        self.send_header("Content-Length", str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def urls(self, count):
+        names = sorted(self.files)
+        return [f"{self.base_url}/{i}/{names[i % len(names)]}" for i in range(count)]
+
+    def reset(self):
+        self.max_active = 0
+        self.requests = 0
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+async def download_all(urls, concurrency, per_host, retries):
+    async with AsyncImageDownloader(max_concurrency=concurrency, per_host_limit=per_host,
+                                    retries=retries, backoff=0.05) as downloader:
+        results = await asyncio.gather(*(downloader.fetch(url) for url in urls), return_exceptions=True)
+    failures = sum(isinstance(result, Exception) for result in results)
+    return downloader.stats.summary(), failures
+
+
+def download_with_requests(urls, workers):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+
+    def get(url):
+        response = session.get(url, timeout=10)
+        response.raise_for_status()
+        return len(response.content)
+
+    start = time.perf_counter()
+    failures = 0
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(get, url) for url in urls]:
+            try:
+                total += future.result()
+            except Exception:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    return {"files": len(urls) - failures, "bytes": total, "retries": 0,
+            "files_per_sec": round((len(urls) - failures) / elapsed, 1),
+            "mb_per_sec": round(total / elapsed / 1e6, 2)}, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Débit du téléchargeur asynchrone contre un serveur local')
+    parser.add_argument('--images', type=str, default=os.path.join(os.path.dirname(__file__), 'yolo11', 'test_image'))
+    parser.add_argument('--count', type=int, default=200, help='Nombre d\'URL par mesure')
+    parser.add_argument('--concurrency', type=str, default='1,8,32', help='Concurrences globales à mesurer')
+    parser.add_argument('--per-host', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Latence simulée par requête')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Proportion de réponses 503')
+    parser.add_argument('--retries', type=int, default=3)
+    args = parser.parse_args()
+
+    server = StandInServer(args.images, latency=args.latency_ms / 1000, fail_rate=args.fail_rate)
+    if not server.files:
+        print(f"Aucune image trouvée dans {args.images}")
+        return
+    urls = server.urls(args.count)
+    print(f"{len(urls)} URL, latence {args.latency_ms:.0f} ms, {args.fail_rate:.0%} de 503, limite par hôte {args.per_host}\n")
+    print(f"{'mode':<22}{'fichiers/s':>11}{'Mo/s':>8}{'retries':>9}{'échecs':>8}{'conc. max':>11}")
+
+    server.reset()
+    stats, failures = download_with_requests(urls, 8)
+    print(f"{'requests, 8 threads':<22}{stats['files_per_sec']:>11}{stats['mb_per_sec']:>8}"
+          f"{stats['retries']:>9}{failures:>8}{server.max_active:>11}")
+
+    for concurrency in (int(value) for value in args.concurrency.split(',')):
+        server.reset()
+        stats, failures = asyncio.run(download_all(urls, concurrency, args.per_host, args.retries))
+        label = f"httpx, {concurrency} simultanés"
+        print(f"{label:<22}{stats['files_per_sec']:>11}{stats['mb_per_sec']:>8}"
+              f"{stats['retries']:>9}{failures:>8}{server.max_active:>11}")
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
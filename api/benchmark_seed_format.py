@@ -0,0 +1,97 @@
+"""
+Seed en tableau JSON indenté contre NDJSON compressé (pokemon/seed_io.py): taille sur disque, écriture,
+lecture et import en base (CardIngestor), avec la mémoire Python maximale de chaque étape
+Le seed est dupliqué repeat fois avec des numéros distincts pour simuler un catalogue complet.
+L'import tourne dans une transaction annulée à la fin: la base n'est pas modifiée.
+Utilisation: python api/benchmark_seed_format.py [--seed seeds/pokemon_cards_seed.json] [--repeat 20] [--skip-import]
+"""
+import sys
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import django
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from django.db import connection, reset_queries, transaction
+from api.card_ingestion import CardIngestor
+from pokemon.seed_io import find_seed, iter_seed, write_seed
+
+
+def generate_cards(seed_path, repeat):
+    """Entrées du seed, dupliquées repeat fois avec des numéros distincts, générées une à une"""
+    cards_data = list(iter_seed(seed_path))
+    for copy in range(repeat):
+        for card_data in cards_data:
+            yield {**card_data, 'number': f"{card_data.get('number', '0')}-{copy}" if copy else card_data.get('number', '0')}
+
+
+def measure(function):
+    """
+    Deux passes: la durée sans tracemalloc (qui ralentit fortement Python), puis le pic de mémoire
+    Returns:
+        tuple: (résultat, durée en secondes, pic de mémoire Python en Mo)
+    """
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    reset_queries()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    reset_queries()
+    return result, elapsed, peak / 1024 ** 2
+
+
+def read_all(path):
+    """Parcourt le seed comme les importeurs, sans garder les entrées"""
+    count = 0
+    for _ in iter_seed(path):
+        count += 1
+    return count
+
+
+def import_rolled_back(path):
+    with transaction.atomic():
+        stats = CardIngestor().ingest(iter_seed(path))
+        transaction.set_rollback(True)
+    return stats.created + stats.updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed tableau JSON contre NDJSON compressé')
+    parser.add_argument('--seed', type=str, default=find_seed('pokemon_cards_seed'), help='Seed source (.json ou .ndjson.gz)')
+    parser.add_argument('--repeat', type=int, default=20, help='Dupliquer le seed N fois (numéros distincts)')
+    parser.add_argument('--skip-import', action='store_true', help='Ne mesurer que l\'écriture et la lecture')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='seed_format_')
+    paths = {
+        'tableau JSON': os.path.join(directory, 'pokemon_cards_seed.json'),
+        'NDJSON gzip': os.path.join(directory, 'pokemon_cards_seed.ndjson.gz'),
+    }
+    try:
+        print(f"Seed {args.seed} x{args.repeat}, base {connection.vendor}\n")
+        print(f"{'format':<14}{'étape':<10}{'cartes':>9}{'Mo disque':>11}{'durée s':>10}{'cartes/s':>11}{'pic Mo':>9}")
+        for label, path in paths.items():
+            steps = [('écriture', lambda: write_seed(path, generate_cards(args.seed, args.repeat))),
+                     ('lecture', lambda: read_all(path))]
+            if not args.skip_import:
+                steps.append(('import', lambda: import_rolled_back(path)))
+            for step, function in steps:
+                count, elapsed, peak = measure(function)
+                size = os.path.getsize(path) / 1024 ** 2
+                print(f"{label:<14}{step:<10}{count:>9}{size:>11.1f}{elapsed:>10.2f}{count / elapsed:>11.0f}{peak:>9.1f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""
+Import groupé des cartes au format du seed JSON (seeds/pokemon_cards_seed.json, import_pokemon_cards.py,
+pokemon/import_card.py et la commande seed)
+
+Les sets sont gardés en mémoire. Les cartes puis leurs prix sont écrits par lots avec
+bulk_create(update_conflicts=True), dans une transaction par lot: une poignée de requêtes
+par lot au lieu d'environ six par carte. Les courbes de prix journalières de tout le lot
+sont interpolées ensemble (daily_price_curves). Un lot en échec est rejoué carte par carte
+pour n'écarter que les entrées fautives. Les entrées peuvent venir d'un générateur
+(pokemon/seed_io.iter_seed): un seul lot est en mémoire à la fois.
+
+Chaque carte garde l'empreinte de son entrée source. Les empreintes d'un lot sont comparées
+en une requête: seules les cartes nouvelles ou modifiées sont écrites, les autres gardent
+leur updated_at (pas d'invalidation de cache ni de recalcul d'embedding en aval).
+"""
+import hashlib
+import json
+import logging
+import random
+import time
+from itertools import islice
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+from djmoney.money import Money
+
+from api.models import Card, CardPrice, Set
+from api.models.card import daily_price_curves
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+# À incrémenter quand build() interprète autrement les entrées: toutes les cartes seront réécrites une fois
+FINGERPRINT_VERSION = "1"
+CARD_UPDATE_FIELDS = ['name', 'rarity', 'image_url', 'image_url_small', 'price', 'price_currency',
+                      'description', 'release_date', 'source_fingerprint', 'updated_at']
+PRICE_UPDATE_FIELDS = ['avg1', 'avg7', 'avg30', 'daily_price']
+
+RARITY_MAPPING = {
+    'Common': 'COMMON',
+    'Uncommon': 'UNCOMMON',
+    'Rare': 'RARE',
+    'Rare Holo': 'HOLORARE',
+    'Rare Holo GX': 'HOLORAREGX',
+    'Rare Holo EX': 'HOLORAREEX',
+    'Rare Holo LV.X': 'HOLORARELVX',
+    'Rare Holo Star': 'HOLORARESTARRARE',
+    'Rare BREAK': 'BREAKRARE',
+    'Rare Prime': 'PRIMERARE',
+    'Rare Prism Star': 'PRISMRARE',
+    'Rare Rainbow': 'RAINBOWRARE',
+    'Rare Shining': 'SHININGRARE',
+    'Rare Shiny': 'SHINYRARE',
+    'Rare Shiny GX': 'SHINYRAREGX',
+    'Rare Ultra': 'ULTRARARE',
+    'Rare ACE': 'ACERARE',
+    'Rare Secret': 'SECRETRARE',
+    'Rare Holo V': 'HOLORAREV',
+    'Rare Holo VMAX': 'HOLORAREVMAX',
+    'Rare Holo VSTAR': 'HOLORAREVSTAR',
+    'Rare Illustration Rare': 'ILLUSTRATIONRARE',
+    'Rare Special Illustration Rare': 'SPECIALILLUSTRATIONRARE',
+    'Rare Double Rare': 'DOUBLERARE',
+    'Rare Triple Rare': 'TRIPLERAARE',
+    'Promo': 'PROMO',
+    'LEGEND': 'LEGENDRARE',
+    'None': 'UNKNOWN'
+}
+
+
+def record_fingerprint(card_data) -> str:
+    """SHA-256 de l'entrée source sous forme canonique (clés triées): indépendant de l'ordre des clés"""
+    canonical = json.dumps(card_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{FINGERPRINT_VERSION}:{canonical}".encode('utf-8')).hexdigest()
+
+
+@dataclass
+class IngestionStats:
+    started_at: float = field(default_factory=time.perf_counter)
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: int = 0
+    batches: int = 0
+    fallback_batches: int = 0
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.started_at, 1e-9)
+        written = self.created + self.updated
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "errors": self.errors,
+            "batches": self.batches,
+            "fallback_batches": self.fallback_batches,
+            "elapsed": round(elapsed, 2),
+            "cards_per_sec": round(written / elapsed, 1),
+        }
+
+
+class CardIngestor:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, force=False):
+        """
+        Args:
+            batch_size: Cartes écrites par transaction
+            force: Réécrire toutes les cartes, même celles dont l'entrée source n'a pas changé
+        """
+        self.batch_size = batch_size
+        self.force = force
+        self.sets = {}
+        self.stats = IngestionStats()
+        self.base_date = timezone.now().date() - timedelta(days=365)
+
+    def load_sets(self):
+        self.sets = {set_obj.code: set_obj for set_obj in Set.objects.all()}
+
+    def get_set(self, code, title, release_date):
+        """Set depuis le cache mémoire, créé en base à la première carte d'un set inconnu"""
+        set_obj = self.sets.get(code)
+        if set_obj is None:
+            set_obj, _ = Set.objects.get_or_create(
+                code=code,
+                defaults={
+                    'title': title,
+                    'tcg': 'pokemon',
+                    'release_date': release_date,
+                    'total_cards': 0,
+                    'image_url': '',
+                    'symbol_url': ''
+                }
+            )
+            self.sets[code] = set_obj
+        return set_obj
+
+    def build(self, card_data):
+        """
+        Carte (non sauvegardée) et moyennes de prix d'une entrée du seed
+        Returns:
+            tuple: (Card, (avg1, avg7, avg30)), la carte portant l'empreinte de l'entrée
+        """
+        # set_id dans le seed, set dans les entrées de PokemonCardManager.card_to_record
+        set_id = card_data.get('set_id') or card_data.get('set')
+        set_title = card_data.get('set_name', set_id)
+        try:
+            release_date = datetime.strptime(card_data.get('release_date'), '%Y/%m/%d').date()
+        except (TypeError, ValueError):
+            release_date = self.base_date + timedelta(days=random.randint(0, 365))
+
+        # ===> Estimation du prix
+        price = 0.99
+        if 'prices' in card_data and card_data['prices']:
+            prices = card_data['prices']
+            for tier in ['normal', 'holofoil']:
+                if tier in prices and isinstance(prices[tier], dict):
+                    if 'market' in prices[tier]:
+                        price = float(prices[tier]['market'])
+                        break
+                    elif 'mid' in prices[tier]:
+                        price = float(prices[tier]['mid'])
+                        break
+            if price <= 0:
+                price = round(random.uniform(0.1, 5.0), 2)
+
+        card = Card(
+            set=self.get_set(set_id, set_title, release_date),
+            number=card_data.get('number', '0'),
+            name=card_data.get('name', 'Unknown Card'),
+            rarity=RARITY_MAPPING.get(card_data.get('rarity', 'Common'), 'COMMON'),
+            image_url=card_data.get('images', {}).get('large', ''),
+            image_url_small=card_data.get('images', {}).get('small', ''),
+            price=Money(price, 'USD'),
+            description=f"Pokemon card from {set_title} set",
+            release_date=release_date,
+            source_fingerprint=record_fingerprint(card_data),
+        )
+
+        # ===> CardMarket Prices
+        cardmarket_data = card_data.get('cardmarket', {})
+        if cardmarket_data and 'prices' in cardmarket_data:
+            prices = cardmarket_data['prices']
+            avg1 = round(float(prices.get('avg1', 0) or 0), 2)
+            avg7 = round(float(prices.get('avg7', 0) or 0), 2)
+            avg30 = round(float(prices.get('avg30', 0) or 0), 2)
+        else:
+            variation_percent = 0.15
+            avg1 = round(price * (1 + random.uniform(-variation_percent / 3, variation_percent / 3)), 2)
+            avg7 = round(price * (1 + random.uniform(-variation_percent / 2, variation_percent / 2)), 2)
+            avg30 = round(price * (1 + random.uniform(-variation_percent, variation_percent)), 2)
+        return card, (avg1, avg7, avg30)
+
+    def ingest(self, cards_data):
+        """
+        Args:
+            cards_data: Entrées au format du seed JSON (liste ou itérable lu au fil de l'eau)
+        Returns:
+            IngestionStats: Cartes créées, mises à jour, inchangées et en erreur
+        """
+        self.stats = IngestionStats()
+        self.load_sets()
+        cards_data = iter(cards_data)
+        while True:
+            batch = list(islice(cards_data, self.batch_size))
+            if not batch:
+                return self.stats
+            self._ingest_batch(batch)
+            # Avec DEBUG, Django garde le SQL de chaque requête (les INSERT groupés sont gros). Le journal
+            # n'est pas vidé quand l'appelant l'enregistre (CaptureQueriesContext, assertNumQueries)
+            if settings.DEBUG and not connection.force_debug_cursor:
+                reset_queries()
+
+    def _ingest_batch(self, batch):
+        # Une seule ligne par (set, number) dans un lot: un upsert ne peut pas toucher deux fois la même ligne
+        rows = {}
+        for card_data in batch:
+            try:
+                card, averages = self.build(card_data)
+                rows[(card.set_id, card.number)] = (card, averages)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.warning(f"⚠️ Entrée ignorée {card_data.get('id', card_data.get('name'))}: {e}")
+        if not rows:
+            return
+
+        existing = self._existing_fingerprints(rows)
+        if not self.force:
+            unchanged = [key for key, (card, _) in rows.items() if existing.get(key) == card.source_fingerprint]
+            for key in unchanged:
+                del rows[key]
+            self.stats.unchanged += len(unchanged)
+            if not rows:
+                return
+
+        self.stats.batches += 1
+        try:
+            with transaction.atomic():
+                created, updated = self._write(list(rows.values()), existing)
+        except Exception as e:
+            logger.warning(f"⚠️ Échec du lot de {len(rows)} cartes ({e}), écriture carte par carte")
+            self.stats.fallback_batches += 1
+            created = updated = 0
+            for card, averages in rows.values():
+                try:
+                    with transaction.atomic():
+                        row_created, row_updated = self._write([(card, averages)], existing)
+                    created += row_created
+                    updated += row_updated
+                except Exception as row_error:
+                    self.stats.errors += 1
+                    logger.warning(f"⚠️ Erreur pour {card}: {row_error}")
+        self.stats.created += created
+        self.stats.updated += updated
+
+    def _existing_fingerprints(self, rows):
+        """
+        Empreintes des cartes du lot déjà en base, en une requête
+        Returns:
+            Dict: (set_id, number) -> empreinte ('' pour les cartes importées avant les empreintes)
+        """
+        set_ids = {set_id for set_id, _ in rows}
+        numbers = {number for _, number in rows}
+        return {
+            (set_id, number): fingerprint
+            for set_id, number, fingerprint in Card.objects.filter(set_id__in=set_ids, number__in=numbers)
+            .values_list('set_id', 'number', 'source_fingerprint')
+            if (set_id, number) in rows
+        }
+
+    def _write(self, rows, existing):
+        """
+        Upsert d'un lot de cartes puis de leurs prix
+        Args:
+            existing: Clés (set_id, number) déjà en base (_existing_fingerprints)
+        Returns:
+            tuple: (cartes créées, cartes mises à jour)
+        """
+        cards = [card for card, _ in rows]
+        keys = {(card.set_id, card.number) for card in cards}
+        set_ids = {set_id for set_id, _ in keys}
+        numbers = {number for _, number in keys}
+        updated = len(keys & existing.keys())
+
+        Card.objects.bulk_create(
+            cards,
+            update_conflicts=True,
+            unique_fields=['set', 'number'],
+            update_fields=CARD_UPDATE_FIELDS,
+        )
+
+        # bulk_create ne renvoie pas les clés des lignes mises à jour: une requête pour toutes les relire
+        card_ids = {
+            (set_id, number): card_id
+            for card_id, set_id, number in Card.objects.filter(set_id__in=set_ids, number__in=numbers)
+            .values_list('id', 'set_id', 'number')
+        }
+        averages = [row_averages for _, row_averages in rows]
+        curves = daily_price_curves(*zip(*averages))
+        CardPrice.objects.bulk_create(
+            [
+                CardPrice(card_id=card_ids[(card.set_id, card.number)], avg1=avg1, avg7=avg7, avg30=avg30,
+                          daily_price=daily_price)
+                for (card, (avg1, avg7, avg30)), daily_price in zip(rows, curves)
+            ],
+            update_conflicts=True,
+            unique_fields=['card'],
+            update_fields=PRICE_UPDATE_FIELDS,
+        )
+        return len(keys) - updated, updated
@@ -0,0 +1,164 @@
+"""
+Features CV des images du catalogue: phash, histogramme HSV et descripteurs ORB
+
+Le calcul est CPU et imagehash tient le GIL: CVFeaturePool le répartit sur des processus,
+chacun avec son propre détecteur ORB. Les pixels sont transmis par mémoire partagée
+plutôt que par pickle des objets PIL. Ce module n'importe pas Django, pour que les
+processus démarrés en spawn restent légers.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import cv2
+import imagehash
+import numpy as np
+from PIL import Image
+
+ORB_FEATURES = 100
+# Histogramme teinte x saturation compact: 30 x 32 cases quantifiées sur un octet (960 octets par carte)
+HIST_BINS = [30, 32]
+HIST_RANGES = [0, 180, 0, 256]
+HIST_SIZE = HIST_BINS[0] * HIST_BINS[1]
+
+
+def create_orb():
+    return cv2.ORB_create(nfeatures=ORB_FEATURES)
+
+
+def compute_cv_features(image_np: np.ndarray, orb) -> dict:
+    """
+    Args:
+        image_np: Image RGB uint8 (H, W, 3)
+        orb: Détecteur ORB propre au thread ou au processus appelant
+    """
+    phash = str(imagehash.phash(Image.fromarray(image_np)))
+
+    cv_image = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+    hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, HIST_BINS, HIST_RANGES)
+
+    _, descriptors = orb.detectAndCompute(cv_image, None)
+    if descriptors is None:
+        descriptors = np.zeros((1, 32), dtype=np.uint8)
+
+    return {
+        'phash': phash,
+        'histogram': pack_histogram(hist),
+        'descriptors': descriptors.tobytes()
+    }
+
+
+def pack_histogram(hist) -> bytes:
+    """Normalise par le maximum (comme NORM_MINMAX sur des comptes) et quantifie sur 0-255"""
+    hist = np.asarray(hist, dtype=np.float32).ravel()
+    peak = hist.max() if hist.size else 0.0
+    if peak > 0:
+        hist = hist / peak
+    return np.round(hist * 255).astype(np.uint8).tobytes()
+
+
+def unpack_histograms(packed) -> np.ndarray:
+    """
+    Args:
+        packed: Histogramme empaqueté (bytes) ou liste d'histogrammes empaquetés
+    Returns:
+        np.ndarray: Matrice uint8 (N, HIST_SIZE) lue sans copie quand c'est possible
+    """
+    if isinstance(packed, (bytes, bytearray, memoryview)):
+        packed = [packed]
+    return np.frombuffer(b"".join(bytes(p) for p in packed), dtype=np.uint8).reshape(-1, HIST_SIZE)
+
+
+def compare_histograms(query, candidates) -> np.ndarray:
+    """
+    Corrélation (équivalent de cv2.HISTCMP_CORREL) entre un histogramme et des candidats, sur la forme empaquetée
+    Args:
+        query: Histogramme empaqueté
+        candidates: Histogramme(s) empaqueté(s) ou matrice uint8 de unpack_histograms
+    Returns:
+        np.ndarray: Une similarité dans [-1, 1] par candidat
+    """
+    if not isinstance(candidates, np.ndarray):
+        candidates = unpack_histograms(candidates)
+    q = unpack_histograms(query)[0].astype(np.float32)
+    c = candidates.astype(np.float32)
+    q -= q.mean()
+    c -= c.mean(axis=1, keepdims=True)
+    denominator = np.sqrt((q * q).sum() * (c * c).sum(axis=1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = (c @ q) / denominator
+    return np.where(denominator > 0, scores, 0.0)
+
+
+_worker_orb = None
+
+
+def _init_worker():
+    global _worker_orb
+    # Un processus par cœur: OpenCV ne doit pas lancer ses propres threads en plus
+    cv2.setNumThreads(1)
+    _worker_orb = create_orb()
+
+
+def _compute_from_shared(name, shape, dtype):
+    # Le resource tracker est celui du parent (spawn): c'est le parent qui supprime le segment
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return compute_cv_features(np.ndarray(shape, dtype=dtype, buffer=shm.buf), _worker_orb)
+    finally:
+        shm.close()
+
+
+class CVFeaturePool:
+    """Pool de processus pour compute_cv_features"""
+
+    def __init__(self, processes):
+        self.processes = processes
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    def extract(self, image) -> dict:
+        """Copie les pixels dans un segment partagé et calcule les features dans un processus du pool"""
+        image_np = np.asarray(image, dtype=np.uint8)
+        shm = shared_memory.SharedMemory(create=True, size=image_np.nbytes)
+        try:
+            np.ndarray(image_np.shape, dtype=np.uint8, buffer=shm.buf)[:] = image_np
+            future = self.executor.submit(_compute_from_shared, shm.name, image_np.shape, image_np.dtype.str)
+            return future.result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def warm_up(self):
+        """Démarre tous les processus avant la mesure ou le traitement"""
+        list(self.executor.map(_noop, range(self.processes)))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def _noop(_):
+    return None
+
+
+class CVFeatureThreads:
+    """Même interface que CVFeaturePool, dans le processus courant avec un ORB par thread"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def extract(self, image) -> dict:
+        orb = getattr(self._local, "orb", None)
+        if orb is None:
+            orb = self._local.orb = create_orb()
+        return compute_cv_features(np.asarray(image, dtype=np.uint8), orb)
+
+    def warm_up(self):
+        pass
+
+    def shutdown(self):
+        pass
@@ -0,0 +1,302 @@
+"""
+Cache disque des images du catalogue (Card.image_url)
+
+Chaque image est stockée sous le SHA-256 de son URL, avec à côté ses métadonnées
+(ETag, Last-Modified, SHA-256 du contenu). Une entrée plus vieille que max_age est
+revalidée par une requête conditionnelle: un 304 ne retélécharge rien. La taille
+totale est bornée, les entrées les moins récemment lues sont supprimées en premier.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import requests
+from api.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class CachedImage:
+    url: str
+    path: Path
+    sha256: str
+    size: int
+    status: str  # hit, revalidated ou miss
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+
+class BlobWriter:
+    """Écrit un corps de réponse par morceaux dans un fichier temporaire, en calculant son SHA-256 au passage"""
+
+    def __init__(self, blob_path):
+        self.blob_path = blob_path
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=blob_path.parent, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self.reset()
+
+    def write(self, chunk):
+        self._digest.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def reset(self):
+        """Repart de zéro, par exemple quand un téléchargement est relancé en cours de corps"""
+        self._file.seek(0)
+        self._file.truncate()
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.tmp_path, self.blob_path)
+        return self._digest.hexdigest(), self.size
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class ImageCache:
+    def __init__(self, directory=None, max_bytes=None, max_age=None, session=None):
+        """
+        Args:
+            directory: Dossier du cache (CARD_IMAGE_CACHE_DIR par défaut)
+            max_bytes: Taille maximale du cache en octets (CARD_IMAGE_CACHE_MAX_BYTES)
+            max_age: Âge en secondes au-delà duquel une entrée est revalidée (CARD_IMAGE_CACHE_MAX_AGE)
+            session: Session requests à réutiliser (pool de connexions, retries)
+        """
+        from django.conf import settings
+
+        self.directory = Path(directory or settings.CARD_IMAGE_CACHE_DIR)
+        self.max_bytes = settings.CARD_IMAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_age = settings.CARD_IMAGE_CACHE_MAX_AGE if max_age is None else max_age
+        self.session = session or requests.Session()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self.stats = {"hit": 0, "revalidated": 0, "miss": 0, "evicted": 0, "downloaded_bytes": 0}
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        folder = self.directory / key[:2]
+        return folder / f"{key}.img", folder / f"{key}.json"
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path, meta):
+        fd, tmp_path = tempfile.mkstemp(dir=meta_path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _lookup(self, url, revalidate):
+        """
+        Returns:
+            tuple: (CachedImage si l'entrée est utilisable telle quelle, sinon None,
+                    (blob_path, meta_path, meta, en-têtes conditionnels) pour la requête à faire)
+        """
+        blob_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path)
+        if meta is not None and not blob_path.exists():
+            meta = None
+
+        if meta is not None and not revalidate and time.time() - meta["fetched_at"] < self.max_age:
+            cached = self._hit(url, blob_path, meta, "hit")
+            if cached is not None:
+                return cached, None
+            meta = None
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return None, (blob_path, meta_path, meta, headers)
+
+    def fetch(self, url, timeout=10, revalidate=False) -> CachedImage:
+        """
+        Renvoie l'image de l'URL depuis le cache, en la téléchargeant si nécessaire
+        Args:
+            revalidate: Forcer la requête conditionnelle même si l'entrée est récente
+        Raises:
+            requests.RequestException: Téléchargement impossible et aucune copie en cache
+        """
+        cached, pending = self._lookup(url, revalidate)
+        if cached is not None:
+            return cached
+        blob_path, meta_path, meta, headers = pending
+
+        try:
+            response = self.session.get(url, timeout=timeout, stream=True, headers=headers)
+        except requests.RequestException:
+            cached = self._hit(url, blob_path, meta, "hit") if meta is not None else None
+            if cached is not None:
+                logger.warning(f"⚠️ Revalidation impossible pour {url}, copie en cache utilisée")
+                return cached
+            raise
+
+        with response:
+            if response.status_code == 304 and meta is not None:
+                cached = self._revalidated(url, blob_path, meta_path, meta)
+                if cached is not None:
+                    return cached
+                # Entrée évincée pendant la requête: téléchargement complet
+                return self.fetch(url, timeout=timeout)
+
+            response.raise_for_status()
+            writer = BlobWriter(blob_path)
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    writer.write(chunk)
+            except BaseException:
+                writer.abort()
+                raise
+            return self._commit(url, writer, response.headers, meta_path, meta)
+
+    async def fetch_async(self, url, downloader, revalidate=False) -> CachedImage:
+        """
+        Comme fetch, avec un AsyncImageDownloader (api/async_downloader.py) à la place de la session requests
+        Le corps est écrit sur disque au fil de la réception.
+        """
+        cached, pending = self._lookup(url, revalidate)
+        if cached is not None:
+            return cached
+        blob_path, meta_path, meta, headers = pending
+
+        writer = BlobWriter(blob_path)
+        try:
+            result = await downloader.fetch(url, headers=headers, sink=writer)
+        except Exception:
+            writer.abort()
+            cached = self._hit(url, blob_path, meta, "hit") if meta is not None else None
+            if cached is not None:
+                logger.warning(f"⚠️ Revalidation impossible pour {url}, copie en cache utilisée")
+                return cached
+            raise
+
+        if result.status_code == 304 and meta is not None:
+            writer.abort()
+            cached = self._revalidated(url, blob_path, meta_path, meta)
+            if cached is not None:
+                return cached
+            # Entrée évincée pendant la requête: téléchargement complet
+            return await self.fetch_async(url, downloader)
+        return self._commit(url, writer, result.headers, meta_path, meta)
+
+    def _hit(self, url, blob_path, meta, status):
+        """
+        Returns:
+            CachedImage: ou None si l'entrée vient d'être évincée (par un autre thread ou processus)
+        """
+        try:
+            os.utime(blob_path)  # l'horodatage sert d'ordre LRU
+        except FileNotFoundError:
+            return None
+        record_cache_lookup("card_images", True)
+        with self._lock:
+            self.stats[status] += 1
+        return CachedImage(url, blob_path, meta["sha256"], meta["size"], status)
+
+    def _revalidated(self, url, blob_path, meta_path, meta):
+        meta["fetched_at"] = time.time()
+        cached = self._hit(url, blob_path, meta, "revalidated")
+        if cached is not None:
+            self._write_meta(meta_path, meta)
+        return cached
+
+    def _commit(self, url, writer, headers, meta_path, previous_meta):
+        record_cache_lookup("card_images", False)
+        sha256, size = writer.commit()
+        meta = {
+            "url": url,
+            "sha256": sha256,
+            "size": size,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        self._write_meta(meta_path, meta)
+
+        previous_size = previous_meta["size"] if previous_meta else 0
+        with self._lock:
+            self.stats["miss"] += 1
+            self.stats["downloaded_bytes"] += size
+            if self._total_bytes is not None:
+                self._total_bytes += size - previous_size
+        self._evict_if_needed()
+        return CachedImage(url, writer.blob_path, sha256, size, "miss")
+
+    def _entries(self):
+        for blob_path in self.directory.glob("*/*.img"):
+            try:
+                stat = blob_path.stat()
+            except FileNotFoundError:
+                continue
+            yield blob_path, stat.st_size, stat.st_mtime
+
+    def total_bytes(self):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            return self._total_bytes
+
+    def _evict_if_needed(self):
+        if self.max_bytes <= 0 or self.total_bytes() <= self.max_bytes:
+            return
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            # Descendre sous 90% de la limite évite de relancer le parcours à chaque écriture
+            target = self.max_bytes * 0.9
+            for blob_path, size, _ in entries:
+                if total <= target:
+                    break
+                for path in (blob_path, blob_path.with_suffix(".json")):
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+                total -= size
+                self.stats["evicted"] += 1
+            self._total_bytes = total
+
+    def summary(self):
+        stats = dict(self.stats)
+        lookups = stats["hit"] + stats["revalidated"] + stats["miss"]
+        stats["hit_ratio"] = round((stats["hit"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0
+        stats["total_bytes"] = self.total_bytes()
+        return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Cache partagé configuré par les settings"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ImageCache()
+    return _default_cache
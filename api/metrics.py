@@ -0,0 +1,207 @@
+"""
+Registre de métriques au format d'exposition texte Prometheus
+
+Les valeurs sont propres à chaque processus: avec plusieurs workers gunicorn,
+chaque worker expose ses propres séries sur /metrics/.
+"""
+import threading
+from typing import Callable, Dict, Tuple
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    """Histogramme cumulatif à buckets fixes"""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self._count
+            return {"buckets": buckets, "sum": self._sum, "count": self._count}
+
+    def _samples(self, name, labels):
+        snapshot = self.snapshot()
+        for bound, count in snapshot["buckets"].items():
+            yield f"{name}_bucket", {**labels, "le": bound}, count
+        yield f"{name}_sum", labels, snapshot["sum"]
+        yield f"{name}_count", labels, snapshot["count"]
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def _samples(self, name, labels):
+        yield name, labels, self._value
+
+
+class Gauge:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """La valeur est calculée au moment de la lecture"""
+        self._function = function
+
+    @property
+    def value(self):
+        return self._function() if self._function is not None else self._value
+
+    def _samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Metric:
+    """Famille de séries partageant un nom, déclinée par valeurs d'étiquettes"""
+
+    def __init__(self, kind, name, documentation, labelnames=(), factory=None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            if key not in self._children:
+                self._children[key] = self._factory()
+            return self._children[key]
+
+    def __getattr__(self, attribute):
+        # Métrique sans étiquette: délègue à l'unique série (observe, inc, set...)
+        if attribute.startswith("_") or self.labelnames:
+            raise AttributeError(attribute)
+        return getattr(self.labels(), attribute)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            labels = dict(zip(self.labelnames, key))
+            for sample_name, sample_labels, value in child._samples(self.name, labels):
+                lines.append(f"{sample_name}{_format_labels(sample_labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, kind, name, documentation, labelnames, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Metric(kind, name, documentation, labelnames, factory)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        """Par convention, le nom d'un compteur se termine par _total"""
+        return self._get_or_create("counter", name, documentation, labelnames, Counter)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create("gauge", name, documentation, labelnames, Gauge)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._get_or_create("histogram", name, documentation, labelnames, lambda: Histogram(buckets))
+
+    def expose(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.expose() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+IDENTIFICATION_STAGE_SECONDS = REGISTRY.histogram(
+    "card_identification_stage_seconds",
+    "Durée de chaque étape de l'identification de cartes",
+    labelnames=("endpoint", "stage"),
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "cache_lookups_total",
+    "Lectures de cache par cache et par résultat (hit/miss)",
+    labelnames=("cache", "result"),
+)
+IDENTIFICATION_REJECTED = REGISTRY.counter(
+    "card_identification_rejected_total",
+    "Identifications refusées par le contrôle d'admission",
+    labelnames=("reason",),
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Latence des requêtes HTTP par vue",
+    labelnames=("view", "method", "status"),
+)
+HTTP_REQUEST_DB_QUERIES = REGISTRY.histogram(
+    "http_request_db_queries",
+    "Nombre de requêtes SQL par requête HTTP et par vue",
+    labelnames=("view", "method"),
+    buckets=DB_QUERY_BUCKETS,
+)
+
+
+def observe_stages(endpoint, timings: Dict[str, float]):
+    """Enregistre les durées d'étapes (clés *_time, en secondes) d'une identification"""
+    for key, value in timings.items():
+        if key.endswith("_time") and isinstance(value, (int, float)):
+            IDENTIFICATION_STAGE_SECONDS.labels(endpoint=endpoint, stage=key[:-len("_time")]).observe(value)
+
+
+def record_cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.labels(cache=cache_name, result="hit" if hit else "miss").inc()
@@ -1,5 +1,9 @@
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
+from api.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUEST_DB_QUERIES
 
 class JWTCookieMiddleware(MiddlewareMixin):
     """Middleware qui extrait les tokens JWT des cookies et les place dans l'entête d'autorisation"""
@@ -22,3 +26,75 @@ class JWTCookieMiddleware(MiddlewareMixin):
             request.META['HTTP_AUTHORIZATION'] = f"Bearer {access_token}"
 
         return self.get_response(request)
+
+
+class QueryCounter:
+    """Nombre de requêtes SQL exécutées pendant une requête HTTP"""
+
+    def __init__(self):
+        self.count = 0
+
+
+# Compteur de la requête HTTP en cours. asgiref copie le contexte dans les threads de sync_to_async:
+# les requêtes SQL des vues async, exécutées hors de la boucle d'événements, sont comptées aussi.
+current_query_counter = ContextVar('current_query_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = current_query_counter.get()
+    if counter is not None:
+        counter.count += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """
+    Receiver de connection_created: chaque connexion (une par thread) compte ses requêtes dans le
+    compteur du contexte courant. Inséré en tête: connection.execute_wrapper() retire le dernier
+    wrapper en sortie, une connexion ouverte dans un tel bloc ne doit pas perdre celui-ci.
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+class MetricsMiddleware:
+    """Mesure la latence et le nombre de requêtes SQL de chaque vue (exposés sur /metrics/)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = QueryCounter()
+        token = current_query_counter.set(queries)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_query_counter.reset(token)
+        self._observe(request, response, time.perf_counter() - start, queries.count)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryCounter()
+        token = current_query_counter.set(queries)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_counter.reset(token)
+        self._observe(request, response, time.perf_counter() - start, queries.count)
+        return response
+
+    def _observe(self, request, response, duration, query_count):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(view=view, method=request.method, status=response.status_code).observe(duration)
+        HTTP_REQUEST_DB_QUERIES.labels(view=view, method=request.method).observe(query_count)
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0018_alter_card_name_alter_card_rarity_alter_set_title"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="features_image_url",
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="features_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="features_version",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="image_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
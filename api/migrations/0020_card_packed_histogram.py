@@ -0,0 +1,66 @@
+import numpy as np
+from django.db import migrations, models
+
+LEGACY_BINS = (180, 256)
+PACKED_BINS = (30, 32)
+BATCH_SIZE = 200
+
+
+def pack_legacy_histogram(values):
+    """Regroupe l'ancien histogramme 180x256 (JSON) en 30x32 cases quantifiées sur un octet"""
+    try:
+        hist = np.asarray(values, dtype=np.float32)
+    except (TypeError, ValueError):
+        return None
+    if hist.size != LEGACY_BINS[0] * LEGACY_BINS[1] or not np.isfinite(hist).all():
+        return None
+    hist = hist.reshape(
+        PACKED_BINS[0], LEGACY_BINS[0] // PACKED_BINS[0],
+        PACKED_BINS[1], LEGACY_BINS[1] // PACKED_BINS[1]
+    ).sum(axis=(1, 3))
+    peak = hist.max()
+    if peak > 0:
+        hist = hist / peak
+    return np.round(hist * 255).astype(np.uint8).tobytes()
+
+
+def pack_histograms(apps, schema_editor):
+    Card = apps.get_model("api", "Card")
+    batch = []
+    fields = ["histogram_packed", "features_version"]
+    for card in Card.objects.filter(histogram__isnull=False).only("id", "histogram", "features_version").iterator(chunk_size=BATCH_SIZE):
+        card.histogram_packed = pack_legacy_histogram(card.histogram)
+        if card.histogram_packed is None:
+            # Histogramme illisible: la carte sera recalculée au prochain précalcul incrémental
+            card.features_version = None
+        batch.append(card)
+        if len(batch) >= BATCH_SIZE:
+            Card.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Card.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0019_card_feature_tracking"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="histogram_packed",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_histograms, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="card",
+            name="histogram",
+        ),
+        migrations.RenameField(
+            model_name="card",
+            old_name="histogram_packed",
+            new_name="histogram",
+        ),
+    ]
@@ -0,0 +1,84 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+FEATURE_FIELDS = {
+    # champ de Card: champ de CardFeatures
+    "clip_embedding": "clip_embedding",
+    "phash": "phash",
+    "histogram": "histogram",
+    "descriptors": "descriptors",
+    "image_hash": "image_hash",
+    "features_version": "version",
+    "features_image_url": "image_url",
+    "features_updated_at": "updated_at",
+}
+BATCH_SIZE = 200
+
+
+def move_features_to_table(apps, schema_editor):
+    Card = apps.get_model("api", "Card")
+    CardFeatures = apps.get_model("api", "CardFeatures")
+    has_features = models.Q()
+    for card_field in FEATURE_FIELDS:
+        has_features |= models.Q(**{f"{card_field}__isnull": False})
+
+    batch = []
+    for values in Card.objects.filter(has_features).values("id", *FEATURE_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        batch.append(CardFeatures(
+            card_id=values["id"],
+            **{feature_field: values[card_field] for card_field, feature_field in FEATURE_FIELDS.items()}
+        ))
+        if len(batch) >= BATCH_SIZE:
+            CardFeatures.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CardFeatures.objects.bulk_create(batch)
+
+
+def move_features_to_card(apps, schema_editor):
+    Card = apps.get_model("api", "Card")
+    CardFeatures = apps.get_model("api", "CardFeatures")
+    batch = []
+    for features in CardFeatures.objects.iterator(chunk_size=BATCH_SIZE):
+        card = Card(id=features.card_id)
+        for card_field, feature_field in FEATURE_FIELDS.items():
+            setattr(card, card_field, getattr(features, feature_field))
+        batch.append(card)
+        if len(batch) >= BATCH_SIZE:
+            Card.objects.bulk_update(batch, list(FEATURE_FIELDS))
+            batch = []
+    if batch:
+        Card.objects.bulk_update(batch, list(FEATURE_FIELDS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0020_card_packed_histogram"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CardFeatures",
+            fields=[
+                ("card", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name="features", serialize=False, to="api.card")),
+                ("clip_embedding", models.JSONField(blank=True, null=True)),
+                ("phash", models.CharField(blank=True, max_length=64, null=True)),
+                ("histogram", models.BinaryField(blank=True, null=True)),
+                ("descriptors", models.BinaryField(blank=True, null=True)),
+                ("image_hash", models.CharField(blank=True, max_length=64, null=True)),
+                ("version", models.CharField(blank=True, db_index=True, max_length=64, null=True)),
+                ("image_url", models.URLField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(move_features_to_table, move_features_to_card),
+        migrations.RemoveField(model_name="card", name="clip_embedding"),
+        migrations.RemoveField(model_name="card", name="phash"),
+        migrations.RemoveField(model_name="card", name="histogram"),
+        migrations.RemoveField(model_name="card", name="descriptors"),
+        migrations.RemoveField(model_name="card", name="image_hash"),
+        migrations.RemoveField(model_name="card", name="features_version"),
+        migrations.RemoveField(model_name="card", name="features_image_url"),
+        migrations.RemoveField(model_name="card", name="features_updated_at"),
+    ]
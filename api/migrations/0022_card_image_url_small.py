@@ -0,0 +1,32 @@
+# Generated by Django 4.2.20 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+# images.pokemontcg.io: https://.../base1/4_hires.png (large) et https://.../base1/4.png (small)
+LARGE_SUFFIX = "_hires.png"
+
+
+def derive_small_urls(apps, schema_editor):
+    Card = apps.get_model("api", "Card")
+    cards = []
+    for card in Card.objects.filter(image_url__endswith=LARGE_SUFFIX).only("id", "image_url").iterator():
+        card.image_url_small = card.image_url[: -len(LARGE_SUFFIX)] + ".png"
+        cards.append(card)
+    Card.objects.bulk_update(cards, ["image_url_small"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0021_cardfeatures"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="image_url_small",
+            field=models.URLField(blank=True, default=""),
+        ),
+        migrations.RunPython(derive_small_urls, migrations.RunPython.noop),
+    ]
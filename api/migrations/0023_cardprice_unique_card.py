@@ -0,0 +1,26 @@
+# Generated by Django 4.2.20 on 2026-10-19 12:16
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def remove_duplicate_prices(apps, schema_editor):
+    """Garde la ligne de prix la plus récente (id le plus grand) de chaque carte"""
+    CardPrice = apps.get_model("api", "CardPrice")
+    latest_ids = CardPrice.objects.values("card").annotate(latest=Max("id")).values("latest")
+    CardPrice.objects.exclude(id__in=latest_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0022_card_image_url_small"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_prices, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="cardprice",
+            unique_together={("card",)},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-19 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0023_cardprice_unique_card"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="source_fingerprint",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from .user import User
-from .card import Card, CardPrice
+from .card import Card, CardPrice, CardFeatures
 from .collection import Collection
 from .set import Set
 from .favorites import Favorites
@@ -1,3 +1,4 @@
+import numpy as np
 from django.db import models
 from djmoney.models.fields import MoneyField
 from django.contrib.postgres.fields import ArrayField
@@ -40,13 +41,13 @@ class Card(models.Model):
     number = models.CharField(max_length=20)
     rarity = models.CharField(max_length=50, choices=RARITY_CHOICES, db_index=True)
     image_url = models.URLField()
+    # Vignette (images.small de l'API TCG), suffisante pour les embeddings à 224px
+    image_url_small = models.URLField(blank=True, default='')
     price = MoneyField(max_digits=10, decimal_places=2, default_currency='USD')
     description = models.TextField(blank=True)
-    clip_embedding = models.JSONField(blank=True, null=True)
-    phash = models.CharField(max_length=64, blank=True, null=True)
-    histogram = models.JSONField(blank=True, null=True)
-    descriptors = models.BinaryField(blank=True, null=True)
     release_date = models.DateField()
+    # SHA-256 de l'entrée source (api/card_ingestion.record_fingerprint): une entrée identique n'est pas réécrite
+    source_fingerprint = models.CharField(max_length=64, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -58,6 +59,71 @@ class Card(models.Model):
         return f"{self.name} ({self.set} #{self.number})"
 
 
+class CardFeatures(models.Model):
+    """Features d'identification d'une carte, hors de la ligne Card pour que le catalogue ne les charge jamais"""
+    card = models.OneToOneField(Card, on_delete=models.CASCADE, primary_key=True, related_name='features')
+    clip_embedding = models.JSONField(blank=True, null=True)
+    phash = models.CharField(max_length=64, blank=True, null=True)
+    histogram = models.BinaryField(blank=True, null=True)  # api.cv_features.pack_histogram
+    descriptors = models.BinaryField(blank=True, null=True)
+    image_hash = models.CharField(max_length=64, blank=True, null=True)
+    version = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    image_url = models.URLField(blank=True, null=True)
+    updated_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Features {self.card_id} ({self.version})"
+
+
+def daily_price_curves(avg1, avg7, avg30):
+    """
+    Courbes de prix journalières (jours 1 à 30) d'un lot de cartes, interpolées (PCHIP) entre avg1, avg7 et avg30
+    Un point de contrôle est ajouté au jour 12 (pic ou creux) ou 15 quand les tendances le justifient;
+    les cartes qui partagent les mêmes jours de contrôle sont interpolées en un seul appel.
+    Returns:
+        list: Un dict {"day_1": ..., "day_30": ...} par carte
+    """
+    from scipy.interpolate import PchipInterpolator
+
+    avg1 = np.asarray(avg1, dtype=np.float64)
+    avg7 = np.asarray(avg7, dtype=np.float64)
+    avg30 = np.asarray(avg30, dtype=np.float64)
+
+    trend1 = avg7 - avg1
+    trend2 = avg30 - avg7
+    with np.errstate(invalid="ignore"):
+        should_fluctuate = ((trend1 > 0) & (trend2 > 0) & (np.abs(trend1 / 6 - trend2 / 23) > 0.05)) | (trend1 * trend2 < 0)
+
+    peak = should_fluctuate & (trend1 > 0) & (trend2 < 0)
+    trough = should_fluctuate & (trend1 < 0) & (trend2 > 0)
+    middle = should_fluctuate & ~peak & ~trough & (np.abs(trend1) > np.abs(trend2)) & (trend1 * trend2 > 0)
+
+    extra_value = np.select(
+        [peak, trough, middle],
+        [avg7 + (avg7 - avg1) * 0.15, avg7 - (avg1 - avg7) * 0.15, avg7 + (trend2 / 23) * 8],
+    )
+    days = np.arange(1, 31)
+    curves = np.empty((len(avg1), len(days)))
+    for extra_day, mask in ((None, ~(peak | trough | middle)), (12, peak | trough), (15, middle)):
+        if not mask.any():
+            continue
+        control_days = [1, 7, 30]
+        control_values = [avg1[mask], avg7[mask], avg30[mask]]
+        if extra_day is not None:
+            control_days.insert(2, extra_day)
+            control_values.insert(2, extra_value[mask])
+        curves[mask] = PchipInterpolator(control_days, np.stack(control_values), axis=0)(days).T
+
+    result = []
+    for row, a1, a7, a30 in zip(curves.tolist(), avg1.tolist(), avg7.tolist(), avg30.tolist()):
+        daily_prices = {f"day_{day}": round(price, 2) for day, price in zip(range(1, 31), row)}
+        daily_prices["day_1"] = round(a1, 2)
+        daily_prices["day_7"] = round(a7, 2)
+        daily_prices["day_30"] = round(a30, 2)
+        result.append(daily_prices)
+    return result
+
+
 class CardPrice(models.Model):
     card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name='prices')
     avg1 = models.DecimalField(max_digits=10, decimal_places=2)
@@ -66,54 +132,7 @@ class CardPrice(models.Model):
     daily_price = models.JSONField(default=dict)
 
     def calculate_daily_price(self):
-        daily_prices = {}
-        avg1, avg7, avg30 = float(self.avg1), float(self.avg7), float(self.avg30)
-
-        trend1 = avg7 - avg1
-        trend2 = avg30 - avg7
-
-        should_fluctuate = False
-
-        if (trend1 > 0 and trend2 > 0 and abs(trend1/6 - trend2/23) > 0.05) or (trend1 * trend2 < 0):
-            should_fluctuate = True
-
-        control_points = []
-        control_points.append((1, avg1))
-        control_points.append((7, avg7))
-        control_points.append((30, avg30))
-
-        if should_fluctuate:
-            if trend1 > 0 and trend2 < 0:
-                peak_day = 12
-                peak_value = avg7 + (avg7 - avg1) * 0.15
-                control_points.append((peak_day, peak_value))
-            elif trend1 < 0 and trend2 > 0:
-                trough_day = 12
-                trough_value = avg7 - (avg1 - avg7) * 0.15
-                control_points.append((trough_day, trough_value))
-            elif abs(trend1) > abs(trend2) and trend1 * trend2 > 0:
-                mid_day = 15
-                mid_value = avg7 + (trend2 / 23) * 8
-                control_points.append((mid_day, mid_value))
-
-        control_points.sort(key=lambda x: x[0])
-
-        from scipy.interpolate import PchipInterpolator
-
-        days = [point[0] for point in control_points]
-        values = [point[1] for point in control_points]
-
-        interpolator = PchipInterpolator(days, values)
-
-        for day in range(1, 31):
-            price = float(interpolator(day))
-            daily_prices[f"day_{day}"] = round(price, 2)
-
-        daily_prices["day_1"] = round(avg1, 2)
-        daily_prices["day_7"] = round(avg7, 2)
-        daily_prices["day_30"] = round(avg30, 2)
-
-        self.daily_price = daily_prices
+        self.daily_price = daily_price_curves([self.avg1], [self.avg7], [self.avg30])[0]
 
     def save(self, *args, **kwargs):
         self.calculate_daily_price()
@@ -121,3 +140,5 @@ class CardPrice(models.Model):
 
     class Meta:
         ordering = ['card']
+        # Une ligne de prix par carte: permet l'upsert groupé de api/card_ingestion.py
+        unique_together = ['card']
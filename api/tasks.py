@@ -0,0 +1,92 @@
+import base64
+import io
+import logging
+import time
+import uuid
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+from api.metrics import observe_stages, record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+
+def _job_key(job_id):
+    return f"identification-job:{job_id}"
+
+
+def get_job(job_id):
+    job = cache.get(_job_key(job_id))
+    record_cache_lookup("identification_jobs", job is not None)
+    return job
+
+
+def update_job(job_id, **fields):
+    job = get_job(job_id) or {"job_id": job_id}
+    job.update(fields)
+    job["updated_at"] = time.time()
+    cache.set(_job_key(job_id), job, settings.CARD_ID_JOB_TTL)
+    return job
+
+
+def encode_image(image: Image.Image) -> str:
+    """Sérialise l'image déjà réduite pour le message de la file"""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def decode_image(payload: str) -> Image.Image:
+    return Image.open(io.BytesIO(base64.b64decode(payload))).convert("RGB")
+
+
+def enqueue_identification(image: Image.Image):
+    """
+    Crée un job d'identification et le place dans la file
+    Args:
+        image: Image RGB déjà décodée et réduite
+    Returns:
+        dict: État initial du job
+    """
+    job_id = uuid.uuid4().hex
+    job = update_job(job_id, status=JOB_PENDING, created_at=time.time())
+    identify_card_job.delay(job_id, encode_image(image))
+    return get_job(job_id) or job
+
+
+@shared_task(acks_late=True)
+def identify_card_job(job_id, image_payload):
+    from api.views.card_identification import get_identifier
+
+    update_job(job_id, status=JOB_RUNNING, started_at=time.time())
+    try:
+        image = decode_image(image_payload)
+        step_start = time.time()
+        identifier = get_identifier()
+        model_init_time = time.time() - step_start
+
+        step_start = time.time()
+        result = identifier.identify_card(image)
+        identification_time = time.time() - step_start
+
+        result['performance'] = {
+            'model_init_time': round(model_init_time, 2),
+            'identification_time': round(identification_time, 2)
+        }
+        observe_stages('job', {
+            'model_init_time': model_init_time,
+            'identification_time': identification_time
+        })
+        update_job(job_id, status=JOB_DONE, result=result, finished_at=time.time())
+        logger.info(f"✅ Job {job_id} terminé en {identification_time:.2f}s")
+    except Exception as e:
+        logger.error(f"❌ Job {job_id} en échec: {str(e)}")
+        update_job(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
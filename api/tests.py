@@ -1 +1,542 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from api.async_downloader import AsyncImageDownloader
+from api.card_ingestion import CardIngestor
+from api.image_cache import ImageCache
+from api.middleware import MetricsMiddleware
+from api.models import Card, CardPrice, User
+from api.throttling import IdentificationTokenBucketThrottle
+from api.views.card_identification import CardIdentificationView, MultiCardIdentificationView, identify_within_deadline
+from api.views.card_identification_async import AsyncCardIdentificationView
+from api.yolo11.admission import DeadlineExceededError
+
+IMAGE_BYTES = b"\x89PNG\r\n\x1a\n" + b"0" * 1024
+ETAG = '"card-v1"'
+
+
+class ConditionalImageServer:
+    """Sert une image avec un ETag et répond 304 quand If-None-Match correspond"""
+
+    def __init__(self):
+        self.conditional_requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if_none_match = self.headers.get("If-None-Match")
+                server.conditional_requests.append(if_none_match)
+                if if_none_match == ETAG:
+                    self.send_response(304)
+                    self.send_header("ETag", ETAG)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", ETAG)
+                self.send_header("Last-Modified", "Mon, 19 Oct 2026 10:00:00 GMT")
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(IMAGE_BYTES)))
+                self.end_headers()
+                self.wfile.write(IMAGE_BYTES)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/base1/4.png"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ImageCacheRevalidationTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ConditionalImageServer()
+        self.addCleanup(self.server.close)
+        # max_age=0: chaque lecture après la première est une revalidation
+        self.cache = ImageCache(directory=tempfile.mkdtemp(), max_bytes=0, max_age=0)
+
+    def test_async_backend_revalidates_with_etag(self):
+        async def fetch_twice():
+            async with AsyncImageDownloader(retries=0) as downloader:
+                first = await self.cache.fetch_async(self.server.url, downloader)
+                second = await self.cache.fetch_async(self.server.url, downloader)
+            return first, second
+
+        first, second = asyncio.run(fetch_twice())
+
+        self.assertEqual((first.status, second.status), ("miss", "revalidated"))
+        self.assertEqual(self.server.conditional_requests, [None, ETAG])
+        self.assertEqual(second.read_bytes(), IMAGE_BYTES)
+
+    def test_sync_backend_revalidates_with_etag(self):
+        first = self.cache.fetch(self.server.url)
+        second = self.cache.fetch(self.server.url)
+
+        self.assertEqual((first.status, second.status), ("miss", "revalidated"))
+        self.assertEqual(self.server.conditional_requests, [None, ETAG])
+
+
+class ImageCacheEvictionRaceTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ConditionalImageServer()
+        self.addCleanup(self.server.close)
+        self.cache = ImageCache(directory=tempfile.mkdtemp(), max_bytes=0, max_age=3600)
+        real_utime = os.utime
+
+        def evicted_utime(path, *args, **kwargs):
+            # Un autre thread évince l'entrée entre la lecture des métadonnées et la mise à jour LRU
+            os.remove(path)
+            return real_utime(path, *args, **kwargs)
+
+        self.evicted_utime = evicted_utime
+
+    def test_evicted_hit_is_downloaded_again(self):
+        self.cache.fetch(self.server.url)
+        with mock.patch("api.image_cache.os.utime", self.evicted_utime):
+            second = self.cache.fetch(self.server.url)
+
+        self.assertEqual(second.status, "miss")
+        self.assertEqual(second.read_bytes(), IMAGE_BYTES)
+        self.assertEqual(self.server.conditional_requests, [None, None])
+
+    def test_entry_evicted_during_revalidation_is_downloaded_again(self):
+        async def fetch_twice():
+            async with AsyncImageDownloader(retries=0) as downloader:
+                await self.cache.fetch_async(self.server.url, downloader)
+                with mock.patch("api.image_cache.os.utime", self.evicted_utime):
+                    return await self.cache.fetch_async(self.server.url, downloader, revalidate=True)
+
+        second = asyncio.run(fetch_twice())
+
+        self.assertEqual(second.status, "miss")
+        self.assertEqual(second.read_bytes(), IMAGE_BYTES)
+        self.assertEqual(self.server.conditional_requests, [None, ETAG, None])
+
+
+class RecordingSink:
+    def __init__(self):
+        self.chunks = []
+        self.resets = 0
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+    def reset(self):
+        self.chunks = []
+        self.resets += 1
+
+
+class BrokenBody(httpx.AsyncByteStream):
+    """Corps coupé après le premier morceau"""
+
+    async def __aiter__(self):
+        yield IMAGE_BYTES[:100]
+        raise httpx.ReadError("connexion coupée")
+
+
+class AsyncImageDownloaderTests(SimpleTestCase):
+    def download(self, handler, urls, sink=None, **options):
+        """Télécharge urls avec handler comme serveur; renvoie les résultats (ou exceptions) et les délais d'attente"""
+        options = {'retries': 3, 'backoff': 0.1, 'transport': httpx.MockTransport(handler), **options}
+        sleep = mock.AsyncMock()
+
+        async def run():
+            async with AsyncImageDownloader(**options) as downloader:
+                results = await asyncio.gather(*(downloader.fetch(url, sink=sink) for url in urls),
+                                               return_exceptions=True)
+            return results, downloader.stats
+
+        with mock.patch('api.async_downloader.asyncio.sleep', sleep):
+            results, stats = asyncio.run(run())
+        return results, stats, [call.args[0] for call in sleep.await_args_list]
+
+    def test_retries_server_errors_with_exponential_backoff(self):
+        statuses = iter([503, 502, 200])
+
+        def handler(request):
+            return httpx.Response(next(statuses), content=IMAGE_BYTES)
+
+        with self.assertLogs('api.async_downloader', 'WARNING'):
+            [result], stats, delays = self.download(handler, ['https://images.example/1.png'])
+
+        self.assertEqual((result.status_code, result.attempts, result.content), (200, 3, IMAGE_BYTES))
+        self.assertEqual((stats.files, stats.retries, stats.errors), (1, 2, 0))
+        # Gigue entre la moitié et la totalité de backoff * 2^tentative
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0.05 <= delays[0] <= 0.1 and 0.1 <= delays[1] <= 0.2, delays)
+
+    def test_gives_up_after_the_last_retry(self):
+        def handler(request):
+            return httpx.Response(500)
+
+        with self.assertLogs('api.async_downloader', 'WARNING') as logs:
+            [error], stats, delays = self.download(handler, ['https://images.example/1.png'], retries=2)
+
+        self.assertIsInstance(error, httpx.HTTPStatusError)
+        self.assertEqual((stats.files, stats.retries, stats.errors), (0, 2, 1))
+        self.assertEqual(len(logs.records), 2)
+
+    def test_client_errors_are_not_retried(self):
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(404)
+
+        [error], stats, delays = self.download(handler, ['https://images.example/1.png'])
+
+        self.assertIsInstance(error, httpx.HTTPStatusError)
+        self.assertEqual((len(requests_seen), delays, stats.errors), (1, [], 1))
+
+    def test_retry_after_overrides_backoff(self):
+        statuses = iter([(429, '1.5'), (503, '120'), (200, None)])
+
+        def handler(request):
+            status, retry_after = next(statuses)
+            headers = {'Retry-After': retry_after} if retry_after else {}
+            return httpx.Response(status, headers=headers, content=IMAGE_BYTES)
+
+        with self.assertLogs('api.async_downloader', 'WARNING'):
+            [result], stats, delays = self.download(handler, ['https://images.example/1.png'])
+
+        self.assertEqual(result.attempts, 3)
+        # Retry-After borné à MAX_BACKOFF
+        self.assertEqual(delays, [1.5, 30.0])
+
+    def test_per_host_limit_bounds_concurrent_requests_to_each_host(self):
+        active = {}
+        peak = {}
+
+        async def handler(request):
+            host = request.url.host
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+            peak['total'] = max(peak.get('total', 0), sum(active.values()))
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+            return httpx.Response(200, content=IMAGE_BYTES)
+
+        urls = [f'https://{host}/{number}.png' for host in ('a.example', 'b.example') for number in range(10)]
+
+        async def run():
+            async with AsyncImageDownloader(per_host_limit=2, max_concurrency=16,
+                                            transport=httpx.MockTransport(handler)) as downloader:
+                return await asyncio.gather(*(downloader.fetch(url) for url in urls))
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(results), 20)
+        self.assertEqual(peak, {'a.example': 2, 'b.example': 2, 'total': 4})
+
+    def test_sink_is_reset_when_the_body_breaks_mid_transfer(self):
+        responses = iter([httpx.Response(200, stream=BrokenBody()), httpx.Response(200, content=IMAGE_BYTES)])
+        sink = RecordingSink()
+
+        def handler(request):
+            return next(responses)
+
+        with self.assertLogs('api.async_downloader', 'WARNING'):
+            [result], stats, delays = self.download(handler, ['https://images.example/1.png'], sink=sink)
+
+        self.assertEqual((result.attempts, result.size, result.content), (2, len(IMAGE_BYTES), None))
+        self.assertEqual(sink.resets, 1)
+        self.assertEqual(b''.join(sink.chunks), IMAGE_BYTES)
+
+
+def seed_records(count, set_id='base1'):
+    """Entrées au format du seed JSON"""
+    return [
+        {'id': f'{set_id}-{number}', 'name': f'Card {number}', 'set_id': set_id, 'set_name': 'Base',
+         'number': str(number), 'rarity': 'Common', 'release_date': '1999/01/09',
+         'images': {'small': 'https://images.example/4.png', 'large': 'https://images.example/4_hires.png'},
+         'prices': {'normal': {'market': 1.5}},
+         'cardmarket': {'prices': {'avg1': 1.4, 'avg7': 1.5, 'avg30': 1.6}}}
+        for number in range(1, count + 1)
+    ]
+
+
+class CardIngestorQueryLogTests(TestCase):
+    def test_ingest_keeps_captured_queries(self):
+        cards_data = seed_records(5)
+        with self.settings(DEBUG=True), CaptureQueriesContext(connection) as captured:
+            stats = CardIngestor(batch_size=2).ingest(cards_data)
+
+        self.assertEqual(stats.created, 5)
+        self.assertGreater(len(captured.captured_queries), 0)
+
+
+class CardIngestorFingerprintTests(TestCase):
+    def setUp(self):
+        self.cards_data = seed_records(6)
+        CardIngestor(batch_size=4).ingest(self.cards_data)
+        self.updated_at = dict(Card.objects.values_list('number', 'updated_at'))
+
+    def test_unchanged_records_are_not_rewritten(self):
+        stats = CardIngestor(batch_size=4).ingest(self.cards_data)
+
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 0, 6))
+        self.assertEqual(dict(Card.objects.values_list('number', 'updated_at')), self.updated_at)
+
+    def test_only_the_changed_record_is_rewritten(self):
+        self.cards_data[2] = {**self.cards_data[2], 'name': 'Renamed'}
+
+        stats = CardIngestor(batch_size=4).ingest(self.cards_data)
+
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 1, 5))
+        updated_at = dict(Card.objects.values_list('number', 'updated_at'))
+        self.assertEqual([number for number in updated_at if updated_at[number] != self.updated_at[number]], ['3'])
+        self.assertEqual(Card.objects.get(number='3').name, 'Renamed')
+
+    def test_force_rewrites_every_record(self):
+        stats = CardIngestor(batch_size=4, force=True).ingest(self.cards_data)
+
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 6, 0))
+        updated_at = dict(Card.objects.values_list('number', 'updated_at'))
+        self.assertTrue(all(updated_at[number] > self.updated_at[number] for number in updated_at))
+
+
+class CardIngestorWriteTests(TestCase):
+    def ingest_counting_queries(self, cards_data, batch_size):
+        with CaptureQueriesContext(connection) as captured:
+            stats = CardIngestor(batch_size=batch_size).ingest(cards_data)
+        return stats, len(captured.captured_queries)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small, small_queries = self.ingest_counting_queries(seed_records(12, set_id='small'), batch_size=4)
+        large, large_queries = self.ingest_counting_queries(seed_records(150, set_id='large'), batch_size=50)
+
+        self.assertEqual((small.batches, large.batches), (3, 3))
+        self.assertEqual((small.created, large.created), (12, 150))
+        self.assertEqual(small_queries, large_queries)
+
+    def test_bad_row_falls_back_to_row_by_row_writes(self):
+        cards_data = seed_records(5)
+        # avg1 dépasse max_digits de CardPrice: seul l'upsert groupé des prix échoue
+        cards_data[1] = {**cards_data[1], 'cardmarket': {'prices': {'avg1': 1e12, 'avg7': 1.5, 'avg30': 1.6}}}
+
+        with self.assertLogs('api.card_ingestion', 'WARNING') as logs:
+            stats = CardIngestor(batch_size=5).ingest(cards_data)
+
+        self.assertEqual((stats.created, stats.errors, stats.fallback_batches), (4, 1, 1))
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(sorted(Card.objects.values_list('number', flat=True)), ['1', '3', '4', '5'])
+        self.assertEqual(CardPrice.objects.count(), 4)
+
+    def test_reingest_updates_prices_in_place(self):
+        cards_data = seed_records(3)
+        CardIngestor().ingest(cards_data)
+        price_ids = dict(CardPrice.objects.values_list('card__number', 'id'))
+
+        repriced = [{**card_data, 'cardmarket': {'prices': {'avg1': 2.4, 'avg7': 2.5, 'avg30': 2.6}}}
+                    for card_data in cards_data]
+        stats = CardIngestor().ingest(repriced)
+
+        self.assertEqual((stats.created, stats.updated), (0, 3))
+        self.assertEqual(dict(CardPrice.objects.values_list('card__number', 'id')), price_ids)
+        self.assertEqual(set(CardPrice.objects.values_list('avg1', 'avg7', 'avg30')),
+                         {(Decimal('2.40'), Decimal('2.50'), Decimal('2.60'))})
+
+
+def run_queries(count):
+    with connections['default'].cursor() as cursor:
+        for _ in range(count):
+            cursor.execute("SELECT 1")
+
+
+class MetricsMiddlewareQueryCountTests(TestCase):
+    def observed_query_count(self, middleware, request):
+        observed = []
+        middleware._observe = lambda request, response, duration, query_count: observed.append(query_count)
+        if middleware.is_async:
+            async def call():
+                return await middleware(request)
+            async_to_sync(call)()
+        else:
+            middleware(request)
+        return observed[0]
+
+    def test_counts_sync_view_queries(self):
+        def view(request):
+            run_queries(3)
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(view)
+        self.assertEqual(self.observed_query_count(middleware, RequestFactory().get('/')), 3)
+
+    def test_counts_async_view_queries_run_in_worker_threads(self):
+        async def view(request):
+            await sync_to_async(run_queries)(2)
+            await sync_to_async(run_queries, thread_sensitive=False)(3)
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(view)
+        self.assertEqual(self.observed_query_count(middleware, RequestFactory().get('/')), 5)
+
+
+class MetricsEndpointTests(TestCase):
+    def test_anonymous_requests_are_refused(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+    def test_staff_session_is_allowed(self):
+        staff = User.objects.create_user('ops', 'ops@example.com', 'password', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get('/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_duration_seconds', response.content.decode())
+
+    def test_non_staff_session_is_refused(self):
+        self.client.force_login(User.objects.create_user('player', 'player@example.com', 'password'))
+
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+    def test_scraper_token(self):
+        with self.settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    def test_empty_token_setting_accepts_no_bearer(self):
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+class IdentificationThrottleTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_requests_do_not_share_a_token(self):
+        request = SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=1))
+        get = LocMemCache.get
+
+        def slow_get(self, *args, **kwargs):
+            # Élargit la fenêtre entre la lecture et l'écriture du seau
+            value = get(self, *args, **kwargs)
+            time.sleep(0.01)
+            return value
+
+        # Le proxy django.core.cache.cache a une instance par thread: patcher la classe
+        with self.settings(CARD_ID_RATE_CAPACITY=5, CARD_ID_RATE_REFILL_PER_SEC=0.001), \
+                mock.patch.object(LocMemCache, "get", slow_get):
+            with ThreadPoolExecutor(max_workers=10) as executor:
+                allowed = list(executor.map(
+                    lambda _: IdentificationTokenBucketThrottle().allow_request(request, None), range(20)
+                ))
+
+        self.assertEqual(sum(allowed), 5)
+
+
+class DirectIdentificationDeadlineTests(SimpleTestCase):
+    def test_direct_path_gives_up_at_the_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        identifier = SimpleNamespace(identify_card=lambda image: release.wait(5))
+
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceededError):
+            identify_within_deadline(identifier, None, timeout=0.1)
+
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_direct_path_returns_the_result_in_time(self):
+        identifier = SimpleNamespace(identify_card=lambda image: {"card_id": image})
+        self.assertEqual(identify_within_deadline(identifier, "base1-4", timeout=1), {"card_id": "base1-4"})
+
+
+class MultiCardIdentificationDeadlineTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def upload(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 1280), 'white').save(buffer, format='PNG')
+        buffer.seek(0)
+        buffer.name = 'binder.png'
+        return RequestFactory().post('/api/card-identification/multi/', {'image': buffer})
+
+    def test_detection_past_the_deadline_returns_503(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_detection(*args):
+            release.wait(5)
+            return []
+
+        start = time.perf_counter()
+        with self.settings(CARD_ID_REQUEST_DEADLINE=0.2), \
+                mock.patch('api.views.card_identification.get_identifier'), \
+                mock.patch('api.views.card_identification.get_detector'), \
+                mock.patch('api.views.card_identification.detect_and_identify_cards', slow_detection), \
+                self.assertLogs('api.views.card_identification', 'WARNING'):
+            response = MultiCardIdentificationView.as_view()(self.upload())
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.CARD_ID_RETRY_AFTER))
+        self.assertLess(time.perf_counter() - start, 2)
+
+
+class IdentificationAccessTests(TestCase):
+    """La vue ASGI applique l'authentification et le quota de la vue DRF, avec les mêmes réponses"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def call(self, view, **headers):
+        request = RequestFactory().post('/api/card-identification/', **headers)
+        if view is AsyncCardIdentificationView:
+            response = async_to_sync(view.as_view())(request)
+        else:
+            response = view.as_view()(request)
+            response.render()
+        return response.status_code, json.loads(response.content), response.get('WWW-Authenticate'), response.get('Retry-After')
+
+    def responses(self, requests, **headers):
+        observed = {}
+        for view in (CardIdentificationView, AsyncCardIdentificationView):
+            cache.clear()
+            observed[view] = [self.call(view, **headers) for _ in range(requests)]
+        return observed[CardIdentificationView], observed[AsyncCardIdentificationView]
+
+    def test_invalid_token_is_rejected_the_same_way(self):
+        sync, asynchronous = self.responses(1, HTTP_AUTHORIZATION='Bearer not-a-token')
+
+        self.assertEqual(sync[0][0], 401)
+        self.assertEqual(asynchronous, sync)
+
+    def test_quota_is_enforced_the_same_way(self):
+        with self.settings(CARD_ID_RATE_CAPACITY=1, CARD_ID_RATE_REFILL_PER_SEC=0.001):
+            sync, asynchronous = self.responses(2)
+
+        # Le premier passe (400: pas d'image), le second est refusé
+        self.assertEqual([status for status, *_ in sync], [400, 429])
+        self.assertEqual(asynchronous, sync)
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+from api.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Verrou du seau d'un client: libéré d'office après LOCK_TIMEOUT s si le processus meurt,
+# attendu au plus LOCK_WAIT s avant de refuser la requête
+LOCK_TIMEOUT = 2
+LOCK_WAIT = 1
+# Cache local au processus (LocMemCache): un verrou de processus suffit
+_local_lock = threading.Lock()
+
+
+class IdentificationTokenBucketThrottle(BaseThrottle):
+    """
+    Quota par utilisateur (ou par IP pour les anonymes) en seau à jetons, stocké dans le cache Django
+    Le seau contient au plus CARD_ID_RATE_CAPACITY jetons et se remplit de
+    CARD_ID_RATE_REFILL_PER_SEC jetons par seconde. DRF renvoie 429 avec Retry-After.
+    La lecture et l'écriture du seau se font sous verrou (cache.lock de django-redis, sinon un verrou
+    de processus), pour que deux requêtes simultanées d'un client ne dépensent pas le même jeton.
+    """
+
+    cache_prefix = "throttle-identification"
+
+    def __init__(self):
+        self.capacity = settings.CARD_ID_RATE_CAPACITY
+        self.refill_rate = settings.CARD_ID_RATE_REFILL_PER_SEC
+        self._wait = None
+
+    def get_cache_key(self, request):
+        if request.user and request.user.is_authenticated:
+            ident = f"user-{request.user.pk}"
+        else:
+            ident = f"ip-{self.get_ident(request)}"
+        return f"{self.cache_prefix}:{ident}"
+
+    def allow_request(self, request, view):
+        if self.capacity <= 0:
+            return True
+
+        key = self.get_cache_key(request)
+        try:
+            lock = self._acquire_bucket_lock(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Verrou du quota indisponible pour {key}: {e}")
+            lock = None
+        if lock is None:
+            self._wait = LOCK_WAIT
+            return False
+        try:
+            return self._take_token(key)
+        finally:
+            try:
+                lock.release()
+            except Exception as e:
+                # Verrou expiré (LOCK_TIMEOUT) pendant la mise à jour: rien à libérer
+                logger.warning(f"⚠️ Libération du verrou du quota {key}: {e}")
+
+    def _acquire_bucket_lock(self, key):
+        """
+        Returns:
+            Le verrou acquis, ou None s'il n'a pas pu l'être en LOCK_WAIT secondes
+        """
+        if hasattr(cache, "lock"):
+            lock = cache.lock(f"{key}:lock", timeout=LOCK_TIMEOUT, sleep=0.01, blocking_timeout=LOCK_WAIT)
+            return lock if lock.acquire() else None
+        return _local_lock if _local_lock.acquire(timeout=LOCK_WAIT) else None
+
+    def _take_token(self, key):
+        now = time.time()
+        bucket = cache.get(key)
+        record_cache_lookup("throttle", bucket is not None)
+        tokens, updated_at = bucket if bucket is not None else (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_rate)
+
+        if tokens < 1:
+            self._wait = (1 - tokens) / self.refill_rate if self.refill_rate > 0 else None
+            cache.set(key, (tokens, now), self._bucket_ttl())
+            return False
+
+        cache.set(key, (tokens - 1, now), self._bucket_ttl())
+        return True
+
+    def wait(self):
+        return self._wait
+
+    def _bucket_ttl(self):
+        # Un seau inactif assez longtemps pour se remplir entièrement peut être oublié
+        if self.refill_rate <= 0:
+            return None
+        return int(self.capacity / self.refill_rate) + 1
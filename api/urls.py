@@ -2,6 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import CardViewSet, CardIdentificationView, CollectionViewSet, UserViewSet, SetViewSet, FavoritesViewSet, NewsViewSet
 from .views.user import LogoutView
+from .views.card_identification_async import AsyncCardIdentificationView
+from .views.card_identification import MultiCardIdentificationView, ModelStatusView, CardIdentificationJobView, CardIdentificationJobDetailView
 
 router = DefaultRouter()
 router.register(r'cards', CardViewSet)
@@ -14,6 +16,11 @@ router.register(r'news', NewsViewSet, basename='news')
 urlpatterns = [
     path('', include(router.urls)),
     path('card-identification/', CardIdentificationView.as_view(), name='card-identification'),
+    path('card-identification/async/', AsyncCardIdentificationView.as_view(), name='card-identification-async'),
+    path('card-identification/multi/', MultiCardIdentificationView.as_view(), name='card-identification-multi'),
+    path('card-identification/status/', ModelStatusView.as_view(), name='card-identification-status'),
+    path('card-identification/jobs/', CardIdentificationJobView.as_view(), name='card-identification-jobs'),
+    path('card-identification/jobs/<str:job_id>/', CardIdentificationJobDetailView.as_view(), name='card-identification-job-detail'),
     path('user/profile/', UserViewSet.as_view({'get': 'profile'}), name='user-profile'),
     path('user/update/', UserViewSet.as_view({'patch': 'update_profile'}), name='user-profile-update'),
     path('user/profile/data/', UserViewSet.as_view({'get': 'profile_data'}), name='user-profile-data'),
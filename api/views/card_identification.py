@@ -1,20 +1,34 @@
 # views/card_identification.py
 import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from django.core.cache import cache
 import time
-import io
 import logging
-from PIL import Image
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
 from api.yolo11.identify import CardIdentifierFromDB
+from api.yolo11.detection import detect_and_identify_cards, get_detector
+from api.yolo11.batching import MicroBatchScheduler
+from api.yolo11.admission import AdmissionController, OverloadedError, DeadlineExceededError
+from api.throttling import IdentificationTokenBucketThrottle
+from api.metrics import REGISTRY, IDENTIFICATION_REJECTED, observe_stages
+from api.yolo11.image_loading import open_upload, ImageTooLargeError
+from api.tasks import enqueue_identification, get_job, FINISHED_STATUSES
 
 logger = logging.getLogger(__name__)
 
 _identifier_instance = None
 _initialization_lock = threading.Lock()
 _is_initializing = False
+_scheduler_instance = None
+_scheduler_lock = threading.Lock()
+_admission_controller = None
+_inference_executor = None
+_executor_lock = threading.Lock()
 
 def initialize_model():
     global _identifier_instance, _is_initializing
@@ -39,14 +53,127 @@ def get_identifier():
         raise Exception("Le modèle CLIP n'a pas pu être initialisé")
     return _identifier_instance
 
+def get_scheduler():
+    """Ordonnanceur de micro-lots partagé, ou None si le regroupement est désactivé"""
+    global _scheduler_instance
+    if settings.CARD_ID_BATCH_WINDOW_MS <= 0:
+        return None
+    if _scheduler_instance is None:
+        identifier = get_identifier()
+        with _scheduler_lock:
+            if _scheduler_instance is None:
+                _scheduler_instance = MicroBatchScheduler(
+                    identifier,
+                    max_batch_size=settings.CARD_ID_MAX_BATCH_SIZE,
+                    max_wait_ms=settings.CARD_ID_BATCH_WINDOW_MS
+                )
+    return _scheduler_instance
+
+def get_inference_executor():
+    """Pool de threads dédié à l'inférence, séparé des threads qui servent les vues"""
+    global _inference_executor
+    if _inference_executor is None:
+        with _executor_lock:
+            if _inference_executor is None:
+                _inference_executor = ThreadPoolExecutor(
+                    max_workers=settings.CARD_ID_INFERENCE_WORKERS,
+                    thread_name_prefix="card-id-inference"
+                )
+    return _inference_executor
+
+def run_within_deadline(timeout, function, *args):
+    """
+    Exécute function(*args) dans le pool d'inférence borné, abandonnée après timeout secondes
+    Raises:
+        DeadlineExceededError: Résultat non disponible à temps (le calcul déjà commencé se termine en arrière-plan)
+    """
+    future = get_inference_executor().submit(function, *args)
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        # Encore dans la file du pool: ne sera jamais exécutée
+        future.cancel()
+        raise DeadlineExceededError(f"Identification non terminée après {timeout:.1f}s")
+
+def identify_within_deadline(identifier, image, timeout):
+    """Identification directe (sans micro-lots) dans le pool d'inférence, abandonnée après timeout secondes"""
+    return run_within_deadline(timeout, identifier.identify_card, image)
+
+def get_admission_controller():
+    global _admission_controller
+    if _admission_controller is None:
+        with _scheduler_lock:
+            if _admission_controller is None:
+                _admission_controller = AdmissionController(settings.CARD_ID_MAX_QUEUE_DEPTH)
+    return _admission_controller
+
+def service_unavailable(message, reason):
+    """
+    Réponse 503 rapide avec Retry-After pour que le client réessaie plus tard
+    JsonResponse plutôt que Response: utilisable telle quelle par les APIView et par la vue ASGI
+    """
+    IDENTIFICATION_REJECTED.labels(reason=reason).inc()
+    response = JsonResponse(
+        {"error": message, "retry_in": settings.CARD_ID_RETRY_AFTER},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response["Retry-After"] = str(settings.CARD_ID_RETRY_AFTER)
+    return response
+
+def check_identification_access(request):
+    """
+    Authentification, permissions et quota de CardIdentificationView appliqués à une requête Django
+    hors DRF (vue ASGI): mêmes classes, mêmes réglages et mêmes réponses 401/429 que la vue synchrone
+    Returns:
+        Response: Refus déjà rendu, ou None si la requête peut continuer (request.user renseigné)
+    """
+    view = CardIdentificationView()
+    view.args, view.kwargs = (), {}
+    drf_request = view.initialize_request(request)
+    view.request = drf_request
+    view.headers = view.default_response_headers
+    try:
+        view.initial(drf_request)
+    except Exception as exc:
+        return view.finalize_response(drf_request, view.handle_exception(exc)).render()
+    request.user = drf_request.user
+    return None
+
 def is_model_ready():
     return _identifier_instance is not None
 
 def is_model_initializing():
     return _is_initializing
 
+REGISTRY.gauge(
+    "card_identification_model_loaded",
+    "1 si le modèle CLIP est chargé dans ce processus"
+).set_function(lambda: 1 if is_model_ready() else 0)
+REGISTRY.gauge(
+    "card_identification_model_initializing",
+    "1 si le modèle CLIP est en cours de chargement"
+).set_function(lambda: 1 if is_model_initializing() else 0)
+REGISTRY.gauge(
+    "card_identification_index_size",
+    "Nombre d'embeddings de cartes dans l'index de recherche"
+).set_function(lambda: len(_identifier_instance.metadata) if _identifier_instance is not None else 0)
+REGISTRY.gauge(
+    "card_identification_in_flight",
+    "Identifications admises en attente ou en cours"
+).set_function(lambda: _admission_controller.stats()['in_flight'] if _admission_controller is not None else 0)
+
 class CardIdentificationView(APIView):
+    throttle_classes = [IdentificationTokenBucketThrottle]
+
     def post(self, request):
+        try:
+            with get_admission_controller().admit():
+                return self._identify(request)
+        except OverloadedError as e:
+            logger.warning(f"⛔ Requête refusée: {str(e)}")
+            return service_unavailable(str(e), "overloaded")
+
+    def _identify(self, request):
         start_time = time.time()
         try:
             if 'image' not in request.FILES:
@@ -56,9 +183,12 @@ class CardIdentificationView(APIView):
 
             step_start = time.time()
             try:
-                image = Image.open(io.BytesIO(image_file.read())).convert("RGB")
+                image = open_upload(image_file, settings.CARD_UPLOAD_MIN_SIDE, settings.CARD_UPLOAD_MAX_PIXELS)
                 image_load_time = time.time() - step_start
-                logger.info(f"✅ Image chargée en {image_load_time:.2f}s")
+                logger.info(f"✅ Image chargée en {image_load_time:.2f}s ({image.size[0]}x{image.size[1]})")
+            except ImageTooLargeError as e:
+                logger.error(f"❌ Image refusée: {str(e)}")
+                return Response({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
             except Exception as e:
                 logger.error(f"❌ Erreur chargement image: {str(e)}")
                 return Response({"error": f"Invalid image file: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
@@ -82,9 +212,19 @@ class CardIdentificationView(APIView):
             step_start = time.time()
             try:
                 logger.info("🔍 Début de l'identification...")
-                result = identifier.identify_card(image)
+                remaining = settings.CARD_ID_REQUEST_DEADLINE - (time.time() - start_time)
+                if remaining <= 0:
+                    raise DeadlineExceededError("Échéance dépassée avant l'identification")
+                scheduler = get_scheduler()
+                if scheduler is not None:
+                    result = scheduler.identify_card(image, timeout=remaining)
+                else:
+                    result = identify_within_deadline(identifier, image, remaining)
                 identification_time = time.time() - step_start
                 logger.info(f"✅ Identification terminée en {identification_time:.2f}s")
+            except DeadlineExceededError as e:
+                logger.warning(f"⏱️ Échéance dépassée: {str(e)}")
+                return service_unavailable(str(e), "deadline")
             except Exception as e:
                 logger.error(f"❌ Erreur identification: {str(e)}")
                 return Response({"error": f"Identification failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -97,16 +237,172 @@ class CardIdentificationView(APIView):
                 'model_init_time': round(model_init_time, 2),
                 'identification_time': round(identification_time, 2)
             }
+            observe_stages('single', {
+                'total_time': total_time,
+                'image_load_time': image_load_time,
+                'model_init_time': model_init_time,
+                'identification_time': identification_time
+            })
+            logger.info(f"🎉 Succès total en {total_time:.2f}s")
+            return Response(result, status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"💥 Erreur inattendue: {str(e)}")
+            return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class MultiCardIdentificationView(APIView):
+    """Détecte et identifie toutes les cartes d'une photo (page de classeur) en une requête"""
+
+    throttle_classes = [IdentificationTokenBucketThrottle]
+
+    def post(self, request):
+        try:
+            with get_admission_controller().admit():
+                return self._identify(request)
+        except OverloadedError as e:
+            logger.warning(f"⛔ Requête refusée: {str(e)}")
+            return service_unavailable(str(e), "overloaded")
+
+    def _identify(self, request):
+        start_time = time.time()
+        try:
+            if 'image' not in request.FILES:
+                return Response({"error": "No image provided"}, status=status.HTTP_400_BAD_REQUEST)
+            image_file = request.FILES['image']
+            logger.info(f"📸 Traitement multi-cartes de l'image: {image_file.name}")
+
+            step_start = time.time()
+            try:
+                image = open_upload(image_file, settings.CARD_UPLOAD_MULTI_MIN_SIDE, settings.CARD_UPLOAD_MAX_PIXELS)
+                image_load_time = time.time() - step_start
+                logger.info(f"✅ Image chargée en {image_load_time:.2f}s ({image.size[0]}x{image.size[1]})")
+            except ImageTooLargeError as e:
+                logger.error(f"❌ Image refusée: {str(e)}")
+                return Response({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            except Exception as e:
+                logger.error(f"❌ Erreur chargement image: {str(e)}")
+                return Response({"error": f"Invalid image file: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+            step_start = time.time()
+            try:
+                if is_model_initializing():
+                    return Response({
+                        "status": "initializing",
+                        "message": "Le modèle d'identification est en cours d'initialisation. Veuillez patienter...",
+                        "retry_in": 5
+                    }, status=status.HTTP_202_ACCEPTED)
+
+                identifier = get_identifier()
+                model_init_time = time.time() - step_start
+                logger.info(f"✅ Modèle récupéré en {model_init_time:.2f}s")
+            except Exception as e:
+                logger.error(f"❌ Erreur récupération modèle: {str(e)}")
+                return Response({"error": f"Model not available: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            timings = {}
+            try:
+                logger.info("🔍 Début de la détection et de l'identification...")
+                remaining = settings.CARD_ID_REQUEST_DEADLINE - (time.time() - start_time)
+                if remaining <= 0:
+                    raise DeadlineExceededError("Échéance dépassée avant l'identification")
+                cards = run_within_deadline(
+                    remaining, lambda: detect_and_identify_cards(image, identifier, get_detector(), timings)
+                )
+                logger.info(f"✅ {len(cards)} carte(s) identifiée(s) "
+                            f"(détection {timings['detection_time']:.2f}s, "
+                            f"embedding {timings['embedding_time']:.2f}s, "
+                            f"recherche {timings['search_time']:.2f}s)")
+            except DeadlineExceededError as e:
+                logger.warning(f"⏱️ Échéance dépassée: {str(e)}")
+                return service_unavailable(str(e), "deadline")
+            except Exception as e:
+                logger.error(f"❌ Erreur identification multi-cartes: {str(e)}")
+                return Response({"error": f"Identification failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            total_time = time.time() - start_time
+
+            result = {
+                'cards': cards,
+                'count': len(cards),
+                'rejected_detections': timings['rejected_detections'],
+                'performance': {
+                    'total_time': round(total_time, 2),
+                    'image_load_time': round(image_load_time, 2),
+                    'model_init_time': round(model_init_time, 2),
+                    'detection_time': round(timings['detection_time'], 2),
+                    'embedding_time': round(timings['embedding_time'], 2),
+                    'search_time': round(timings['search_time'], 2)
+                }
+            }
+            observe_stages('multi', {
+                'total_time': total_time,
+                'image_load_time': image_load_time,
+                'model_init_time': model_init_time,
+                **timings
+            })
             logger.info(f"🎉 Succès total en {total_time:.2f}s")
             return Response(result, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"💥 Erreur inattendue: {str(e)}")
             return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class CardIdentificationJobView(APIView):
+    """Met une identification en file et retourne immédiatement l'identifiant du job"""
+
+    throttle_classes = [IdentificationTokenBucketThrottle]
+
+    def post(self, request):
+        if 'image' not in request.FILES:
+            return Response({"error": "No image provided"}, status=status.HTTP_400_BAD_REQUEST)
+        image_file = request.FILES['image']
+
+        try:
+            image = open_upload(image_file, settings.CARD_UPLOAD_MIN_SIDE, settings.CARD_UPLOAD_MAX_PIXELS)
+        except ImageTooLargeError as e:
+            return Response({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except Exception as e:
+            logger.error(f"❌ Erreur chargement image: {str(e)}")
+            return Response({"error": f"Invalid image file: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            job = enqueue_identification(image)
+        except Exception as e:
+            logger.error(f"❌ Erreur mise en file: {str(e)}")
+            return Response({"error": f"Could not enqueue job: {str(e)}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        logger.info(f"📨 Job d'identification {job['job_id']} mis en file ({image_file.name})")
+        job['status_url'] = request.build_absolute_uri(
+            reverse('card-identification-job-detail', kwargs={'job_id': job['job_id']})
+        )
+        return Response(job, status=status.HTTP_202_ACCEPTED)
+
+
+class CardIdentificationJobDetailView(APIView):
+    """État d'un job; ?wait=N attend jusqu'à N secondes la fin du job (long polling)"""
+
+    poll_interval = 0.25
+
+    def get(self, request, job_id):
+        try:
+            wait = min(float(request.query_params.get('wait', 0)), settings.CARD_ID_JOB_MAX_WAIT)
+        except ValueError:
+            return Response({"error": "Invalid wait parameter"}, status=status.HTTP_400_BAD_REQUEST)
+
+        deadline = time.time() + wait
+        job = get_job(job_id)
+        while job is not None and job['status'] not in FINISHED_STATUSES and time.time() < deadline:
+            time.sleep(self.poll_interval)
+            job = get_job(job_id)
+
+        if job is None:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job, status=status.HTTP_200_OK)
+
 class ModelStatusView(APIView):
     def get(self, request):
         return Response({
             'model_ready': is_model_ready(),
             'model_initializing': is_model_initializing(),
-            'status': 'ready' if is_model_ready() else 'initializing' if is_model_initializing() else 'not_loaded'
+            'status': 'ready' if is_model_ready() else 'initializing' if is_model_initializing() else 'not_loaded',
+            'batching': _scheduler_instance.stats() if _scheduler_instance is not None else None,
+            'admission': _admission_controller.stats() if _admission_controller is not None else None
         })
@@ -0,0 +1,132 @@
+# views/card_identification_async.py
+import asyncio
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import status
+from api.metrics import observe_stages
+from api.yolo11.admission import OverloadedError, DeadlineExceededError
+from api.yolo11.image_loading import open_upload, ImageTooLargeError
+from .card_identification import (
+    check_identification_access,
+    get_identifier,
+    get_inference_executor,
+    get_scheduler,
+    get_admission_controller,
+    is_model_initializing,
+    service_unavailable,
+)
+
+logger = logging.getLogger(__name__)
+
+def _load_image(request):
+    if 'image' not in request.FILES:
+        return None
+    image_file = request.FILES['image']
+    logger.info(f"📸 Traitement de l'image: {image_file.name}")
+    return open_upload(image_file, settings.CARD_UPLOAD_MIN_SIDE, settings.CARD_UPLOAD_MAX_PIXELS)
+
+
+class AsyncCardIdentificationView(View):
+    """
+    Version ASGI de CardIdentificationView
+    Le corps de la requête est reçu par la boucle d'événements, le décodage se fait dans
+    un thread et l'inférence dans le pool dédié: un processus peut garder de nombreux
+    uploads lents en vol tout en servant les autres vues.
+    """
+
+    http_method_names = ['post', 'options']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def post(self, request):
+        denied = await sync_to_async(check_identification_access)(request)
+        if denied is not None:
+            return denied
+
+        try:
+            with get_admission_controller().admit():
+                return await self._identify(request)
+        except OverloadedError as e:
+            logger.warning(f"⛔ Requête refusée: {str(e)}")
+            return service_unavailable(str(e), "overloaded")
+        except Exception as e:
+            logger.error(f"💥 Erreur inattendue: {str(e)}")
+            return JsonResponse({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def _identify(self, request):
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+
+        step_start = time.time()
+        try:
+            image = await sync_to_async(_load_image, thread_sensitive=False)(request)
+        except ImageTooLargeError as e:
+            logger.error(f"❌ Image refusée: {str(e)}")
+            return JsonResponse({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except Exception as e:
+            logger.error(f"❌ Erreur chargement image: {str(e)}")
+            return JsonResponse({"error": f"Invalid image file: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if image is None:
+            return JsonResponse({"error": "No image provided"}, status=status.HTTP_400_BAD_REQUEST)
+        image_load_time = time.time() - step_start
+        logger.info(f"✅ Image chargée en {image_load_time:.2f}s ({image.size[0]}x{image.size[1]})")
+
+        if is_model_initializing():
+            return JsonResponse({
+                "status": "initializing",
+                "message": "Le modèle d'identification est en cours d'initialisation. Veuillez patienter...",
+                "retry_in": 5
+            }, status=status.HTTP_202_ACCEPTED)
+
+        executor = get_inference_executor()
+        step_start = time.time()
+        try:
+            identifier = await loop.run_in_executor(executor, get_identifier)
+            scheduler = await loop.run_in_executor(executor, get_scheduler)
+            model_init_time = time.time() - step_start
+        except Exception as e:
+            logger.error(f"❌ Erreur récupération modèle: {str(e)}")
+            return JsonResponse({"error": f"Model not available: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        step_start = time.time()
+        remaining = settings.CARD_ID_REQUEST_DEADLINE - (time.time() - start_time)
+        try:
+            if remaining <= 0:
+                raise DeadlineExceededError("Échéance dépassée avant l'identification")
+            if scheduler is not None:
+                future = asyncio.wrap_future(scheduler.submit(image, timeout=remaining))
+            else:
+                future = loop.run_in_executor(executor, identifier.identify_card, image)
+            result = await asyncio.wait_for(future, timeout=remaining)
+            identification_time = time.time() - step_start
+            logger.info(f"✅ Identification terminée en {identification_time:.2f}s")
+        except (DeadlineExceededError, asyncio.TimeoutError) as e:
+            logger.warning(f"⏱️ Échéance dépassée: {str(e) or 'délai écoulé'}")
+            return service_unavailable(str(e) or f"Identification non terminée après {remaining:.1f}s", "deadline")
+        except Exception as e:
+            logger.error(f"❌ Erreur identification: {str(e)}")
+            return JsonResponse({"error": f"Identification failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        total_time = time.time() - start_time
+        result['performance'] = {
+            'total_time': round(total_time, 2),
+            'image_load_time': round(image_load_time, 2),
+            'model_init_time': round(model_init_time, 2),
+            'identification_time': round(identification_time, 2)
+        }
+        observe_stages('async', {
+            'total_time': total_time,
+            'image_load_time': image_load_time,
+            'model_init_time': model_init_time,
+            'identification_time': identification_time
+        })
+        logger.info(f"🎉 Succès total en {total_time:.2f}s")
+        return JsonResponse(result, status=status.HTTP_200_OK)
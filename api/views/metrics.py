@@ -0,0 +1,22 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from api.metrics import REGISTRY
+
+
+def metrics_access_allowed(request):
+    """Comptes staff (session) ou jeton METRICS_TOKEN en en-tête Authorization: Bearer (scrape Prometheus)"""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_staff:
+        return True
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == "bearer" and \
+        hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+
+
+def metrics_view(request):
+    """Exposition texte Prometheus de toutes les métriques du processus, réservée au staff et au scraper"""
+    if not metrics_access_allowed(request):
+        return HttpResponseForbidden("Accès aux métriques refusé")
+    return HttpResponse(REGISTRY.expose(), content_type="text/plain; version=0.0.4; charset=utf-8")
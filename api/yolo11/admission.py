@@ -0,0 +1,46 @@
+import threading
+from contextlib import contextmanager
+
+
+class OverloadedError(Exception):
+    """La file d'inférence est pleine, la requête est refusée immédiatement"""
+
+
+class DeadlineExceededError(Exception):
+    """La requête n'a pas pu être servie avant son échéance"""
+
+
+class AdmissionController:
+    """
+    Borne le nombre de requêtes d'inférence en cours (en attente + en exécution)
+    Au-delà de max_queue_depth, les nouvelles requêtes sont refusées sans attendre.
+    """
+
+    def __init__(self, max_queue_depth: int):
+        self.max_queue_depth = max_queue_depth
+        self._in_flight = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self):
+        with self._lock:
+            if self._in_flight >= self.max_queue_depth:
+                self._rejected += 1
+                raise OverloadedError(
+                    f"File d'inférence pleine ({self._in_flight}/{self.max_queue_depth} requêtes en cours)"
+                )
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "max_queue_depth": self.max_queue_depth,
+                "rejected": self._rejected,
+            }
@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List
+from PIL import Image
+from api.metrics import REGISTRY
+from .admission import DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DELAY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class _PendingRequest:
+    __slots__ = ("image", "future", "enqueued_at", "deadline")
+
+    def __init__(self, image, timeout=None):
+        self.image = image
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + timeout if timeout is not None else None
+
+
+class MicroBatchScheduler:
+    """
+    Regroupe les identifications concurrentes en un seul appel CLIP et une seule recherche
+    Un lot part dès que max_batch_size requêtes attendent ou que la plus ancienne
+    a attendu max_wait_ms.
+    """
+
+    def __init__(self, identifier, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.identifier = identifier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue_delay = REGISTRY.histogram(
+            "card_identification_batch_queue_delay_seconds",
+            "Attente d'une requête avant le départ de son lot",
+            buckets=QUEUE_DELAY_BUCKETS,
+        ).labels()
+        self.batch_size = REGISTRY.histogram(
+            "card_identification_batch_size",
+            "Nombre d'images par passage CLIP",
+            buckets=BATCH_SIZE_BUCKETS,
+        ).labels()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="card-id-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, image: Image.Image, timeout: float = None) -> Future:
+        """Les requêtes dont l'échéance est passée avant le départ du lot sont abandonnées"""
+        request = _PendingRequest(image, timeout)
+        self._queue.put(request)
+        return request.future
+
+    def identify_card(self, image: Image.Image, timeout: float = None) -> Dict:
+        future = self.submit(image, timeout)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeadlineExceededError(f"Identification non terminée après {timeout:.1f}s")
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": self.pending(),
+            "queue_delay_seconds": self.queue_delay.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+        }
+
+    def _collect_batch(self) -> List[_PendingRequest]:
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            collected = self._collect_batch()
+            started_at = time.monotonic()
+            batch = []
+            for request in collected:
+                if not request.future.set_running_or_notify_cancel():
+                    continue
+                if request.deadline is not None and started_at > request.deadline:
+                    request.future.set_exception(DeadlineExceededError("Échéance dépassée dans la file d'attente"))
+                    continue
+                self.queue_delay.observe(started_at - request.enqueued_at)
+                batch.append(request)
+            if not batch:
+                continue
+            self.batch_size.observe(len(batch))
+
+            try:
+                results = self.identifier.identify_cards([request.image for request in batch])
+            except Exception as e:
+                logger.error(f"❌ Erreur sur un lot de {len(batch)} identification(s): {str(e)}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
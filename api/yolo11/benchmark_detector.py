@@ -0,0 +1,112 @@
+"""
+Compare la latence et l'accord des boîtes entre le détecteur eager et un détecteur exporté
+Utilisation: python api/yolo11/benchmark_detector.py --candidate pokemon_detector.onnx [--reference pokemon_detector.pt] [--images api/yolo11/test_image] [--runs 5]
+"""
+import sys
+import os
+import time
+import argparse
+import django
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from api.yolo11.detection import CardDetector, DEFAULT_MODEL_PATH, DEFAULT_IMGSZ, DEFAULT_CONF, DEFAULT_MAX_DET
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_boxes(reference, candidate, iou_threshold=0.5):
+    """Appariement glouton des boîtes par IoU décroissant"""
+    pairs = sorted(
+        ((box_iou(r, c), i, j) for i, r in enumerate(reference) for j, c in enumerate(candidate)),
+        reverse=True
+    )
+    used_ref, used_cand, ious = set(), set(), []
+    for iou, i, j in pairs:
+        if iou < iou_threshold:
+            break
+        if i in used_ref or j in used_cand:
+            continue
+        used_ref.add(i)
+        used_cand.add(j)
+        ious.append(iou)
+    return ious
+
+
+def time_detector(detector, images, runs):
+    latencies = []
+    detections = []
+    detector.detect(images[0])  # échauffement
+    for image in images:
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = detector.detect(image)
+            latencies.append(time.perf_counter() - start)
+        detections.append([d["box"] for d in result if not d["is_default"]])
+    return np.array(latencies) * 1000, detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark du détecteur exporté contre le modèle eager')
+    parser.add_argument('--reference', type=str, default=DEFAULT_MODEL_PATH, help='Modèle de référence (.pt)')
+    parser.add_argument('--candidate', type=str, required=True, help='Modèle exporté (.onnx ou *_openvino_model)')
+    parser.add_argument('--images', type=str, default=os.path.join(os.path.dirname(__file__), 'test_image'))
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ, help='Taille d\'entrée du candidat')
+    parser.add_argument('--reference-imgsz', type=int, default=DEFAULT_IMGSZ, help='Taille d\'entrée de la référence')
+    parser.add_argument('--conf', type=float, default=DEFAULT_CONF)
+    parser.add_argument('--max-det', type=int, default=DEFAULT_MAX_DET)
+    parser.add_argument('--runs', type=int, default=5, help='Répétitions par image')
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.images, name) for name in os.listdir(args.images)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        print(f"Aucune image trouvée dans {args.images}")
+        return
+    images = [Image.open(path).convert("RGB") for path in paths]
+    print(f"{len(images)} images, {args.runs} répétitions par image\n")
+
+    reference = CardDetector(args.reference, imgsz=args.reference_imgsz, conf=args.conf, max_det=args.max_det)
+    candidate = CardDetector(args.candidate, imgsz=args.imgsz, conf=args.conf, max_det=args.max_det)
+
+    summary = {}
+    for label, detector in (("référence", reference), ("candidat", candidate)):
+        latencies, boxes = time_detector(detector, images, args.runs)
+        summary[label] = boxes
+        print(f"{label:<10} {detector.backend:<9} imgsz={detector.imgsz:<5} "
+              f"p50={np.percentile(latencies, 50):7.1f}ms p95={np.percentile(latencies, 95):7.1f}ms "
+              f"moyenne={latencies.mean():7.1f}ms")
+
+    matched = ref_total = cand_total = 0
+    all_ious = []
+    for path, ref_boxes, cand_boxes in zip(paths, summary["référence"], summary["candidat"]):
+        ious = match_boxes(ref_boxes, cand_boxes)
+        matched += len(ious)
+        ref_total += len(ref_boxes)
+        cand_total += len(cand_boxes)
+        all_ious.extend(ious)
+        print(f"  {os.path.basename(path)}: {len(ref_boxes)} réf. / {len(cand_boxes)} cand. / {len(ious)} appariées")
+
+    recall = matched / ref_total if ref_total else 1.0
+    precision = matched / cand_total if cand_total else 1.0
+    mean_iou = float(np.mean(all_ious)) if all_ious else 0.0
+    print(f"\nAccord des boîtes: rappel={recall:.3f} précision={precision:.3f} IoU moyen={mean_iou:.3f}")
+
+
+if __name__ == '__main__':
+    main()
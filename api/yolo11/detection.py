@@ -1,13 +1,89 @@
 from PIL import Image
 import os
+import threading
+import time
 import cv2
 from ultralytics import YOLO
 from .identify import CardIdentifierFromDB
 
-def verify_detection_quality(image_path, detection_box):
+DEFAULT_MODEL_PATH = "pokemon_detector.pt"
+DEFAULT_IMGSZ = 640
+DEFAULT_CONF = 0.3
+DEFAULT_MAX_DET = 20
+
+EXPORT_FORMATS = ("onnx", "openvino")
+
+_detectors = {}
+_detector_lock = threading.Lock()
+
+def detector_backend(model_path):
+    """Déduit le backend d'inférence à partir du chemin du modèle"""
+    path = str(model_path).rstrip("/")
+    if path.endswith(".onnx"):
+        return "onnx"
+    if path.endswith("_openvino_model") or path.endswith(".xml"):
+        return "openvino"
+    return "pytorch"
+
+class CardDetector:
+    """
+    Détecteur YOLO configurable, quel que soit le backend
+    (PyTorch eager, ONNX ou OpenVINO exportés par ultralytics)
+    """
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, imgsz=DEFAULT_IMGSZ, conf=DEFAULT_CONF,
+                 max_det=DEFAULT_MAX_DET, device="cpu"):
+        self.model_path = str(model_path)
+        self.backend = detector_backend(model_path)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.max_det = max_det
+        self.device = device
+        self.model = YOLO(self.model_path, task="detect")
+
+    def predict(self, image):
+        return self.model(image, imgsz=self.imgsz, conf=self.conf, max_det=self.max_det,
+                          device=self.device, verbose=False)
+
+    def detect(self, image: Image.Image):
+        """Détection sur une image PIL déjà chargée (RGB)"""
+        return _boxes_to_detections(self.predict(image), image.size)
+
+def get_detector(model_path=None, imgsz=None, conf=None, max_det=None):
+    """Retourne un détecteur partagé par configuration, chargé une seule fois"""
+    from django.conf import settings
+
+    model_path = model_path or getattr(settings, "CARD_DETECTOR_MODEL_PATH", DEFAULT_MODEL_PATH)
+    imgsz = imgsz or getattr(settings, "CARD_DETECTOR_IMGSZ", DEFAULT_IMGSZ)
+    conf = conf if conf is not None else getattr(settings, "CARD_DETECTOR_CONF", DEFAULT_CONF)
+    max_det = max_det or getattr(settings, "CARD_DETECTOR_MAX_DET", DEFAULT_MAX_DET)
+
+    key = (str(model_path), imgsz, conf, max_det)
+    with _detector_lock:
+        if key not in _detectors:
+            _detectors[key] = CardDetector(model_path, imgsz=imgsz, conf=conf, max_det=max_det)
+        return _detectors[key]
+
+def export_detector(model_path=DEFAULT_MODEL_PATH, export_format="onnx", imgsz=DEFAULT_IMGSZ, half=False, int8=False):
+    """
+    Exporte le modèle PyTorch vers un format optimisé pour le CPU
+    Args:
+        model_path: Chemin du modèle .pt
+        export_format: 'onnx' ou 'openvino'
+        imgsz: Taille d'entrée figée dans le modèle exporté
+        half: Poids en FP16 (OpenVINO)
+        int8: Quantisation INT8 (OpenVINO)
+    Returns:
+        str: Chemin du modèle exporté
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export non supporté: {export_format} (attendu: {', '.join(EXPORT_FORMATS)})")
+    model = YOLO(str(model_path))
+    return model.export(format=export_format, imgsz=imgsz, half=half, int8=int8, dynamic=False, device="cpu")
+
+def is_valid_card_box(image_size, detection_box):
     x1, y1, x2, y2 = detection_box
-    img = Image.open(image_path)
-    width, height = img.size
+    width, height = image_size
     box_width = x2 - x1
     box_height = y2 - y1
     aspect_ratio = box_width / box_height if box_height > 0 else 0
@@ -15,14 +91,15 @@ def verify_detection_quality(image_path, detection_box):
     ratio_error = abs(aspect_ratio - pokemon_card_ratio) / pokemon_card_ratio
     return not (ratio_error > 0.2 or (box_width * box_height) < (width * height * 0.1))
 
-def detect_cards_in_image(image_path, model_path="pokemon_detector.pt"):
-    model = YOLO(model_path)
-    img = cv2.imread(str(image_path))
-    results = model(img, conf=0.3)
-    detections = []
+def verify_detection_quality(image_path, detection_box):
+    img = Image.open(image_path)
+    return is_valid_card_box(img.size, detection_box)
+
+def _boxes_to_detections(results, image_size):
     if not results or len(results) == 0 or len(results[0].boxes) == 0:
-        width, height = Image.open(image_path).size
+        width, height = image_size
         return [{"box": [0, 0, width, height], "confidence": 1.0, "is_default": True}]
+    detections = []
     for box in results[0].boxes:
         x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
         conf = box.conf[0].cpu().numpy()
@@ -33,28 +110,69 @@ def detect_cards_in_image(image_path, model_path="pokemon_detector.pt"):
         })
     return detections
 
-def detect_and_identify_pokemon_cards(image_path, model_path="pokemon_detector.pt"):
-    print(f"Détection des cartes dans {image_path}...")
-    detections = detect_cards_in_image(image_path, model_path)
-    identifier = CardIdentifierFromDB()
+def detect_cards_in_image(image_path, model_path=None):
+    detector = get_detector(model_path)
+    img = cv2.imread(str(image_path))
+    results = detector.predict(img)
+    return _boxes_to_detections(results, Image.open(image_path).size)
 
-    cards_found = []
-    for i, detection in enumerate(detections):
+def detect_cards(image: Image.Image, detector=None):
+    """Détection sur une image PIL déjà chargée (RGB)"""
+    detector = detector or get_detector()
+    return detector.detect(image)
+
+def detect_and_identify_cards(image: Image.Image, identifier, detector=None, timings=None):
+    """
+    Détecte toutes les cartes d'une photo puis les identifie en un seul lot
+    Args:
+        image: Image PIL RGB
+        identifier: Instance de CardIdentifierFromDB
+        detector: CardDetector à utiliser (détecteur partagé par défaut)
+        timings: Dictionnaire optionnel rempli avec la durée de chaque étape
+    Returns:
+        list: Cartes trouvées avec leur boîte et leur score
+    """
+    timings = timings if timings is not None else {}
+
+    step_start = time.time()
+    detections = detect_cards(image, detector)
+    timings['detection_time'] = time.time() - step_start
+
+    accepted = []
+    crops = []
+    for detection in detections:
         box = detection["box"]
-        is_default = detection.get("is_default", False)
-        if is_default or verify_detection_quality(image_path, box):
-            img = Image.open(image_path)
-            cropped = img.crop(box)
-            if cropped.mode != 'RGB':
-                cropped = cropped.convert('RGB')
-            card_id = identifier.identify_card(cropped)
-            cards_found.append({
-                "box": box,
-                "card_info": card_id["card_info"],
-                "similarity_score": card_id["similarity_score"],
-                "matched_card_id": card_id["matched_card_id"],
-                "is_default_detection": is_default
-            })
-        else:
-            print(f"Détection #{i+1} ignorée car de faible qualité")
+        if detection.get("is_default", False) or is_valid_card_box(image.size, box):
+            accepted.append(detection)
+            crops.append(image.crop(box))
+    timings['rejected_detections'] = len(detections) - len(accepted)
+
+    step_start = time.time()
+    query_vecs = identifier.embed_images(crops) if crops else None
+    timings['embedding_time'] = time.time() - step_start
+
+    step_start = time.time()
+    matches = identifier.search_embeddings(query_vecs) if crops else []
+    timings['search_time'] = time.time() - step_start
+
+    cards_found = []
+    for detection, match in zip(accepted, matches):
+        cards_found.append({
+            "box": detection["box"],
+            "detection_confidence": detection["confidence"],
+            "card_info": match["card_info"],
+            "similarity_score": match["similarity_score"],
+            "matched_card_id": match["matched_card_id"],
+            "is_default_detection": detection.get("is_default", False)
+        })
+    return cards_found
+
+def detect_and_identify_pokemon_cards(image_path, model_path=None):
+    print(f"Détection des cartes dans {image_path}...")
+    identifier = CardIdentifierFromDB()
+    image = Image.open(image_path).convert('RGB')
+    timings = {}
+    cards_found = detect_and_identify_cards(image, identifier, get_detector(model_path), timings)
+    if timings['rejected_detections']:
+        print(f"{timings['rejected_detections']} détection(s) ignorée(s) car de faible qualité")
     return cards_found
@@ -0,0 +1,104 @@
+"""
+Artefact d'embeddings CLIP du catalogue, indépendant de la base
+
+Un dossier contient embeddings.npy (matrice float16 (N, D), lignes normalisées) et
+metadata.json (version des features, modèle, dimensions, et la liste des cartes alignée
+ligne à ligne sur la matrice). La matrice est ouverte en mémoire mappée: un nœud de
+recherche démarre sans requête en base, et les benchmarks peuvent tourner sur un
+artefact figé. Ce module n'importe pas Django.
+"""
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+ARTIFACT_FORMAT = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def _replace_atomically(path: Path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        # mkstemp crée en 0600: l'artefact doit rester lisible par les nœuds de recherche
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_artifact(directory, embeddings: np.ndarray, cards: List[Dict], feature_version: str, model: str) -> Dict:
+    """
+    Écrit l'artefact; metadata.json est remplacé en dernier pour qu'un lecteur ne voie jamais de matrice sans ses cartes
+    Args:
+        embeddings: Matrice (N, D), normalisée ici puis stockée en float16
+        cards: Métadonnées des N cartes, dans l'ordre des lignes (chacune avec au moins "id")
+    Returns:
+        dict: Le manifeste écrit (sans la liste des cartes)
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or len(embeddings) != len(cards):
+        raise ArtifactError(f"Matrice {embeddings.shape} incompatible avec {len(cards)} cartes")
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    matrix = (embeddings / np.where(norms > 0, norms, 1)).astype(np.float16)
+    digest = hashlib.sha256(matrix.tobytes()).hexdigest()
+    _replace_atomically(directory / EMBEDDINGS_FILE, lambda f: np.save(f, matrix))
+
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "feature_version": feature_version,
+        "model": model,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "dtype": "float16",
+        "sha256": digest,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    payload = json.dumps({**manifest, "cards": cards}, ensure_ascii=False).encode("utf-8")
+    _replace_atomically(directory / METADATA_FILE, lambda f: f.write(payload))
+    return manifest
+
+
+def load_artifact(directory, mmap: bool = True, verify: bool = False) -> Tuple[np.ndarray, List[Dict], Dict]:
+    """
+    Args:
+        mmap: Ouvrir la matrice en mémoire mappée (lecture seule) plutôt que la lire entièrement
+        verify: Recalculer le SHA-256 de la matrice (lit tout le fichier)
+    Returns:
+        tuple: (matrice float16 (N, D), cartes alignées, manifeste)
+    Raises:
+        ArtifactError: Fichier manquant, format inconnu ou matrice incohérente avec les métadonnées
+    """
+    directory = Path(directory)
+    try:
+        with open(directory / METADATA_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        embeddings = np.load(directory / EMBEDDINGS_FILE, mmap_mode="r" if mmap else None)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"Artefact illisible dans {directory}: {e}") from e
+
+    cards = manifest.pop("cards", [])
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ArtifactError(f"Format d'artefact {manifest.get('format')} non supporté (attendu {ARTIFACT_FORMAT})")
+    if embeddings.shape != (manifest["count"], manifest["dim"]) or len(cards) != manifest["count"]:
+        raise ArtifactError(
+            f"Artefact incohérent: matrice {embeddings.shape}, {len(cards)} cartes, manifeste {manifest['count']}x{manifest['dim']}"
+        )
+    if verify and hashlib.sha256(np.ascontiguousarray(embeddings).tobytes()).hexdigest() != manifest["sha256"]:
+        raise ArtifactError(f"SHA-256 de {EMBEDDINGS_FILE} différent du manifeste")
+    return embeddings, cards, manifest
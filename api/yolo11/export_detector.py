@@ -0,0 +1,34 @@
+"""
+Exporte le détecteur YOLO vers un format optimisé pour le CPU
+Utilisation: python api/yolo11/export_detector.py [--model pokemon_detector.pt] [--format onnx|openvino] [--imgsz 640] [--int8]
+"""
+import sys
+import os
+import argparse
+import django
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from api.yolo11.detection import export_detector, EXPORT_FORMATS, DEFAULT_MODEL_PATH, DEFAULT_IMGSZ
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporte le détecteur de cartes pour une inférence CPU')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL_PATH, help='Chemin du modèle PyTorch (.pt)')
+    parser.add_argument('--format', type=str, default='onnx', choices=EXPORT_FORMATS, help='Format d\'export')
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ, help='Taille d\'entrée du modèle exporté')
+    parser.add_argument('--half', action='store_true', help='Poids en FP16 (OpenVINO)')
+    parser.add_argument('--int8', action='store_true', help='Quantisation INT8 (OpenVINO)')
+    args = parser.parse_args()
+
+    print(f"Export de {args.model} au format {args.format} (imgsz={args.imgsz})...")
+    exported_path = export_detector(args.model, args.format, args.imgsz, half=args.half, int8=args.int8)
+    print(f"✓ Modèle exporté: {exported_path}")
+    print(f"Pour l'utiliser: CARD_DETECTOR_MODEL_PATH={exported_path} CARD_DETECTOR_IMGSZ={args.imgsz}")
+
+
+if __name__ == '__main__':
+    main()
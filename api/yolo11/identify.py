@@ -2,19 +2,101 @@ import numpy as np
 import torch
 from PIL import Image
 from transformers import CLIPProcessor, CLIPModel
+from django.conf import settings
 from api.models import Card
+from api.yolo11.embedding_artifact import load_artifact
 import logging
 import faiss
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import struct
 
 logger = logging.getLogger(__name__)
 
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+# Lignes converties à la fois en float32 pour construire les index (2 Mo pour D=512)
+EMBEDDING_CHUNK_ROWS = 1024
+# Lignes échantillonnées pour entraîner le Product Quantizer: FAISS n'utilise de toute façon
+# pas plus de 256 points par centroïde (256 centroïdes pour 8 bits)
+PQ_TRAIN_ROWS = 65536
+
+
+def _normalized_float32(rows) -> np.ndarray:
+    """Copie float32 de lignes d'embeddings, renormalisées (l'arrondi float16 de l'artefact décale les normes)"""
+    rows = np.asarray(rows, dtype=np.float32)
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows / np.where(norms > 0, norms, 1)
+
+
+def iter_embedding_chunks(embeddings: np.ndarray, chunk_rows: int = EMBEDDING_CHUNK_ROWS):
+    """
+    Parcourt la matrice d'embeddings par blocs float32 normalisés, sans jamais la copier en entier
+    Returns:
+        Iterator: (indice de la première ligne, bloc (n, D) float32)
+    """
+    for start in range(0, len(embeddings), chunk_rows):
+        yield start, _normalized_float32(embeddings[start:start + chunk_rows])
+
+
+def _load_embeddings_from_db() -> Tuple[List[np.ndarray], List[Dict]]:
+    cards = list(
+        Card.objects.filter(features__clip_embedding__isnull=False)
+        .select_related('set', 'features')
+        .only('id', 'name', 'number', 'rarity', 'price', 'price_currency', 'set__title', 'features__clip_embedding')
+    )
+    metadata = []
+    all_embeddings = []
+
+    for card in cards:
+        try:
+            emb = np.array(card.features.clip_embedding, dtype=np.float32)
+            emb /= np.linalg.norm(emb)  # Normalisation
+            all_embeddings.append(emb)
+            metadata.append({
+                "id": card.id,
+                "name": card.name,
+                "number": card.number,
+                "rarity": card.rarity,
+                "price": str(card.price),
+                "set_name": card.set.title if card.set else None
+            })
+        except Exception as e:
+            logger.warning(f"⚠️ Erreur embedding carte ID {card.id}: {e}")
+    return all_embeddings, metadata
+
+
+def load_card_embeddings(artifact_path: Optional[str] = None) -> Tuple[Optional[np.ndarray], List[Dict]]:
+    """
+    Embeddings normalisés du catalogue et métadonnées alignées
+    L'artefact reste en float16 mappé en mémoire: les index sont construits par blocs (iter_embedding_chunks)
+    sans copie float32 complète de la matrice
+    Args:
+        artifact_path: Dossier d'artefact (voir embedding_artifact.py), lu sans accès à la base;
+            par défaut settings.CARD_EMBEDDINGS_ARTIFACT, et la base si ce réglage est vide
+    Returns:
+        tuple: (matrice (N, D) ou None si aucun embedding: float32 depuis la base, float16 mappée
+            depuis l'artefact; métadonnées)
+    """
+    artifact_path = artifact_path or getattr(settings, "CARD_EMBEDDINGS_ARTIFACT", "")
+    if not artifact_path:
+        all_embeddings, metadata = _load_embeddings_from_db()
+        if not all_embeddings:
+            return None, metadata
+        return np.stack(all_embeddings).astype("float32"), metadata
+
+    embeddings, metadata, manifest = load_artifact(artifact_path)
+    if manifest["model"] != CLIP_MODEL_NAME:
+        raise ValueError(f"Artefact calculé avec {manifest['model']}, le modèle chargé est {CLIP_MODEL_NAME}")
+    logger.info(f"📦 Artefact {artifact_path}: {manifest['count']} embeddings, version {manifest['feature_version']}")
+    if not len(metadata):
+        return None, metadata
+    return embeddings, metadata
+
+
 class CardIdentifierFromDB:
-    def __init__(self, quantization_bits: int = 8):
+    def __init__(self, quantization_bits: int = 8, artifact_path: Optional[str] = None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(self.device)
-        self.processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+        self.model = CLIPModel.from_pretrained(CLIP_MODEL_NAME).to(self.device)
+        self.processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
         self.embedding_dim = self.model.config.projection_dim
 
         # Paramètres de quantisation
@@ -30,29 +112,28 @@ class CardIdentifierFromDB:
         # Index FAISS avec quantisation
         self.index = None
 
-        self._load_and_quantize_embeddings()
+        self._load_and_quantize_embeddings(artifact_path)
 
     def _quantize_embeddings(self, embeddings: np.ndarray) -> Tuple[np.ndarray, float, float]:
-        """Quantise les embeddings float32 vers int8/int16"""
+        """Quantise les embeddings (float32 ou float16 mappés) vers int8/int16, bloc par bloc"""
         # Calcul des paramètres de quantisation
-        min_val = embeddings.min()
-        max_val = embeddings.max()
+        min_val, max_val = np.inf, -np.inf
+        for _, chunk in iter_embedding_chunks(embeddings):
+            min_val = min(min_val, chunk.min())
+            max_val = max(max_val, chunk.max())
 
         # Scale et zero_point pour la quantisation
         scale = (max_val - min_val) / (self.quantization_levels - 1)
         zero_point = int(round(-min_val / scale))
 
         # Quantisation
-        quantized = np.clip(
-            np.round(embeddings / scale + zero_point),
-            0,
-            self.quantization_levels - 1
-        )
-
-        if self.quantization_bits == 8:
-            quantized = quantized.astype(np.uint8)
-        else:  # 16 bits
-            quantized = quantized.astype(np.uint16)
+        quantized = np.empty(embeddings.shape, dtype=np.uint8 if self.quantization_bits == 8 else np.uint16)
+        for start, chunk in iter_embedding_chunks(embeddings):
+            quantized[start:start + len(chunk)] = np.clip(
+                np.round(chunk / scale + zero_point),
+                0,
+                self.quantization_levels - 1
+            )
 
         return quantized, scale, zero_point
 
@@ -60,84 +141,77 @@ class CardIdentifierFromDB:
         """Dé-quantise les embeddings vers float32"""
         return ((quantized.astype(np.float32) - self.zero_point) * self.scale)
 
-    def _load_and_quantize_embeddings(self):
-        """Charge et quantise tous les embeddings"""
-        cards = list(Card.objects.exclude(clip_embedding=None))
-        self.metadata = []
-        all_embeddings = []
-
-        for card in cards:
-            try:
-                emb = np.array(card.clip_embedding, dtype=np.float32)
-                emb /= np.linalg.norm(emb)  # Normalisation
-                all_embeddings.append(emb)
-                self.metadata.append({
-                    "id": card.id,
-                    "name": card.name,
-                    "number": card.number,
-                    "rarity": card.rarity,
-                    "price": str(card.price),
-                    "set_name": card.set.title if card.set else None
-                })
-            except Exception as e:
-                logger.warning(f"⚠️ Erreur embedding carte ID {card.id}: {e}")
-
-        if all_embeddings:
-            embeddings_array = np.stack(all_embeddings).astype("float32")
+    def _load_and_quantize_embeddings(self, artifact_path: Optional[str] = None):
+        """Charge (base ou artefact) et quantise tous les embeddings"""
+        embeddings_array, self.metadata = load_card_embeddings(artifact_path)
 
+        if embeddings_array is not None:
             # Quantisation
             self.quantized_embeddings, self.scale, self.zero_point = self._quantize_embeddings(embeddings_array)
 
-            # Calcul de la réduction mémoire
-            original_size = embeddings_array.nbytes
+            # Calcul de la réduction mémoire (par rapport à une matrice float32)
+            original_size = embeddings_array.shape[0] * embeddings_array.shape[1] * 4
             quantized_size = self.quantized_embeddings.nbytes
             reduction = (1 - quantized_size / original_size) * 100
 
             logger.info(f"✅ Quantisation terminée: {original_size} → {quantized_size} bytes ({reduction:.1f}% de réduction)")
 
-            # Création de l'index FAISS avec embeddings dé-quantisés
+            # Création de l'index FAISS avec embeddings dé-quantisés, ajoutés par blocs
             if faiss:
-                dequantized = self._dequantize_embeddings(self.quantized_embeddings)
                 self.index = faiss.IndexFlatIP(self.embedding_dim)
-                self.index.add(dequantized)
+                for start in range(0, len(self.quantized_embeddings), EMBEDDING_CHUNK_ROWS):
+                    chunk = self.quantized_embeddings[start:start + EMBEDDING_CHUNK_ROWS]
+                    self.index.add(self._dequantize_embeddings(chunk))
                 logger.info(f"✅ Index FAISS créé avec {len(self.quantized_embeddings)} embeddings quantisés")
 
-    def identify_card(self, image: Image.Image) -> Dict:
-        """Identification avec embeddings quantisés"""
-        # Extraction embedding query
-        inputs = self.processor(images=image, return_tensors="pt").to(self.device)
+    def embed_images(self, images: List[Image.Image]) -> np.ndarray:
+        """Calcule les embeddings CLIP normalisés d'un lot d'images en un seul passage"""
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
         with torch.no_grad():
-            query_embedding = self.model.get_image_features(**inputs)
-        query_embedding = query_embedding / query_embedding.norm(dim=-1, keepdim=True)
-        query_vec = query_embedding.cpu().numpy().astype("float32")
+            embeddings = self.model.get_image_features(**inputs)
+        embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True)
+        return embeddings.cpu().numpy().astype("float32")
 
+    def search_embeddings(self, query_vecs: np.ndarray) -> List[Dict]:
+        """Recherche la meilleure correspondance pour chaque ligne de la matrice de requêtes"""
         if self.index is not None:
             # Recherche FAISS
-            scores, indices = self.index.search(query_vec, k=1)
-            idx = indices[0][0]
-            similarity = scores[0][0]
+            scores, indices = self.index.search(query_vecs, k=1)
+            best = [(indices[i][0], scores[i][0]) for i in range(len(query_vecs))]
         else:
             # Recherche manuelle avec dé-quantisation à la volée
             dequantized = self._dequantize_embeddings(self.quantized_embeddings)
-            similarities = np.dot(query_vec, dequantized.T)[0]
-            idx = np.argmax(similarities)
-            similarity = similarities[idx]
+            similarities = np.dot(query_vecs, dequantized.T)
+            indices = np.argmax(similarities, axis=1)
+            best = [(idx, similarities[i][idx]) for i, idx in enumerate(indices)]
+
+        results = []
+        for idx, similarity in best:
+            matched = self.metadata[idx]
+            results.append({
+                "card_info": matched,
+                "similarity_score": float(similarity),
+                "matched_card_id": matched["id"],
+                "quantization_bits": self.quantization_bits
+            })
+        return results
+
+    def identify_cards(self, images: List[Image.Image]) -> List[Dict]:
+        """Identification par lot: un seul appel CLIP et une seule recherche matricielle"""
+        if not images:
+            return []
+        return self.search_embeddings(self.embed_images(images))
 
-        matched = self.metadata[idx]
-
-        return {
-            "card_info": matched,
-            "similarity_score": float(similarity),
-            "matched_card_id": matched["id"],
-            "quantization_bits": self.quantization_bits
-        }
+    def identify_card(self, image: Image.Image) -> Dict:
+        """Identification avec embeddings quantisés"""
+        return self.identify_cards([image])[0]
 
 # Version avec Product Quantization (PQ) pour compression avancée
 class ProductQuantizedIdentifier:
-    def __init__(self, pq_m: int = 64, pq_bits: int = 8):
+    def __init__(self, pq_m: int = 64, pq_bits: int = 8, artifact_path: Optional[str] = None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(self.device)
-        self.processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+        self.model = CLIPModel.from_pretrained(CLIP_MODEL_NAME).to(self.device)
+        self.processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
         self.embedding_dim = self.model.config.projection_dim
 
         # Paramètres Product Quantization
@@ -147,45 +221,27 @@ class ProductQuantizedIdentifier:
         self.metadata = []
         self.index = None
 
-        self._load_with_pq()
+        self._load_with_pq(artifact_path)
 
-    def _load_with_pq(self):
-        """Charge les embeddings avec Product Quantization"""
-        cards = list(Card.objects.exclude(clip_embedding=None))
-        self.metadata = []
-        all_embeddings = []
-
-        for card in cards:
-            try:
-                emb = np.array(card.clip_embedding, dtype=np.float32)
-                emb /= np.linalg.norm(emb)
-                all_embeddings.append(emb)
-                self.metadata.append({
-                    "id": card.id,
-                    "name": card.name,
-                    "number": card.number,
-                    "rarity": card.rarity,
-                    "price": str(card.price),
-                    "set_name": card.set.title if card.set else None
-                })
-            except Exception as e:
-                logger.warning(f"⚠️ Erreur embedding carte ID {card.id}: {e}")
-
-        if all_embeddings and faiss:
-            embeddings_array = np.stack(all_embeddings).astype("float32")
+    def _load_with_pq(self, artifact_path: Optional[str] = None):
+        """Charge les embeddings (base ou artefact) avec Product Quantization"""
+        embeddings_array, self.metadata = load_card_embeddings(artifact_path)
 
+        if embeddings_array is not None and faiss:
             # Création de l'index Product Quantization
             self.index = faiss.IndexPQ(self.embedding_dim, self.pq_m, self.pq_bits)
 
-            # Entraînement du quantizer
+            # Entraînement du quantizer sur un échantillon régulier du catalogue
             logger.info("🔄 Entraînement du Product Quantizer...")
-            self.index.train(embeddings_array)
+            train_rows = np.linspace(0, len(embeddings_array) - 1, min(len(embeddings_array), PQ_TRAIN_ROWS)).astype(int)
+            self.index.train(_normalized_float32(embeddings_array[train_rows]))
 
-            # Ajout des embeddings
-            self.index.add(embeddings_array)
+            # Ajout des embeddings par blocs
+            for _, chunk in iter_embedding_chunks(embeddings_array):
+                self.index.add(chunk)
 
-            # Calcul de la compression
-            original_size = embeddings_array.nbytes
+            # Calcul de la compression (par rapport à une matrice float32)
+            original_size = embeddings_array.shape[0] * embeddings_array.shape[1] * 4
             compressed_size = len(embeddings_array) * self.pq_m * self.pq_bits // 8
             compression_ratio = original_size / compressed_size
 
@@ -0,0 +1,57 @@
+from PIL import Image, ImageOps
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_SIDE = 448
+DEFAULT_MAX_PIXELS = 40_000_000
+
+
+class ImageTooLargeError(ValueError):
+    """L'image dépasse la limite de pixels autorisée"""
+
+
+def open_upload(uploaded_file, min_side: int = DEFAULT_MIN_SIDE, max_pixels: int = DEFAULT_MAX_PIXELS) -> Image.Image:
+    """
+    Décode une image envoyée à une résolution réduite
+    Le fichier est lu directement depuis le fichier temporaire de l'upload (ou le flux
+    en mémoire) sans copie intermédiaire. Les JPEG sont décodés en mode draft (mise à
+    l'échelle DCT), les autres formats sont réduits d'un facteur entier après décodage.
+    Args:
+        uploaded_file: UploadedFile Django, chemin ou objet fichier
+        min_side: Plus petit côté minimal à conserver après réduction
+        max_pixels: Nombre maximal de pixels de l'image source
+    Returns:
+        Image.Image: Image RGB orientée selon l'EXIF
+    """
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        source = uploaded_file.temporary_file_path()
+    else:
+        source = uploaded_file
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    with Image.open(source) as image:
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ImageTooLargeError(
+                f"Image trop grande: {width}x{height} ({width * height} pixels, maximum {max_pixels})"
+            )
+
+        if image.format == 'JPEG':
+            # Le décodeur choisit la plus forte réduction (1/2, 1/4, 1/8) qui garde les deux côtés >= min_side
+            image.draft('RGB', (min_side, min_side))
+
+        image = ImageOps.exif_transpose(image)
+
+        factor = min(image.size) // min_side
+        if factor >= 2:
+            image = image.reduce(factor)
+
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        else:
+            image.load()
+
+    logger.debug(f"Image décodée en {image.size[0]}x{image.size[1]} (source {width}x{height})")
+    return image
@@ -3,6 +3,10 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Déploiement ASGI (uploads lents gérés par la boucle d'événements, voir
+api/views/card_identification_async.py):
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --workers 2
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -0,0 +1,19 @@
+"""
+Configuration Celery du projet
+
+Lancer un pool de workers dédié à l'identification:
+    celery -A core worker -Q identification --concurrency 2
+
+Chaque processus worker charge son propre modèle CLIP. Sans REDIS_URL ni CELERY_BROKER_URL, les tâches
+s'exécutent en mode eager dans le processus web (développement et tests locaux).
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+app = Celery("core")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
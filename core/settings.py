@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 import os
 
 load_dotenv()
@@ -37,6 +38,38 @@ GOOGLE_OAUTH2_CLIENT_ID = os.getenv("GOOGLE_AUTH_ID")
 GOOGLE_OAUTH2_CLIENT_SECRET = os.getenv("GOOGLE_AUTH_SECRET")
 GOOGLE_OAUTH2_REDIRECT_URI = "http://localhost:8000/auth/api/login/google/"
 
+# Identification des cartes
+# Chemin .pt (PyTorch), .onnx ou dossier *_openvino_model (voir api/yolo11/export_detector.py)
+CARD_DETECTOR_MODEL_PATH = os.getenv("CARD_DETECTOR_MODEL_PATH", "pokemon_detector.pt")
+CARD_DETECTOR_IMGSZ = int(os.getenv("CARD_DETECTOR_IMGSZ", "640"))
+CARD_DETECTOR_CONF = float(os.getenv("CARD_DETECTOR_CONF", "0.3"))
+CARD_DETECTOR_MAX_DET = int(os.getenv("CARD_DETECTOR_MAX_DET", "20"))
+# Plus petit côté conservé au décodage des photos (CLIP travaille en 224px)
+CARD_UPLOAD_MIN_SIDE = int(os.getenv("CARD_UPLOAD_MIN_SIDE", "448"))
+CARD_UPLOAD_MULTI_MIN_SIDE = int(os.getenv("CARD_UPLOAD_MULTI_MIN_SIDE", "1280"))
+CARD_UPLOAD_MAX_PIXELS = int(os.getenv("CARD_UPLOAD_MAX_PIXELS", "40000000"))
+# Regroupement des requêtes concurrentes en un seul passage CLIP (0 pour désactiver)
+CARD_ID_BATCH_WINDOW_MS = float(os.getenv("CARD_ID_BATCH_WINDOW_MS", "5"))
+CARD_ID_MAX_BATCH_SIZE = int(os.getenv("CARD_ID_MAX_BATCH_SIZE", "16"))
+# Contrôle d'admission: requêtes en cours maximum, échéance par requête (s) et Retry-After (s)
+CARD_ID_MAX_QUEUE_DEPTH = int(os.getenv("CARD_ID_MAX_QUEUE_DEPTH", "32"))
+CARD_ID_REQUEST_DEADLINE = float(os.getenv("CARD_ID_REQUEST_DEADLINE", "10"))
+CARD_ID_RETRY_AFTER = int(os.getenv("CARD_ID_RETRY_AFTER", "2"))
+# Threads dédiés à l'inférence pour la vue ASGI (api/views/card_identification_async.py)
+CARD_ID_INFERENCE_WORKERS = int(os.getenv("CARD_ID_INFERENCE_WORKERS", "2"))
+# Quota par utilisateur en seau à jetons (capacité 0 pour désactiver)
+CARD_ID_RATE_CAPACITY = float(os.getenv("CARD_ID_RATE_CAPACITY", "20"))
+CARD_ID_RATE_REFILL_PER_SEC = float(os.getenv("CARD_ID_RATE_REFILL_PER_SEC", "0.5"))
+# Cache disque des images du catalogue (api/image_cache.py): taille max en octets, revalidation après max_age secondes
+CARD_IMAGE_CACHE_DIR = os.getenv("CARD_IMAGE_CACHE_DIR", str(BASE_DIR / ".cache" / "card_images"))
+CARD_IMAGE_CACHE_MAX_BYTES = int(os.getenv("CARD_IMAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+CARD_IMAGE_CACHE_MAX_AGE = int(os.getenv("CARD_IMAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+# Dossier d'artefact d'embeddings écrit par precompute_features.py: l'identification le charge au lieu de la base (vide: base)
+CARD_EMBEDDINGS_ARTIFACT = os.getenv("CARD_EMBEDDINGS_ARTIFACT", "")
+
+# Jeton Bearer du scraper Prometheus pour /metrics/ (vide: réservé aux comptes staff)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -89,6 +122,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -119,6 +153,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "core.wsgi.application"
+ASGI_APPLICATION = "core.asgi.application"
 
 
 # Database
@@ -134,6 +169,53 @@ DATABASES = {
 AUTH_USER_MODEL = 'api.User'
 
 
+# Cache et file de tâches
+# Sans REDIS_URL, cache en mémoire locale et tâches Celery exécutées en mode eager
+# Les workers écrivent l'état des jobs dans le cache: web et workers doivent partager le même cache.
+# Un broker Redis (CELERY_BROKER_URL) sans REDIS_URL sert donc aussi de cache
+
+REDIS_URL = os.getenv("REDIS_URL")
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL or "memory://")
+CACHE_REDIS_URL = REDIS_URL or (CELERY_BROKER_URL if CELERY_BROKER_URL.startswith(("redis://", "rediss://")) else None)
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+CELERY_TASK_ALWAYS_EAGER = os.getenv(
+    "CELERY_TASK_ALWAYS_EAGER", "true" if CELERY_BROKER_URL == "memory://" else "false"
+).lower() == "true"
+# Cache en mémoire locale avec de vrais workers: les jobs resteraient "pending" pour toujours
+if not CELERY_TASK_ALWAYS_EAGER and not CACHE_REDIS_URL:
+    raise ImproperlyConfigured(
+        "Les workers Celery (CELERY_TASK_ALWAYS_EAGER=false) nécessitent un cache partagé: "
+        "définir REDIS_URL ou un CELERY_BROKER_URL redis://"
+    )
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ROUTES = {
+    "api.tasks.identify_card_job": {"queue": "identification"},
+}
+
+# Jobs d'identification asynchrones (état conservé dans le cache)
+CARD_ID_JOB_TTL = int(os.getenv("CARD_ID_JOB_TTL", "3600"))
+CARD_ID_JOB_MAX_WAIT = int(os.getenv("CARD_ID_JOB_MAX_WAIT", "25"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
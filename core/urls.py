@@ -7,9 +7,11 @@ from pokemon.views import PokemonCardView
 from rest_framework.permissions import AllowAny
 from api.views.user import CustomTokenObtainPairView, CustomTokenRefreshView
 from api.views.user_google import GoogleLoginView
+from api.views.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
     path('api/', include('api.urls')),
     path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
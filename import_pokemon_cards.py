@@ -1,22 +1,26 @@
 """
-Utilisation: python import_pokemon_cards.py
+Utilisation: python import_pokemon_cards.py [--sets swsh45sv swsh9 sm12 | --all-sets] [--parallelism 8] [--rate 10]
+             [--offline] [--cache-ttl 86400] [--no-cache] [--refresh] [--format ndjson.gz|json]
+             python import_pokemon_cards.py --from-seed seeds/pokemon_cards_seed.ndjson.gz  (sans API, lu en flux)
 """
 import os
 import sys
-import json
+import argparse
 import django
-import random
-from datetime import datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django.setup()
 
-from api.models import Card, CardPrice, Set as DjangoSet
-from django.utils import timezone
-from djmoney.money import Money
+from api.models import Card
+from api.card_ingestion import CardIngestor, DEFAULT_BATCH_SIZE
 
-from pokemontcgsdk import Card as PokemonCard, Set, RestClient
+from pokemontcgsdk import RestClient
+from pokemon.tcg_fetcher import SetFetcher, TcgApiClient, DEFAULT_PARALLELISM, DEFAULT_RATE
+from pokemon.response_cache import add_cache_arguments, cache_from_options
+from pokemon.seed_io import SEEDS_DIR, iter_seed, write_seed
+
+TARGET_SETS = ['swsh45sv', 'swsh9', 'sm12']
 
 API_KEY = os.getenv('POKEMON_TCG_API_KEY')
 if not API_KEY:
@@ -25,247 +29,174 @@ if not API_KEY:
     print("export POKEMON_TCG_API_KEY=votre_clé_api")
 RestClient.configure(API_KEY)
 
-def get_cards_from_set(set_id):
+def format_card(card):
+    """
+    Carte du SDK (Card.where ou SetFetcher.fetch_cards) au format du seed JSON
+    Args:
+        card: pokemontcgsdk.Card
+    Returns:
+        dict: Carte formatée
+    """
+    card_data = {
+        'id': card.id,
+        'name': card.name,
+        'set_name': card.set.name,
+        'set_id': card.set.id,
+        'number': card.number,
+        'rarity': getattr(card, 'rarity', 'Common'),
+        'images': {
+            'small': card.images.small,
+            'large': card.images.large
+        }
+    }
+
+    if getattr(getattr(card, 'tcgplayer', None), 'prices', None) is not None:
+        prices_dict = {}
+        for price_type, price_obj in card.tcgplayer.prices.__dict__.items():
+            if price_obj is not None:
+                if hasattr(price_obj, '__dict__'):
+                    formatted_price_dict = {}
+                    for key, value in price_obj.__dict__.items():
+                        if isinstance(value, (int, float)):
+                            formatted_price_dict[key] = round(float(value), 2)
+                        else:
+                            formatted_price_dict[key] = value
+                    prices_dict[price_type] = formatted_price_dict
+                else:
+                    if isinstance(price_obj, (int, float)):
+                        prices_dict[price_type] = round(float(price_obj), 2)
+                    else:
+                        prices_dict[price_type] = price_obj
+        card_data['prices'] = prices_dict
+
+    if getattr(getattr(card, 'cardmarket', None), 'prices', None) is not None:
+        cardmarket_prices = {}
+        for price_key, price_value in card.cardmarket.prices.__dict__.items():
+            if price_value is not None:
+                if isinstance(price_value, (int, float)):
+                    cardmarket_prices[price_key] = round(float(price_value), 2)
+                else:
+                    cardmarket_prices[price_key] = price_value
+
+        card_data['cardmarket'] = {
+            'url': card.cardmarket.url,
+            'updatedAt': card.cardmarket.updatedAt,
+            'prices': cardmarket_prices
+        }
+
+    if hasattr(card.set, 'releaseDate'):
+        card_data['release_date'] = card.set.releaseDate
+
+    return card_data
+
+
+def get_cards_from_set(set_id, cache=None):
     """
     Récupère toutes les cartes d'un set spécifique
     Args:
         set_id: Identifiant du set (ex: 'swsh45sv')
+        cache: Cache disque des réponses de l'API
     Returns:
         list: Liste des cartes formatées
     """
-    cards = []
-    try:
-        print(f"Récupération des cartes du set {set_id}...")
-        pokemon_cards = PokemonCard.where(q=f'set.id:{set_id}')
-
-        for card in pokemon_cards:
-            card_data = {
-                'id': card.id,
-                'name': card.name,
-                'set_name': card.set.name,
-                'set_id': card.set.id,
-                'number': card.number,
-                'rarity': getattr(card, 'rarity', 'Common'),
-                'images': {
-                    'small': card.images.small,
-                    'large': card.images.large
-                }
-            }
-
-            if hasattr(card, 'tcgplayer') and hasattr(card.tcgplayer, 'prices'):
-                prices_dict = {}
-                for price_type, price_obj in card.tcgplayer.prices.__dict__.items():
-                    if price_obj is not None:
-                        if hasattr(price_obj, '__dict__'):
-                            formatted_price_dict = {}
-                            for key, value in price_obj.__dict__.items():
-                                if isinstance(value, (int, float)):
-                                    formatted_price_dict[key] = round(float(value), 2)
-                                else:
-                                    formatted_price_dict[key] = value
-                            prices_dict[price_type] = formatted_price_dict
-                        else:
-                            if isinstance(price_obj, (int, float)):
-                                prices_dict[price_type] = round(float(price_obj), 2)
-                            else:
-                                prices_dict[price_type] = price_obj
-                card_data['prices'] = prices_dict
+    print(f"Récupération des cartes du set {set_id}...")
+    return list(fetch_sets([set_id], cache=cache))
 
-            if hasattr(card, 'cardmarket') and hasattr(card.cardmarket, 'prices'):
-                cardmarket_prices = {}
-                for price_key, price_value in card.cardmarket.prices.__dict__.items():
-                    if price_value is not None:
-                        if isinstance(price_value, (int, float)):
-                            cardmarket_prices[price_key] = round(float(price_value), 2)
-                        else:
-                            cardmarket_prices[price_key] = price_value
-
-                card_data['cardmarket'] = {
-                    'url': card.cardmarket.url,
-                    'updatedAt': card.cardmarket.updatedAt,
-                    'prices': cardmarket_prices
-                }
-
-            if hasattr(card.set, 'releaseDate'):
-                card_data['release_date'] = card.set.releaseDate
-
-            cards.append(card_data)
-
-        print(f"✓ {len(cards)} cartes récupérées du set {set_id}")
-        return cards
-
-    except Exception as e:
-        print(f"Erreur lors de la récupération du set {set_id}: {str(e)}")
-        return []
-
-def import_cards_to_db(cards_data, clear_existing=True):
-    rarity_mapping = {
-        'Common': 'COMMON',
-        'Uncommon': 'UNCOMMON',
-        'Rare': 'RARE',
-        'Rare Holo': 'HOLORARE',
-        'Rare Holo GX': 'HOLORAREGX',
-        'Rare Holo EX': 'HOLORAREEX',
-        'Rare Holo LV.X': 'HOLORARELVX',
-        'Rare Holo Star': 'HOLORARESTARRARE',
-        'Rare BREAK': 'BREAKRARE',
-        'Rare Prime': 'PRIMERARE',
-        'Rare Prism Star': 'PRISMRARE',
-        'Rare Rainbow': 'RAINBOWRARE',
-        'Rare Shining': 'SHININGRARE',
-        'Rare Shiny': 'SHINYRARE',
-        'Rare Shiny GX': 'SHINYRAREGX',
-        'Rare Ultra': 'ULTRARARE',
-        'Rare ACE': 'ACERARE',
-        'Rare Secret': 'SECRETRARE',
-        'Rare Holo V': 'HOLORAREV',
-        'Rare Holo VMAX': 'HOLORAREVMAX',
-        'Rare Holo VSTAR': 'HOLORAREVSTAR',
-        'Rare Illustration Rare': 'ILLUSTRATIONRARE',
-        'Rare Special Illustration Rare': 'SPECIALILLUSTRATIONRARE',
-        'Rare Double Rare': 'DOUBLERARE',
-        'Rare Triple Rare': 'TRIPLERAARE',
-        'Promo': 'PROMO',
-        'LEGEND': 'LEGENDRARE',
-        'None': 'UNKNOWN'
-    }
 
+def fetch_sets(set_ids, parallelism=DEFAULT_PARALLELISM, rate=DEFAULT_RATE, cache=None):
+    """
+    Récupère les cartes de plusieurs sets en parallèle (pages de 250, seau à jetons, 429/Retry-After respectés)
+    Générateur: les cartes d'un set sont produites dès qu'il est complet, seuls les sets en cours sont en mémoire
+    Args:
+        set_ids: Identifiants des sets, ou None pour tout le catalogue
+        parallelism: Requêtes simultanées vers l'API
+        rate: Requêtes par seconde en moyenne
+        cache: Cache disque des réponses (pokemon/response_cache.py), None pour toujours appeler l'API
+    Returns:
+        Iterator: Cartes formatées, set par set dans l'ordre de fin de récupération
+    """
+    client = TcgApiClient(API_KEY, rate=rate, pool_size=parallelism, cache=cache)
+    fetcher = SetFetcher(client, parallelism=parallelism)
+    if set_ids is None:
+        set_ids = fetcher.fetch_set_ids()
+        print(f"✓ {len(set_ids)} sets dans le catalogue")
+
+    for set_id, cards in fetcher.iter_cards(set_ids):
+        stats = fetcher.set_stats[-1]
+        print(f"✓ {stats['cards']} cartes récupérées du set {set_id} "
+              f"({stats['api_calls']} appels API, {stats['cache_hits']} depuis le cache, {stats['elapsed']:.1f}s)")
+        for card in cards:
+            yield format_card(card)
+    for set_id, error in fetcher.errors.items():
+        print(f"Erreur lors de la récupération du set {set_id}: {error}")
+
+    summary = client.stats.summary()
+    print(f"✓ {summary['api_calls']} appels API en {summary['elapsed']}s ({summary['calls_per_sec']}/s), "
+          f"{summary['throttled']} réponses 429, {summary['retries']} nouvelles tentatives")
+    if cache is not None:
+        print(f"✓ {summary['cache_hits']} réponses lues depuis le cache {cache.directory}"
+              + (f", {summary['stale']} copies expirées (API indisponible)" if summary['stale'] else ""))
+
+
+def import_cards_to_db(cards_data, clear_existing=True, batch_size=DEFAULT_BATCH_SIZE, force=False):
+    """
+    Importe les cartes par lots (api/card_ingestion.py): sets en mémoire, upsert groupé des cartes et des prix
+    Seules les cartes nouvelles ou dont l'entrée source a changé (empreinte) sont écrites.
+    Args:
+        cards_data: Cartes au format du seed JSON (liste ou itérable, par exemple iter_seed)
+        clear_existing: Supprimer toutes les cartes avant l'import
+        batch_size: Cartes écrites par transaction
+        force: Réécrire aussi les cartes inchangées
+    """
     if clear_existing:
         print("Suppression des cartes existantes...")
         count = Card.objects.all().count()
         Card.objects.all().delete()
         print(f"✓ {count} cartes supprimées")
 
-    created_count = 0
-    updated_count = 0
-    error_count = 0
-    base_date = timezone.now().date() - timedelta(days=365)
-
     print("Importation des cartes dans la base de données...")
-    for card_data in cards_data:
-        try:
-            name = card_data.get('name', 'Unknown Card')
-            number = card_data.get('number', '0')
-            original_rarity = card_data.get('rarity', 'Common')
-            rarity = rarity_mapping.get(original_rarity, 'COMMON')
-            image_url = card_data.get('images', {}).get('large', '')
-
-            set_id = card_data.get('set_id')
-            set_title = card_data.get('set_name', set_id)
-            release_date = card_data.get('release_date')
-
-            try:
-                release_date = datetime.strptime(release_date, '%Y/%m/%d').date()
-            except:
-                release_date = base_date + timedelta(days=random.randint(0, 365))
-
-            set_obj, _ = DjangoSet.objects.get_or_create(
-                code=set_id,
-                defaults={
-                    'title': set_title,
-                    'tcg': 'pokemon',
-                    'release_date': release_date,
-                    'total_cards': 0,
-                    'image_url': '',
-                    'symbol_url': ''
-                }
-            )
-
-            # ===> Estimation du prix
-            price = 0.99
-            if 'prices' in card_data and card_data['prices']:
-                prices = card_data['prices']
-                for tier in ['normal', 'holofoil']:
-                    if tier in prices and isinstance(prices[tier], dict):
-                        if 'market' in prices[tier]:
-                            price = float(prices[tier]['market'])
-                            break
-                        elif 'mid' in prices[tier]:
-                            price = float(prices[tier]['mid'])
-                            break
-                if price <= 0:
-                    price = round(random.uniform(0.1, 5.0), 2)
-
-            card, created = Card.objects.update_or_create(
-                set=set_obj,
-                number=number,
-                defaults={
-                    'name': name,
-                    'rarity': rarity,
-                    'image_url': image_url,
-                    'price': Money(price, 'USD'),
-                    'description': f"Pokemon card from {set_title} set",
-                    'release_date': release_date
-                }
-            )
-
-            # ===> CardMarket Prices
-            cardmarket_data = card_data.get('cardmarket', {})
-            if cardmarket_data and 'prices' in cardmarket_data:
-                prices = cardmarket_data['prices']
-                avg1 = round(float(prices.get('avg1', 0) or 0), 2)
-                avg7 = round(float(prices.get('avg7', 0) or 0), 2)
-                avg30 = round(float(prices.get('avg30', 0) or 0), 2)
-            else:
-                base_price = price
-                variation_percent = 0.15
-                avg1 = round(base_price * (1 + random.uniform(-variation_percent / 3, variation_percent / 3)), 2)
-                avg7 = round(base_price * (1 + random.uniform(-variation_percent / 2, variation_percent / 2)), 2)
-                avg30 = round(base_price * (1 + random.uniform(-variation_percent, variation_percent)), 2)
-
-            CardPrice.objects.update_or_create(
-                card=card,
-                defaults={
-                    'avg1': avg1,
-                    'avg7': avg7,
-                    'avg30': avg30,
-                    'daily_price': {}
-                }
-            )
-
-            if created:
-                created_count += 1
-                print(f"✓ Créée: {name} ({set_title} #{number})")
-            else:
-                updated_count += 1
-                print(f"✓ Mise à jour: {name} ({set_title} #{number})")
-
-        except Exception as e:
-            error_count += 1
-            print(f"✕ Erreur: {str(e)}")
+    stats = CardIngestor(batch_size=batch_size, force=force).ingest(cards_data).summary()
 
     print(f"\nRésumé de l'importation:")
-    print(f"✓ {created_count} cartes créées")
-    print(f"✓ {updated_count} cartes mises à jour")
-    if error_count > 0:
-        print(f"✕ {error_count} erreurs rencontrées")
+    print(f"✓ {stats['created']} cartes créées")
+    print(f"✓ {stats['updated']} cartes mises à jour")
+    print(f"✓ {stats['unchanged']} cartes inchangées (non réécrites)")
+    print(f"✓ {stats['batches']} lots en {stats['elapsed']}s ({stats['cards_per_sec']} cartes/s)")
+    if stats['errors'] > 0:
+        print(f"✕ {stats['errors']} erreurs rencontrées")
 
 
 def main():
-    TARGET_SETS = ['swsh45sv', 'swsh9', 'sm12']
-
-    all_cards = []
-    for set_id in TARGET_SETS:
-        cards = get_cards_from_set(set_id)
-        all_cards.extend(cards)
-
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seeds')
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    output_file = os.path.join(output_dir, 'pokemon_cards_seed.json')
-    print(f"Sauvegarde des données en JSON dans {output_file}...")
-
-    json_data = []
-    for card in all_cards:
-        json_data.append(card)
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, indent=2)
-
-    print(f"✓ Données JSON sauvegardées")
-
-    import_cards_to_db(all_cards, clear_existing=False)
+    parser = argparse.ArgumentParser(description='Récupère les cartes de l\'API Pokémon TCG, écrit le seed JSON et importe en base')
+    parser.add_argument('--sets', nargs='+', default=TARGET_SETS, help='Sets à récupérer')
+    parser.add_argument('--all-sets', action='store_true', help='Récupérer tout le catalogue')
+    parser.add_argument('--parallelism', type=int, default=DEFAULT_PARALLELISM, help='Requêtes simultanées vers l\'API')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requêtes par seconde en moyenne')
+    parser.add_argument('--format', choices=['ndjson.gz', 'json'], default='ndjson.gz',
+                        help='Format du seed écrit: NDJSON compressé (lu en flux) ou tableau JSON')
+    parser.add_argument('--from-seed', type=str, default=None,
+                        help='Importer un fichier seed (.ndjson.gz ou .json) sans appeler l\'API')
+    parser.add_argument('--force', action='store_true',
+                        help='Réécrire toutes les cartes, même celles dont l\'entrée source n\'a pas changé')
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    if args.from_seed:
+        print(f"Importation du seed {args.from_seed}...")
+        import_cards_to_db(iter_seed(args.from_seed), clear_existing=False, force=args.force)
+        return
+
+    cache = cache_from_options(**vars(args))
+    cards = fetch_sets(None if args.all_sets else args.sets, parallelism=args.parallelism, rate=args.rate,
+                       cache=cache)
+
+    # Les cartes passent directement de l'API au seed, puis le seed est relu en flux pour l'import
+    output_file = os.path.join(SEEDS_DIR, f'pokemon_cards_seed.{args.format}')
+    print(f"Sauvegarde des données dans {output_file}...")
+    count = write_seed(output_file, cards)
+    print(f"✓ {count} cartes sauvegardées")
+
+    import_cards_to_db(iter_seed(output_file), clear_existing=False, force=args.force)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,5 @@
 import os
 import sys
-import json
 import django
 import argparse
 from datetime import datetime
@@ -12,7 +11,10 @@ django.setup()
 from api.models import Set
 from django.utils import timezone
 
-from pokemontcgsdk import Set as PokemonSet, RestClient
+from pokemontcgsdk import RestClient
+from pokemon.tcg_fetcher import SetFetcher, TcgApiClient
+from pokemon.response_cache import add_cache_arguments, cache_from_options
+from pokemon.seed_io import SEEDS_DIR, iter_seed, write_seed
 
 API_KEY = os.getenv('POKEMON_TCG_API_KEY')
 if not API_KEY:
@@ -22,25 +24,34 @@ if not API_KEY:
 
 RestClient.configure(API_KEY)
 
-def get_pokemon_sets():
+def get_pokemon_sets(cache=None):
+    """
+    Récupère tous les sets du catalogue (pages de 250, depuis le cache si fourni)
+    Args:
+        cache: Cache disque des réponses de l'API (pokemon/response_cache.py)
+    """
     sets = []
     try:
         print("Récupération des sets Pokémon...")
-        pokemon_sets = PokemonSet.all()
+        client = TcgApiClient(API_KEY, cache=cache)
+        pokemon_sets = SetFetcher(client).fetch_set_records()
 
         for set_data in pokemon_sets:
+            images = set_data.get('images') or {}
             set_info = {
-                'title': set_data.name,
-                'code': set_data.id,
+                'title': set_data['name'],
+                'code': set_data['id'],
                 'tcg': 'pokemon',
-                'release_date': set_data.releaseDate if hasattr(set_data, 'releaseDate') else None,
-                'total_cards': set_data.total if hasattr(set_data, 'total') else 0,
-                'image_url': set_data.images.logo if hasattr(set_data, 'images') and hasattr(set_data.images, 'logo') else '',
-                'symbol_url': set_data.images.symbol if hasattr(set_data, 'images') and hasattr(set_data.images, 'symbol') else ''
+                'release_date': set_data.get('releaseDate'),
+                'total_cards': set_data.get('total', 0),
+                'image_url': images.get('logo', ''),
+                'symbol_url': images.get('symbol', '')
             }
             sets.append(set_info)
 
         print(f"✓ {len(sets)} sets Pokémon récupérés")
+        if client.stats.cache_hits:
+            print(f"✓ {client.stats.cache_hits} réponses lues depuis le cache {cache.directory}")
         return sets
 
     except Exception as e:
@@ -108,32 +119,27 @@ def import_sets_to_db(sets_data, clear_existing=False):
 def main():
     parser = argparse.ArgumentParser(description='Importe les sets Pokémon dans la base de données')
     parser.add_argument('--clear', action='store_true', help='Supprimer les sets existants avant l\'import')
-    parser.add_argument('--json', type=str, help='Chemin du fichier JSON à utiliser au lieu de l\'API')
+    parser.add_argument('--json', type=str, help='Chemin du fichier seed (.json ou .ndjson.gz) à utiliser au lieu de l\'API')
+    parser.add_argument('--format', choices=['ndjson.gz', 'json'], default='ndjson.gz',
+                        help='Format du seed écrit: NDJSON compressé ou tableau JSON')
+    add_cache_arguments(parser)
 
     args = parser.parse_args()
 
     if args.json:
         try:
-            with open(args.json, 'r', encoding='utf-8') as f:
-                sets_data = json.load(f)
+            sets_data = list(iter_seed(args.json))
             print(f"Chargement de {len(sets_data)} sets depuis {args.json}")
         except Exception as e:
             print(f"Erreur lors du chargement du fichier JSON: {str(e)}")
             return
     else:
-        sets_data = get_pokemon_sets()
+        sets_data = get_pokemon_sets(cache_from_options(**vars(args)))
 
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seeds')
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    output_file = os.path.join(output_dir, 'pokemon_sets_seed.json')
-    print(f"Sauvegarde des données en JSON dans {output_file}...")
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(sets_data, f, indent=2)
-
-    print(f"✓ Données JSON sauvegardées")
+    output_file = os.path.join(SEEDS_DIR, f'pokemon_sets_seed.{args.format}')
+    print(f"Sauvegarde des données dans {output_file}...")
+    write_seed(output_file, sets_data)
+    print(f"✓ Données sauvegardées")
 
     import_sets_to_db(sets_data, args.clear)
 
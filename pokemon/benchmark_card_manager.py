@@ -0,0 +1,74 @@
+"""
+Appels API et durée par set de PokemonCardManager.get_set_cards, contre un serveur local qui rejoue des réponses enregistrées
+Compare avec l'ancien chemin (recherche puis un Card.find par carte). Sans enregistrement, les réponses sont
+reconstruites à partir des seeds (seeds/pokemon_cards_seed.json et pokemon_sets_seed.json).
+Utilisation: python pokemon/benchmark_card_manager.py [--recording enregistrement.json] [--sets swsh45sv swsh9] [--latency-ms 100]
+             python pokemon/benchmark_card_manager.py --record enregistrement.json --sets swsh45sv swsh9  (API réelle)
+"""
+import sys
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pokemon.fake_tcg_api import FakeTcgApiServer, load_catalog
+
+
+def record(path, set_ids):
+    """Enregistre les réponses réelles de l'API pour les sets demandés (format lu par fake_tcg_api.load_catalog)"""
+    from pokemon.tcg_fetcher import SetFetcher, TcgApiClient
+
+    cards_by_set = SetFetcher(TcgApiClient()).fetch_sets(set_ids)
+    cards = [card for set_id in set_ids for card in cards_by_set.get(set_id, [])]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'recorded_at': datetime.now().isoformat(), 'cards': cards}, f)
+    print(f"✓ {len(cards)} cartes de {len(cards_by_set)} sets enregistrées dans {path}")
+
+
+def get_set_cards_one_call_per_card(manager, set_id):
+    """L'ancien get_set_cards: la recherche du set, puis un Card.find par carte"""
+    from pokemontcgsdk import Card
+    return [manager.extract_card_info(card.id) for card in Card.where(q=f'set.id:{set_id}')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Appels API par set de PokemonCardManager contre des réponses rejouées')
+    parser.add_argument('--sets', nargs='+', default=None, help='Sets à récupérer (par défaut: tous ceux enregistrés)')
+    parser.add_argument('--recording', type=str, default='seeds', help='Réponses enregistrées avec --record (par défaut: seeds)')
+    parser.add_argument('--record', type=str, default=None, help='Enregistrer les réponses de l\'API réelle dans ce fichier')
+    parser.add_argument('--latency-ms', type=float, default=100.0, help='Latence simulée par requête')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.sets or ['swsh45sv', 'swsh9'])
+        return
+
+    cards = load_catalog(args.recording)
+    set_ids = args.sets or list(dict.fromkeys(card['set']['id'] for card in cards))
+
+    server = FakeTcgApiServer(cards, latency=args.latency_ms / 1000).start()
+    os.environ.setdefault('POKEMON_TCG_API_KEY', 'stand-in')
+    import pokemontcgsdk.querybuilder
+    pokemontcgsdk.querybuilder.__endpoint__ = server.base_url
+    from pokemon.card_manager import PokemonCardManager
+    from pokemon.tcg_fetcher import TcgApiClient
+
+    print(f"{len(cards)} cartes enregistrées, latence {args.latency_ms:.0f} ms\n")
+    print(f"{'mode':<22}{'set':<12}{'cartes':>8}{'appels API':>12}{'durée s':>10}")
+    for label, fetch in (("un appel par carte", get_set_cards_one_call_per_card),
+                         ("recherche paginée", lambda manager, set_id: manager.get_set_cards(set_id))):
+        for set_id in set_ids:
+            manager = PokemonCardManager(client=TcgApiClient(base_url=server.base_url, rate=1000, burst=100))
+            server.reset()
+            start = time.perf_counter()
+            records = [record for record in fetch(manager, set_id) if record]
+            elapsed = time.perf_counter() - start
+            print(f"{label:<22}{set_id:<12}{len(records):>8}{server.requests:>12}{elapsed:>10.2f}")
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Durée d'un rafraîchissement complet du catalogue avec SetFetcher, de 1 requête à N requêtes simultanées,
+contre le faux serveur de l'API (latence et limite de débit avec 429/Retry-After)
+Utilisation: python pokemon/benchmark_set_fetcher.py [--catalog synthetic] [--parallelism 1,4,16] [--latency-ms 300] [--server-rate 20] [--client-rate 25]
+"""
+import sys
+import os
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pokemon.fake_tcg_api import FakeTcgApiServer, load_catalog
+from pokemon.tcg_fetcher import SetFetcher, TcgApiClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rafraîchissement complet du catalogue: séquentiel contre parallèle')
+    parser.add_argument('--catalog', type=str, default='synthetic', help='seeds, synthetic ou fichier enregistré')
+    parser.add_argument('--parallelism', type=str, default='1,4,16', help='Requêtes simultanées à mesurer')
+    parser.add_argument('--latency-ms', type=float, default=300.0, help='Latence simulée par requête')
+    parser.add_argument('--server-rate', type=float, default=20.0, help='Requêtes/s acceptées par le serveur avant 429')
+    parser.add_argument('--client-rate', type=float, default=25.0, help='Débit du seau à jetons du client')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Proportion de réponses 503')
+    args = parser.parse_args()
+
+    cards = load_catalog(args.catalog)
+    server = FakeTcgApiServer(cards, latency=args.latency_ms / 1000, rate_limit=args.server_rate,
+                              fail_rate=args.fail_rate).start()
+    print(f"{len(cards)} cartes dans {len(server.sets)} sets, latence {args.latency_ms:.0f} ms, "
+          f"serveur {args.server_rate:.0f} req/s, client {args.client_rate:.0f} req/s\n")
+    print(f"{'simultanées':>12}{'cartes':>9}{'appels':>8}{'429':>6}{'retries':>9}{'conc. max':>11}{'durée s':>10}")
+
+    for parallelism in (int(value) for value in args.parallelism.split(',')):
+        server.reset()
+        client = TcgApiClient(api_key='fake', base_url=server.base_url, rate=args.client_rate,
+                              burst=max(1, int(args.client_rate)), backoff=0.2, pool_size=parallelism)
+        fetcher = SetFetcher(client, parallelism=parallelism)
+        start = time.perf_counter()
+        set_ids = fetcher.fetch_set_ids()
+        fetched = sum(len(set_cards) for set_cards in fetcher.fetch_sets(set_ids).values())
+        elapsed = time.perf_counter() - start
+        stats = client.stats.summary()
+        failed = f" ({len(fetcher.errors)} sets en échec)" if fetcher.errors else ""
+        print(f"{parallelism:>12}{fetched:>9}{stats['api_calls']:>8}{server.throttled:>6}{stats['retries']:>9}"
+              f"{server.max_active:>11}{elapsed:>10.1f}{failed}")
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
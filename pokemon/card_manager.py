@@ -1,64 +1,128 @@
 from pokemontcgsdk import Card, Set, RestClient
 from typing import List, Dict
-import json
+from dataclasses import asdict
 import os
 from datetime import datetime
 from dotenv import load_dotenv
+from pokemon.tcg_fetcher import SetFetcher, TcgApiClient, DEFAULT_PARALLELISM, to_sdk_card
+from pokemon.response_cache import ResponseCache
+from pokemon.seed_io import write_seed
 
 load_dotenv()
 
 API_KEY = os.getenv('POKEMON_TCG_API_KEY')
-if not API_KEY:
-    raise ValueError("La clé API Pokémon TCG n'est pas configurée. Veuillez définir POKEMON_TCG_API_KEY dans votre fichier .env")
+MISSING_API_KEY = "La clé API Pokémon TCG n'est pas configurée. Veuillez définir POKEMON_TCG_API_KEY dans votre fichier .env"
 
 RestClient.configure(API_KEY)
 
+def _prices_to_dict(prices) -> Dict:
+    """Prix TCGplayer (dataclasses du SDK) en dict JSON, sans les valeurs absentes"""
+    if prices is None:
+        return {}
+    return {
+        tier: {key: value for key, value in tier_prices.items() if value is not None}
+        for tier, tier_prices in asdict(prices).items() if tier_prices is not None
+    }
+
+
 class PokemonCardManager:
-    def __init__(self):
+    def __init__(self, parallelism: int = DEFAULT_PARALLELISM, client: TcgApiClient = None, cache: ResponseCache = None):
+        """
+        Args:
+            parallelism: Requêtes simultanées vers l'API quand plusieurs sets ou pages sont récupérés
+            client: Client de l'API (seau à jetons, nouvelles tentatives); par défaut l'API réelle avec API_KEY
+            cache: Cache disque des réponses pour le client par défaut (None: toujours appeler l'API)
+        """
+        # La clé n'est pas nécessaire pour rejouer le cache hors ligne
+        if client is None and not API_KEY and not (cache is not None and cache.offline):
+            raise ValueError(MISSING_API_KEY)
         self.cards_data = []
+        self.parallelism = parallelism
+        self.client = client or TcgApiClient(API_KEY, pool_size=parallelism, cache=cache)
+        self.api_calls = 0
+        # Appels réseau, lectures du cache, cartes et durée de chaque set récupéré
+        self.set_stats = []
+
+    def card_to_record(self, card: Card) -> Dict:
+        """
+        Informations formatées d'une carte déjà reçue de l'API (Card.where ou Card.find)
+        Args:
+            card: Carte du SDK pokemontcgsdk
+        Returns:
+            Dict: Informations formatées de la carte
+        """
+        # Récupération du prix si disponible
+        prices = {}
+        if getattr(card, 'tcgplayer', None) is not None:
+            prices = _prices_to_dict(card.tcgplayer.prices)
+
+        # Récupération de la date de sortie du set
+        release_date = None
+        if hasattr(card, 'set') and hasattr(card.set, 'releaseDate'):
+            release_date = card.set.releaseDate
+
+        return {
+            'id': card.id,
+            'set': card.set.id,
+            'set_name': card.set.name,
+            'name': card.name,
+            'supertype': card.supertype,
+            'subtypes': card.subtypes or [],
+            'types': card.types or [],
+            'number': card.number,
+            'rarity': card.rarity,
+            'images': {
+                'small': card.images.small,
+                'large': card.images.large
+            },
+            'prices': prices,
+            'release_date': release_date
+        }
 
     def extract_card_info(self, card_id: str) -> Dict:
         """
-        Extrait les informations d'une carte spécifique
+        Extrait les informations d'une carte spécifique (un appel API)
         Args:
             card_id: Identifiant de la carte (ex: 'swsh45sv-SV110')
         Returns:
             Dict: Informations formatées de la carte
         """
         try:
-            card = Card.find(card_id)
-
-            # Récupération du prix si disponible
-            prices = {}
-            if hasattr(card, 'tcgplayer') and hasattr(card.tcgplayer, 'prices'):
-                prices = card.tcgplayer.prices
-
-            # Récupération de la date de sortie du set
-            release_date = None
-            if hasattr(card, 'set') and hasattr(card.set, 'releaseDate'):
-                release_date = card.set.releaseDate
-
-            return {
-                'id': card.id,
-                'set': card.set.id,
-                'set_name': card.set.name,
-                'name': card.name,
-                'supertype': card.supertype,
-                'subtypes': card.subtypes if hasattr(card, 'subtypes') else [],
-                'types': card.types if hasattr(card, 'types') else [],
-                'number': card.number,
-                'rarity': card.rarity if hasattr(card, 'rarity') else None,
-                'images': {
-                    'small': card.images.small,
-                    'large': card.images.large
-                },
-                'prices': prices,
-                'release_date': release_date
-            }
+            self.api_calls += 1
+            return self.card_to_record(to_sdk_card(self.client.get(f'cards/{card_id}')['data']))
         except Exception as e:
             print(f"Erreur lors de l'extraction de la carte {card_id}: {str(e)}")
             return None
 
+    def fetch_sets(self, set_ids: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Récupère les cartes de plusieurs sets en parallèle (pages de 250 cartes, débit limité): les
+        enregistrements sont construits à partir des résultats de la recherche, sans appel par carte
+        Args:
+            set_ids: Identifiants des sets
+        Returns:
+            Dict[str, List[Dict]]: Cartes de chaque set récupéré
+        """
+        fetcher = SetFetcher(self.client, self.parallelism)
+        cards_by_set = fetcher.fetch_cards(set_ids)
+        for set_id, error in fetcher.errors.items():
+            print(f"Erreur lors de la récupération du set {set_id}: {error}")
+
+        result = {}
+        for stats in fetcher.set_stats:
+            records = []
+            for card in cards_by_set[stats['set_id']]:
+                try:
+                    records.append(self.card_to_record(card))
+                except Exception as e:
+                    print(f"Erreur lors de l'extraction de la carte {card.id}: {str(e)}")
+            result[stats['set_id']] = records
+            self.set_stats.append(stats)
+            self.api_calls += stats['api_calls']
+            print(f"✓ {stats['set_id']}: {stats['cards']} cartes, {stats['api_calls']} appels API, "
+                  f"{stats['cache_hits']} depuis le cache, {stats['elapsed']:.2f}s")
+        return result
+
     def get_set_cards(self, set_id: str) -> List[Dict]:
         """
         Récupère toutes les cartes d'un set spécifique
@@ -67,17 +131,7 @@ class PokemonCardManager:
         Returns:
             List[Dict]: Liste des cartes du set
         """
-        try:
-            cards = Card.where(q=f'set.id:{set_id}')
-            result = []
-            for card in cards:
-                card_info = self.extract_card_info(card.id)
-                if card_info:
-                    result.append(card_info)
-            return result
-        except Exception as e:
-            print(f"Erreur lors de la récupération du set {set_id}: {str(e)}")
-            return []
+        return self.fetch_sets([set_id]).get(set_id, [])
 
     def generate_seed_data(self, set_ids: List[str]) -> None:
         """
@@ -86,13 +140,13 @@ class PokemonCardManager:
             set_ids: Liste des identifiants de sets
         """
         self.cards_data = []  # Réinitialisation pour éviter les doublons
+        cards_by_set = self.fetch_sets(set_ids)
         for set_id in set_ids:
-            cards = self.get_set_cards(set_id)
-            self.cards_data.extend(cards)
+            self.cards_data.extend(cards_by_set.get(set_id, []))
 
     def export_to_json(self, filename: str = None) -> None:
         """
-        Exporte les données vers un fichier JSON
+        Exporte les données vers un fichier seed (tableau JSON, ou NDJSON compressé si filename finit par .ndjson.gz)
         Args:
             filename: Nom du fichier de sortie
         """
@@ -100,5 +154,4 @@ class PokemonCardManager:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f'pokemon_cards_seed_{timestamp}.json'
 
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.cards_data, f, indent=2)
+        write_seed(filename, self.cards_data)
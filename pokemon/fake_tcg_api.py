@@ -0,0 +1,232 @@
+"""
+Faux serveur de l'API Pokémon TCG (/v2/cards, /v2/cards/<id>, /v2/sets) pour des tests et benchmarks reproductibles
+
+Les cartes viennent d'un enregistrement de l'API réelle, des seeds du dépôt ou d'un catalogue
+synthétique déterministe. Le serveur peut simuler la latence, des 503 et une limite de débit
+(429 avec Retry-After), et mesure la concurrence réellement reçue.
+Utilisation: python pokemon/fake_tcg_api.py [--port 8765] [--catalog seeds|synthetic|enregistrement.json] [--latency-ms 100] [--rate-limit 20]
+"""
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pokemon.tcg_fetcher import TokenBucket, PAGE_SIZE
+from pokemon.seed_io import find_seed, iter_seed
+RARITIES = ['Common', 'Uncommon', 'Rare', 'Rare Holo', 'Rare Holo V', 'Rare Ultra', 'Rare Secret']
+
+
+def cards_from_seeds():
+    """Réponses de l'API (format /v2/cards) reconstruites à partir des seeds"""
+    seed_sets = {set_data['code']: set_data for set_data in iter_seed(find_seed('pokemon_sets_seed'))}
+
+    cards = []
+    for card in iter_seed(find_seed('pokemon_cards_seed')):
+        set_data = seed_sets.get(card['set_id'], {})
+        cards.append(_card(
+            card['id'], card['name'], card['number'], card.get('rarity'), card['images'],
+            _set(card['set_id'], card['set_name'], card.get('release_date', ''), set_data.get('total_cards', 0),
+                 set_data.get('symbol_url', ''), set_data.get('image_url', '')),
+            card.get('prices', {}), card.get('cardmarket'),
+        ))
+    return cards
+
+
+def synthetic_catalog(set_count=160, cards_per_set=120, seed=0):
+    """Catalogue déterministe de la taille du vrai (environ 160 sets), avec des sets de tailles variées"""
+    rng = random.Random(seed)
+    cards = []
+    for set_index in range(set_count):
+        set_id = f"fake{set_index:03d}"
+        total = max(1, int(cards_per_set * rng.uniform(0.3, 2.5)))
+        set_data = _set(set_id, f"Fake Set {set_index}", f"{1999 + set_index % 26}/01/01", total,
+                        f"https://images.example/{set_id}/symbol.png", f"https://images.example/{set_id}/logo.png")
+        for number in range(1, total + 1):
+            market = round(rng.uniform(0.1, 50), 2)
+            cards.append(_card(
+                f"{set_id}-{number}", f"Card {set_index}-{number}", str(number), rng.choice(RARITIES),
+                {'small': f"https://images.example/{set_id}/{number}.png",
+                 'large': f"https://images.example/{set_id}/{number}_hires.png"},
+                set_data,
+                {'normal': {'low': round(market * 0.8, 2), 'mid': market, 'high': round(market * 1.5, 2), 'market': market}},
+                {'url': '', 'updatedAt': '', 'prices': {'avg1': market, 'avg7': market, 'avg30': market}},
+            ))
+    return cards
+
+
+def _set(set_id, name, release_date, total, symbol, logo):
+    return {
+        'id': set_id,
+        'name': name,
+        'images': {'symbol': symbol, 'logo': logo},
+        'legalities': {},
+        'printedTotal': total,
+        'total': total,
+        'releaseDate': release_date,
+        'series': '',
+        'updatedAt': '',
+    }
+
+
+def _card(card_id, name, number, rarity, images, set_data, prices, cardmarket):
+    return {
+        'id': card_id,
+        'name': name,
+        'supertype': 'Pokémon',
+        'number': number,
+        'rarity': rarity,
+        'images': images,
+        'legalities': {},
+        'set': set_data,
+        'tcgplayer': {'url': '', 'updatedAt': '', 'prices': prices},
+        'cardmarket': cardmarket,
+    }
+
+
+def load_catalog(source):
+    """seeds, synthetic ou chemin d'un enregistrement ({"cards": [...]})"""
+    if source == 'seeds':
+        return cards_from_seeds()
+    if source == 'synthetic':
+        return synthetic_catalog()
+    with open(source, encoding='utf-8') as f:
+        return json.load(f)['cards']
+
+
+class FakeTcgApiServer:
+    """Sert /cards (q=set.id:..., paginé), /cards/<id> et /sets à partir d'une liste de cartes JSON"""
+
+    def __init__(self, cards, latency=0.0, rate_limit=0.0, burst=None, fail_rate=0.0, failing_sets=(), port=0):
+        """
+        Args:
+            latency: Délai en secondes ajouté à chaque réponse
+            rate_limit: Requêtes par seconde acceptées (0: illimité), au-delà 429 avec Retry-After
+            burst: Rafale acceptée par le limiteur (par défaut rate_limit)
+            fail_rate: Proportion de réponses 503
+            failing_sets: Sets dont la recherche de cartes répond toujours 503
+        """
+        self.cards = cards
+        self.by_id = {card['id']: card for card in cards}
+        self.by_set = {}
+        for card in cards:
+            self.by_set.setdefault(card['set']['id'], []).append(card)
+        self.sets = [set_cards[0]['set'] for set_cards in self.by_set.values()]
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.failing_sets = set(failing_sets)
+        self.limiter = TokenBucket(rate_limit, burst or max(1, rate_limit)) if rate_limit > 0 else None
+        self.requests = 0
+        self.throttled = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    status, body, headers = server.respond(self.path)
+                    payload = json.dumps(body).encode('utf-8')
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def respond(self, path):
+        if self.limiter is not None:
+            wait = self.limiter.try_acquire()
+            if wait > 0:
+                with self._lock:
+                    self.throttled += 1
+                return 429, {'error': {'message': 'Rate limit exceeded', 'code': 429}}, {'Retry-After': f"{wait:.2f}"}
+        time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            return 503, {'error': {'message': 'Service unavailable', 'code': 503}}, {}
+
+        url = urlsplit(path)
+        parts = url.path.strip('/').split('/')
+        if parts and parts[0] == 'v2':
+            parts = parts[1:]
+        params = parse_qs(url.query)
+        if parts == ['cards']:
+            query = params.get('q', [''])[0]
+            set_id = query[len('set.id:'):] if query.startswith('set.id:') else None
+            if set_id in self.failing_sets:
+                return 503, {'error': {'message': 'Service unavailable', 'code': 503}}, {}
+            matches = self.by_set.get(set_id, []) if set_id is not None else self.cards
+            return self._page(matches, params)
+        if parts == ['sets']:
+            return self._page(self.sets, params)
+        if len(parts) == 2 and parts[0] == 'cards' and parts[1] in self.by_id:
+            return 200, {'data': self.by_id[parts[1]]}, {}
+        return 404, {'error': {'message': 'Not found', 'code': 404}}, {}
+
+    def _page(self, items, params):
+        page = int(params.get('page', ['1'])[0])
+        page_size = min(int(params.get('pageSize', [str(PAGE_SIZE)])[0]), PAGE_SIZE)
+        data = items[(page - 1) * page_size:page * page_size]
+        return 200, {'data': data, 'page': page, 'pageSize': page_size, 'count': len(data),
+                     'totalCount': len(items)}, {}
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.throttled = 0
+            self.max_active = 0
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Faux serveur de l\'API Pokémon TCG')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--catalog', type=str, default='seeds', help='seeds, synthetic ou fichier enregistré')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Requêtes/s acceptées avant 429 (0: illimité)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Proportion de réponses 503')
+    args = parser.parse_args()
+
+    cards = load_catalog(args.catalog)
+    server = FakeTcgApiServer(cards, latency=args.latency_ms / 1000, rate_limit=args.rate_limit,
+                              fail_rate=args.fail_rate, port=args.port)
+    print(f"API factice sur {server.base_url}/v2 ({len(cards)} cartes, {len(server.sets)} sets)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,33 @@
-from card_manager import PokemonCardManager
 import os
+import sys
+import argparse
 from typing import List
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pokemon.card_manager import PokemonCardManager
+from pokemon.response_cache import add_cache_arguments, cache_from_options
+from pokemon.seed_io import SEEDS_DIR
+
 def main():
     # Définition des sets à extraire
     TARGET_SETS = ['swsh45sv', 'swsh9']  # Shining Fates et Brilliant Stars
+
+    parser = argparse.ArgumentParser(description='Génère le seed JSON des cartes à partir de l\'API Pokémon TCG')
+    parser.add_argument('--format', choices=['ndjson.gz', 'json'], default='ndjson.gz',
+                        help='Format du seed écrit: NDJSON compressé (lu en flux) ou tableau JSON')
+    add_cache_arguments(parser)
+    args = parser.parse_args()
     
     # Création du gestionnaire
-    manager = PokemonCardManager()
+    manager = PokemonCardManager(cache=cache_from_options(**vars(args)))
     
     # Génération des données
     print("Génération des données seed...")
     manager.generate_seed_data(TARGET_SETS)
     
     # Export des données
-    output_dir = 'seeds'
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        
-    output_file = os.path.join(output_dir, 'pokemon_cards_seed.json')
+    output_file = os.path.join(SEEDS_DIR, f'pokemon_cards_seed.{args.format}')
     manager.export_to_json(output_file)
     print(f"Données exportées vers {output_file}")
 
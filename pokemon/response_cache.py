@@ -0,0 +1,138 @@
+"""
+Cache disque des réponses JSON de l'API Pokémon TCG
+
+Chaque réponse est stockée sous le SHA-256 de sa requête (chemin et paramètres triés, sans
+la clé API). Une entrée plus jeune que ttl est servie sans appel réseau. En mode hors ligne,
+toute entrée est servie quel que soit son âge et une requête absente du cache lève
+OfflineCacheMiss: les imports sont rejoués à l'identique, sans réseau.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import requests
+
+# Dossier et durée de validité par défaut (TCG_API_CACHE_DIR, TCG_API_CACHE_TTL en secondes)
+DEFAULT_CACHE_DIR = os.getenv(
+    'TCG_API_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache', 'tcg_api'))
+DEFAULT_TTL = int(os.getenv('TCG_API_CACHE_TTL', str(24 * 3600)))
+
+
+class OfflineCacheMiss(requests.RequestException):
+    """Requête absente du cache en mode hors ligne"""
+
+
+def request_key(path, params=None) -> str:
+    """Clé stable d'une requête: l'ordre des paramètres n'y change rien"""
+    query = urlencode(sorted((params or {}).items()))
+    return f"{path.strip('/')}?{query}"
+
+
+class ResponseCache:
+    def __init__(self, directory=None, ttl=DEFAULT_TTL, offline=False):
+        """
+        Args:
+            directory: Dossier du cache (TCG_API_CACHE_DIR par défaut)
+            ttl: Âge en secondes au-delà duquel une réponse est redemandée à l'API
+            offline: Servir toutes les entrées quel que soit leur âge, sans jamais appeler l'API
+        """
+        self.directory = Path(directory or DEFAULT_CACHE_DIR)
+        self.ttl = ttl
+        self.offline = offline
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {"hit": 0, "stale": 0, "miss": 0, "stored": 0}
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.json"
+
+    def _count(self, status):
+        with self._lock:
+            self.stats[status] += 1
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Collision de hachage ou fichier d'une autre requête: ignoré
+        return entry if entry.get("key") == key else None
+
+    def get(self, path, params=None):
+        """
+        Returns:
+            Dict: Réponse en cache encore valide (ou quel que soit son âge hors ligne), sinon None
+        Raises:
+            OfflineCacheMiss: Requête absente du cache en mode hors ligne
+        """
+        key = request_key(path, params)
+        entry = self._read(key)
+        if entry is not None and (self.offline or time.time() - entry["fetched_at"] < self.ttl):
+            self._count("hit")
+            return entry["body"]
+        if self.offline:
+            self._count("miss")
+            raise OfflineCacheMiss(f"{key} absent du cache {self.directory} (mode hors ligne)")
+        self._count("miss")
+        return None
+
+    def get_stale(self, path, params=None):
+        """Réponse en cache quel que soit son âge, quand l'API ne répond plus"""
+        entry = self._read(request_key(path, params))
+        if entry is None:
+            return None
+        self._count("stale")
+        return entry["body"]
+
+    def put(self, path, params, body):
+        key = request_key(path, params)
+        cache_path = self._path(key)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "fetched_at": time.time(), "body": body}, f)
+        os.replace(tmp_path, cache_path)
+        self._count("stored")
+
+    def clear(self):
+        """Supprime toutes les entrées"""
+        for cache_path in self.directory.glob("*/*.json"):
+            cache_path.unlink(missing_ok=True)
+
+    def summary(self):
+        stats = dict(self.stats)
+        lookups = stats["hit"] + stats["miss"]
+        stats["hit_ratio"] = round(stats["hit"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def add_cache_arguments(parser):
+    """Options --offline, --cache-ttl, --no-cache et --refresh communes aux scripts d'import"""
+    parser.add_argument('--offline', action='store_true',
+                        help='Rejouer les réponses en cache sans appeler l\'API (échec si une requête est absente)')
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TTL,
+                        help='Durée de validité des réponses en cache, en secondes')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Dossier du cache des réponses de l\'API')
+    parser.add_argument('--no-cache', action='store_true', help='Toujours appeler l\'API, sans lire ni écrire le cache')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Redemander toutes les réponses à l\'API et mettre le cache à jour')
+
+
+def cache_from_options(offline=False, cache_ttl=DEFAULT_TTL, cache_dir=None, no_cache=False, refresh=False, **_):
+    """
+    Cache configuré par les options de add_cache_arguments
+    Returns:
+        ResponseCache: ou None avec --no-cache
+    """
+    if no_cache and offline:
+        raise ValueError("--offline nécessite le cache: --no-cache est incompatible")
+    if no_cache:
+        return None
+    return ResponseCache(cache_dir, ttl=0 if refresh else cache_ttl, offline=offline)
@@ -0,0 +1,137 @@
+"""
+Lecture et écriture des fichiers seed (cartes et sets)
+
+Deux formats, choisis d'après l'extension:
+- .ndjson.gz (ou .ndjson): un objet JSON par ligne, compressé en gzip. Lu et écrit en flux,
+  un enregistrement à la fois: la mémoire utilisée ne dépend pas de la taille du catalogue.
+- .json: l'ancien tableau JSON indenté, chargé entièrement en mémoire.
+"""
+import gzip
+import json
+import os
+import tempfile
+import threading
+from itertools import islice
+
+SEEDS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'seeds'))
+NDJSON_EXTENSIONS = ('.ndjson.gz', '.ndjson', '.jsonl.gz', '.jsonl')
+SEED_EXTENSIONS = ('.ndjson.gz', '.json')
+# Compromis taille/vitesse: le niveau 9 gagne peu sur du JSON et écrit bien plus lentement
+COMPRESS_LEVEL = 6
+
+
+def is_ndjson(path) -> bool:
+    return str(path).endswith(NDJSON_EXTENSIONS)
+
+
+def find_seed(name, directory=SEEDS_DIR):
+    """
+    Chemin du seed name (ex: 'pokemon_cards_seed'): le plus récent du .ndjson.gz et du .json existants
+    (le .json par défaut)
+    """
+    paths = [os.path.join(directory, name + extension) for extension in SEED_EXTENSIONS]
+    existing = [path for path in paths if os.path.exists(path)]
+    if not existing:
+        return paths[-1]
+    return max(existing, key=os.path.getmtime)
+
+
+def _open_text(path, mode, compressed):
+    if compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=COMPRESS_LEVEL)
+    return open(path, mode, encoding='utf-8')
+
+
+def iter_seed(path):
+    """
+    Enregistrements d'un fichier seed, un par un
+    Raises:
+        ValueError: Ligne NDJSON invalide (avec son numéro)
+    """
+    if not is_ndjson(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+
+    with _open_text(path, 'r', str(path).endswith('.gz')) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}, ligne {line_number}: {e}") from e
+
+
+def write_seed(path, records) -> int:
+    """
+    Écrit des enregistrements (liste ou générateur) dans un fichier seed, de façon atomique
+    Returns:
+        int: Nombre d'enregistrements écrits
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    count = 0
+    try:
+        if is_ndjson(path):
+            with _open_text(tmp_path, 'w', str(path).endswith('.gz')) as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n')
+                    count += 1
+        else:
+            records = list(records)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, indent=2)
+            count = len(records)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+class SeedRecords:
+    """
+    Vue paginable d'un fichier seed (len et tranches, comme attendu par les paginateurs Django/DRF)
+    sans le charger: une tranche relit le fichier jusqu'à la page demandée. Le nombre
+    d'enregistrements est compté une fois par version du fichier (taille et date de modification).
+    """
+
+    _counts = {}
+    _counts_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+
+    def _version(self):
+        stat = os.stat(self.path)
+        return (os.path.abspath(self.path), stat.st_size, stat.st_mtime_ns)
+
+    def __len__(self):
+        version = self._version()
+        with self._counts_lock:
+            count = self._counts.get(version)
+        if count is None:
+            count = sum(1 for _ in iter_seed(self.path))
+            with self._counts_lock:
+                self._counts[version] = count
+        return count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1) or (index.start or 0) < 0 or (index.stop is not None and index.stop < 0):
+                return list(iter_seed(self.path))[index]
+            return list(islice(iter_seed(self.path), index.start or 0, index.stop))
+        if index < 0:
+            index += len(self)
+        for record in islice(iter_seed(self.path), index, index + 1):
+            return record
+        raise IndexError(index)
+
+    def __iter__(self):
+        return iter_seed(self.path)
@@ -0,0 +1,345 @@
+"""
+Récupération concurrente des cartes de plusieurs sets auprès de l'API Pokémon TCG
+
+La première page de chaque set donne son totalCount; les pages suivantes sont alors
+demandées en parallèle, avec un parallélisme borné. Toutes les requêtes passent par un
+seau à jetons partagé (débit moyen et rafale). Un 429 vide le seau pour tous les threads
+pendant Retry-After; 429, 5xx et erreurs réseau sont retentés avec un backoff exponentiel.
+Avec un ResponseCache (pokemon/response_cache.py), les réponses encore valides sont servies
+depuis le disque sans prendre de jeton.
+"""
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Tuple
+
+import requests
+from dacite import from_dict
+from pokemontcgsdk import Card
+from requests.adapters import HTTPAdapter
+
+from pokemon.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.pokemontcg.io/v2"
+# Taille de page maximale de l'API
+PAGE_SIZE = 250
+DEFAULT_PARALLELISM = 8
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 10
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+DEFAULT_TIMEOUT = 30
+MAX_BACKOFF = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Seau à jetons partagé entre threads: rate jetons par seconde, au plus capacity d'avance"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """
+        Returns:
+            float: 0 si un jeton a été pris, sinon le délai en secondes avant le prochain jeton
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Attend un jeton; renvoie le temps passé à attendre"""
+        waited = 0.0
+        while True:
+            delay = self.try_acquire()
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """Le serveur demande de ralentir: plus aucun jeton pendant seconds, et le seau repart vide"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+@dataclass
+class FetchStats:
+    started_at: float = field(default_factory=time.perf_counter)
+    api_calls: int = 0
+    retries: int = 0
+    throttled: int = 0
+    cache_hits: int = 0
+    stale: int = 0
+    waited: float = 0.0
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.started_at, 1e-9)
+        return {
+            "api_calls": self.api_calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "cache_hits": self.cache_hits,
+            "stale": self.stale,
+            "waited": round(self.waited, 2),
+            "elapsed": round(elapsed, 2),
+            "calls_per_sec": round(self.api_calls / elapsed, 1),
+        }
+
+
+def _retry_after_seconds(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class TcgApiClient:
+    def __init__(self, api_key=None, base_url=API_URL, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT,
+                 pool_size=DEFAULT_PARALLELISM, cache: ResponseCache = None):
+        """
+        Args:
+            api_key: Clé X-Api-Key (par défaut POKEMON_TCG_API_KEY)
+            rate: Requêtes par seconde en moyenne
+            burst: Requêtes pouvant partir d'un coup après une pause
+            retries: Nouvelles tentatives après la première (429, 5xx, erreurs réseau)
+            backoff: Délai de base en secondes, doublé à chaque tentative (avec gigue) quand Retry-After est absent
+            pool_size: Connexions keep-alive gardées ouvertes (au moins le parallélisme du fetcher)
+            cache: Cache disque des réponses (None: toujours appeler l'API)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.bucket = TokenBucket(rate, burst)
+        self.stats = FetchStats()
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        api_key = api_key or os.getenv('POKEMON_TCG_API_KEY')
+        if api_key:
+            self.session.headers['X-Api-Key'] = api_key
+
+    def _count(self, stats=None, **increments):
+        """Compteurs du client, et aussi ceux de stats (par exemple ceux d'un set) s'il est donné"""
+        with self._stats_lock:
+            for target in (self.stats, stats):
+                if target is None:
+                    continue
+                for name, value in increments.items():
+                    setattr(target, name, getattr(target, name) + value)
+
+    def _delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, MAX_BACKOFF)
+        delay = self.backoff * 2 ** attempt
+        return min(delay * (0.5 + random.random() / 2), MAX_BACKOFF)
+
+    def get(self, path, params=None, stats: FetchStats = None) -> Dict:
+        """
+        GET sur l'API, depuis le cache si la réponse y est encore valide, sinon limité par le seau à jetons
+        Args:
+            stats: Compteurs supplémentaires à mettre à jour (appels réseau, lectures du cache, 429...)
+        Raises:
+            requests.RequestException: Échec définitif après toutes les tentatives, sans copie en cache
+            OfflineCacheMiss: Requête absente du cache en mode hors ligne
+        """
+        if self.cache is not None:
+            cached = self.cache.get(path, params)
+            if cached is not None:
+                self._count(stats, cache_hits=1)
+                return cached
+
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(self.retries + 1):
+            self._count(stats, waited=self.bucket.acquire(), api_calls=1)
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retries:
+                    return self._stale_or_raise(path, params, e, stats)
+                delay = self._delay(attempt)
+                reason = e.__class__.__name__
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    body = response.json()
+                    if self.cache is not None:
+                        self.cache.put(path, params, body)
+                    return body
+                if attempt >= self.retries:
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError as e:
+                        return self._stale_or_raise(path, params, e, stats)
+                delay = self._delay(attempt, _retry_after_seconds(response.headers.get('Retry-After')))
+                reason = f"HTTP {response.status_code}"
+                if response.status_code == 429:
+                    self._count(stats, throttled=1)
+                    self.bucket.pause(delay)
+            self._count(stats, retries=1)
+            logger.warning(f"⚠️ {url} {params or ''}: {reason}, nouvel essai dans {delay:.1f}s")
+            time.sleep(delay)
+
+    def _stale_or_raise(self, path, params, error, stats=None):
+        """Après la dernière tentative: la copie expirée du cache si elle existe, sinon l'erreur"""
+        stale = self.cache.get_stale(path, params) if self.cache is not None else None
+        if stale is None:
+            raise error
+        self._count(stats, stale=1)
+        logger.warning(f"⚠️ API indisponible pour {path} {params or ''} ({error}), copie expirée du cache utilisée")
+        return stale
+
+    def get_page(self, resource, page, page_size=PAGE_SIZE, stats: FetchStats = None, **params) -> Dict:
+        return self.get(resource, {**params, 'page': page, 'pageSize': page_size}, stats)
+
+
+def to_sdk_card(data: Dict) -> Card:
+    """Carte JSON de l'API en objet pokemontcgsdk.Card (comme Card.where)"""
+    return from_dict(Card, Card.transform(data))
+
+
+class SetFetcher:
+    def __init__(self, client: TcgApiClient, parallelism=DEFAULT_PARALLELISM):
+        """
+        Args:
+            client: Client partagé (seau à jetons et connexions)
+            parallelism: Requêtes simultanées au plus
+        """
+        self.client = client
+        self.parallelism = parallelism
+        # Appels réseau, lectures du cache, cartes et durée de chaque set; erreur définitive par set
+        self.set_stats = []
+        self.errors = {}
+
+    def fetch_set_records(self) -> List[Dict]:
+        """Tous les sets du catalogue (JSON de l'API)"""
+        sets, page = [], 1
+        while True:
+            data = self.client.get_page('sets', page)['data']
+            sets.extend(data)
+            if len(data) < PAGE_SIZE:
+                return sets
+            page += 1
+
+    def fetch_set_ids(self) -> List[str]:
+        """Identifiants de tous les sets du catalogue"""
+        return [item['id'] for item in self.fetch_set_records()]
+
+    def iter_sets(self, set_ids: List[str]) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        Cartes (JSON de l'API) des sets demandés, set par set dès qu'un set est complet. Au plus parallelism
+        sets sont en cours à la fois: seules leurs pages sont en mémoire, quel que soit le nombre de sets
+        Returns:
+            Iterator: (set_id, cartes dans l'ordre des pages), dans l'ordre de fin de récupération;
+                les sets en échec sont dans self.errors
+        """
+        set_ids = list(dict.fromkeys(set_ids))
+        pages = {set_id: {} for set_id in set_ids}
+        # Un set démarre quand sa première page part, pas quand il est mis dans la file du pool
+        progress = {set_id: {'stats': FetchStats(), 'started_at': None} for set_id in set_ids}
+        remaining = {}
+        waiting = deque(set_ids)
+
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            def fetch_page(set_id, page):
+                if page == 1:
+                    progress[set_id]['started_at'] = time.perf_counter()
+                return self.client.get_page('cards', page, stats=progress[set_id]['stats'], q=f'set.id:{set_id}')
+
+            def submit(set_id, page):
+                future = executor.submit(fetch_page, set_id, page)
+                pending[future] = (set_id, page)
+
+            def start_next_set():
+                if waiting:
+                    submit(waiting.popleft(), 1)
+
+            for _ in range(self.parallelism):
+                start_next_set()
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    set_id, page = pending.pop(future)
+                    if set_id in self.errors:
+                        continue
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        self.errors[set_id] = str(e)
+                        pages.pop(set_id, None)
+                        logger.error(f"❌ Échec de la récupération du set {set_id} (page {page}): {e}")
+                        start_next_set()
+                        continue
+                    pages[set_id][page] = response['data']
+                    if page == 1:
+                        total_pages = max(1, math.ceil(response.get('totalCount', len(response['data'])) / PAGE_SIZE))
+                        remaining[set_id] = total_pages - 1
+                        for next_page in range(2, total_pages + 1):
+                            submit(set_id, next_page)
+                    else:
+                        remaining[set_id] -= 1
+                    if remaining[set_id] > 0:
+                        continue
+
+                    start_next_set()
+                    set_pages = pages.pop(set_id)
+                    cards = [card for page_number in sorted(set_pages) for card in set_pages[page_number]]
+                    self.set_stats.append({
+                        'set_id': set_id,
+                        'cards': len(cards),
+                        'api_calls': progress[set_id]['stats'].api_calls,
+                        'cache_hits': progress[set_id]['stats'].cache_hits,
+                        'elapsed': round(time.perf_counter() - progress[set_id]['started_at'], 3),
+                    })
+                    yield set_id, cards
+
+    def fetch_sets(self, set_ids: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Toutes les cartes (JSON de l'API) des sets demandés
+        Returns:
+            Dict: Cartes de chaque set récupéré entièrement, dans l'ordre des sets demandés; les sets en échec sont dans self.errors
+        """
+        first_stats = len(self.set_stats)
+        fetched = dict(self.iter_sets(set_ids))
+        order = {set_id: position for position, set_id in enumerate(dict.fromkeys(set_ids))}
+        self.set_stats[first_stats:] = sorted(self.set_stats[first_stats:], key=lambda stats: order[stats['set_id']])
+        return {set_id: fetched[set_id] for set_id in order if set_id in fetched}
+
+    def iter_cards(self, set_ids: List[str]) -> Iterator[Tuple[str, List[Card]]]:
+        """Comme iter_sets, avec des objets pokemontcgsdk.Card"""
+        for set_id, cards in self.iter_sets(set_ids):
+            yield set_id, [to_sdk_card(card) for card in cards]
+
+    def fetch_cards(self, set_ids: List[str]) -> Dict[str, List[Card]]:
+        """Comme fetch_sets, avec des objets pokemontcgsdk.Card"""
+        return {set_id: [to_sdk_card(card) for card in cards] for set_id, cards in self.fetch_sets(set_ids).items()}
@@ -0,0 +1,276 @@
+import gzip
+import math
+import os
+import tempfile
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, TestCase
+
+from api.models import Card
+
+from pokemon.card_manager import PokemonCardManager
+from pokemon.management.commands.seed import Command as SeedCommand
+from pokemon.fake_tcg_api import FakeTcgApiServer, synthetic_catalog
+from pokemon.response_cache import OfflineCacheMiss, ResponseCache
+from pokemon.seed_io import SeedRecords, iter_seed, write_seed
+from pokemon.tcg_fetcher import PAGE_SIZE, SetFetcher, TcgApiClient, TokenBucket
+
+
+def stand_in_client(server, **options):
+    options = {'rate': 1000, 'burst': 100, 'backoff': 0.01, **options}
+    return TcgApiClient(api_key='stand-in', base_url=server.base_url, **options)
+
+
+class SetFetcherTests(SimpleTestCase):
+    def setUp(self):
+        # 3 sets de plusieurs pages (entre 90 et 750 cartes selon le tirage)
+        self.cards = synthetic_catalog(set_count=3, cards_per_set=300)
+
+    def serve(self, **options):
+        server = FakeTcgApiServer(self.cards, **options).start()
+        self.addCleanup(server.close)
+        return server
+
+    def test_fetches_every_card_of_each_set_with_concurrent_pages(self):
+        server = self.serve(latency=0.05)
+        fetcher = SetFetcher(stand_in_client(server), parallelism=8)
+
+        cards_by_set = fetcher.fetch_sets(list(server.by_set))
+
+        self.assertEqual({set_id: len(cards) for set_id, cards in cards_by_set.items()},
+                         {set_id: len(cards) for set_id, cards in server.by_set.items()})
+        for set_id, cards in cards_by_set.items():
+            self.assertEqual([card['id'] for card in cards], [card['id'] for card in server.by_set[set_id]])
+        self.assertEqual({stats['set_id']: stats['api_calls'] for stats in fetcher.set_stats},
+                         {set_id: math.ceil(len(cards) / PAGE_SIZE) for set_id, cards in server.by_set.items()})
+        self.assertGreater(server.max_active, 1)
+        self.assertEqual(fetcher.errors, {})
+
+    def test_429_pauses_the_bucket_then_retries(self):
+        server = self.serve(rate_limit=5, burst=1)
+        client = stand_in_client(server, retries=20)
+        fetcher = SetFetcher(client, parallelism=4)
+
+        with mock.patch.object(client.bucket, 'pause', wraps=client.bucket.pause) as pause, \
+                self.assertLogs('pokemon.tcg_fetcher', 'WARNING'):
+            cards_by_set = fetcher.fetch_sets(list(server.by_set))
+
+        self.assertGreater(server.throttled, 0)
+        self.assertEqual(client.stats.throttled, server.throttled)
+        self.assertEqual(pause.call_count, server.throttled)
+        # Le délai de pause est celui du Retry-After du serveur (moins d'une seconde à 5 req/s)
+        self.assertTrue(all(0 <= call.args[0] <= 1 for call in pause.call_args_list))
+        self.assertGreaterEqual(client.stats.retries, server.throttled)
+        self.assertEqual({set_id: len(cards) for set_id, cards in cards_by_set.items()},
+                         {set_id: len(cards) for set_id, cards in server.by_set.items()})
+
+    def test_failing_set_is_reported_without_dropping_the_others(self):
+        broken, *healthy = list(dict.fromkeys(card['set']['id'] for card in self.cards))
+        server = self.serve(failing_sets=[broken])
+        fetcher = SetFetcher(stand_in_client(server, retries=1), parallelism=4)
+
+        with self.assertLogs('pokemon.tcg_fetcher', 'WARNING') as logs:
+            cards_by_set = fetcher.fetch_sets([broken, *healthy])
+
+        self.assertEqual(list(fetcher.errors), [broken])
+        self.assertIn('503', fetcher.errors[broken])
+        self.assertTrue(any(broken in line for line in logs.output if line.startswith('ERROR')))
+        self.assertEqual(sorted(cards_by_set), sorted(healthy))
+        self.assertEqual([stats['set_id'] for stats in fetcher.set_stats], healthy)
+
+    def test_set_stats_count_network_calls_and_cache_hits_separately(self):
+        server = self.serve()
+        cache = ResponseCache(tempfile.mkdtemp(), ttl=3600)
+        pages = {set_id: math.ceil(len(cards) / PAGE_SIZE) for set_id, cards in server.by_set.items()}
+
+        cold = SetFetcher(stand_in_client(server, cache=cache), parallelism=4)
+        cold.fetch_sets(list(server.by_set))
+        warm = SetFetcher(stand_in_client(server, cache=cache), parallelism=4)
+        warm.fetch_sets(list(server.by_set))
+
+        self.assertEqual({stats['set_id']: (stats['api_calls'], stats['cache_hits']) for stats in cold.set_stats},
+                         {set_id: (count, 0) for set_id, count in pages.items()})
+        self.assertEqual({stats['set_id']: (stats['api_calls'], stats['cache_hits']) for stats in warm.set_stats},
+                         {set_id: (0, count) for set_id, count in pages.items()})
+
+    def test_set_elapsed_excludes_time_queued_behind_other_sets(self):
+        # Sets d'une page, récupérés un par un: chacun dure une latence, même le dernier de la file
+        server = FakeTcgApiServer(synthetic_catalog(set_count=4, cards_per_set=50), latency=0.1).start()
+        self.addCleanup(server.close)
+        fetcher = SetFetcher(stand_in_client(server), parallelism=1)
+
+        fetcher.fetch_sets(list(server.by_set))
+
+        self.assertEqual(len(fetcher.set_stats), 4)
+        self.assertTrue(all(stats['elapsed'] < 0.2 for stats in fetcher.set_stats), fetcher.set_stats)
+
+    def test_iter_sets_keeps_at_most_parallelism_sets_in_flight(self):
+        # 6 sets d'une page: sans borne, toutes les requêtes partiraient avant la lecture du premier set
+        server = FakeTcgApiServer(synthetic_catalog(set_count=6, cards_per_set=50)).start()
+        self.addCleanup(server.close)
+        fetcher = SetFetcher(stand_in_client(server), parallelism=2)
+
+        sets = fetcher.iter_sets(list(server.by_set))
+        first_set, _ = next(sets)
+        time.sleep(0.2)
+
+        self.assertLessEqual(server.requests, 3)
+        self.assertEqual(len([first_set, *dict(sets)]), 6)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    params = {'q': 'set.id:fake000', 'page': 1, 'pageSize': PAGE_SIZE}
+
+    def setUp(self):
+        self.server = FakeTcgApiServer(synthetic_catalog(set_count=1, cards_per_set=50)).start()
+        self.addCleanup(self.server.close)
+        self.directory = tempfile.mkdtemp()
+
+    def cached_client(self, **options):
+        return stand_in_client(self.server, cache=ResponseCache(self.directory, **options), retries=1)
+
+    def test_offline_cold_cache_raises_without_calling_the_api(self):
+        client = self.cached_client(offline=True)
+
+        with self.assertRaises(OfflineCacheMiss):
+            client.get('cards', self.params)
+
+        self.assertEqual(self.server.requests, 0)
+        self.assertEqual(client.cache.stats['miss'], 1)
+
+    def test_fresh_entry_is_served_without_calling_the_api(self):
+        body = self.cached_client(ttl=3600).get('cards', self.params)
+        client = self.cached_client(ttl=3600)
+
+        # Ordre des paramètres différent: même entrée
+        self.assertEqual(client.get('cards', dict(reversed(self.params.items()))), body)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual((client.stats.api_calls, client.stats.cache_hits), (0, 1))
+
+    def test_expired_entry_is_fetched_again(self):
+        self.cached_client(ttl=3600).get('cards', self.params)
+        client = self.cached_client(ttl=3600)
+
+        with mock.patch('pokemon.response_cache.time.time', return_value=time.time() + 7200):
+            client.get('cards', self.params)
+
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual((client.stats.api_calls, client.stats.cache_hits), (1, 0))
+
+    def test_stale_entry_is_served_when_the_api_fails(self):
+        body = self.cached_client(ttl=0).get('cards', self.params)
+        self.server.failing_sets.add('fake000')
+        client = self.cached_client(ttl=0)
+
+        with self.assertLogs('pokemon.tcg_fetcher', 'WARNING') as logs:
+            self.assertEqual(client.get('cards', self.params), body)
+
+        self.assertIn('copie expirée du cache utilisée', logs.output[-1])
+        self.assertEqual(client.cache.stats['stale'], 1)
+        self.assertEqual(client.stats.api_calls, 2)
+
+    def test_api_failure_without_cached_copy_raises(self):
+        self.server.failing_sets.add('fake000')
+
+        with self.assertLogs('pokemon.tcg_fetcher', 'WARNING'), self.assertRaises(requests.HTTPError):
+            self.cached_client(ttl=0).get('cards', self.params)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_pause_empties_the_bucket_until_retry_after(self):
+        bucket = TokenBucket(rate=100, capacity=10)
+        bucket.pause(0.2)
+
+        self.assertAlmostEqual(bucket.try_acquire(), 0.2, delta=0.05)
+        time.sleep(0.25)
+        self.assertEqual(bucket.try_acquire(), 0.0)
+
+
+class PokemonCardManagerTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeTcgApiServer(synthetic_catalog(set_count=3, cards_per_set=300)).start()
+        self.addCleanup(self.server.close)
+        self.manager = PokemonCardManager(client=stand_in_client(self.server))
+        self.set_id = 'fake000'
+        self.set_size = len(self.server.by_set[self.set_id])
+
+    def test_get_set_cards_needs_one_call_per_page(self):
+        with mock.patch('pokemontcgsdk.Card.find') as find:
+            records = self.manager.get_set_cards(self.set_id)
+
+        self.assertEqual(len(records), self.set_size)
+        self.assertEqual(self.server.requests, math.ceil(self.set_size / PAGE_SIZE))
+        self.assertEqual(self.manager.api_calls, self.server.requests)
+        find.assert_not_called()
+
+    def test_card_to_record_matches_extract_card_info(self):
+        records = self.manager.get_set_cards(self.set_id)
+
+        for record in records[:5] + records[-5:]:
+            self.assertEqual(record, self.manager.extract_card_info(record['id']))
+
+
+class SeedCommandImportTests(TestCase):
+    def test_reseeding_skips_unchanged_cards(self):
+        server = FakeTcgApiServer(synthetic_catalog(set_count=1, cards_per_set=20)).start()
+        self.addCleanup(server.close)
+        records = PokemonCardManager(client=stand_in_client(server)).get_set_cards('fake000')
+        command = SeedCommand()
+
+        first = command._seed_database(records)
+        updated_at = dict(Card.objects.values_list('id', 'updated_at'))
+        second = command._seed_database(records)
+        untouched = dict(Card.objects.values_list('id', 'updated_at'))
+        forced = command._seed_database(records, force=True)
+
+        self.assertEqual((first['created'], first['unchanged']), (len(records), 0))
+        self.assertEqual((second['created'], second['updated'], second['unchanged']), (0, 0, len(records)))
+        self.assertEqual(untouched, updated_at)
+        self.assertEqual(forced['updated'], len(records))
+        self.assertFalse(Card.objects.filter(source_fingerprint='').exists())
+
+
+class SeedIoTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.records = [{'id': f'base1-{number}', 'name': f'Carte {number} é', 'number': str(number)}
+                        for number in range(1, 8)]
+
+    def test_round_trip(self):
+        for name in ('cards.ndjson.gz', 'cards.json'):
+            with self.subTest(name=name):
+                path = os.path.join(self.directory, name)
+                # Un générateur, comme les importeurs
+                self.assertEqual(write_seed(path, (record for record in self.records)), len(self.records))
+                self.assertEqual(list(iter_seed(path)), self.records)
+
+    def test_ndjson_is_gzip_with_one_record_per_line(self):
+        path = os.path.join(self.directory, 'cards.ndjson.gz')
+        write_seed(path, self.records)
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            self.assertEqual(len(f.read().splitlines()), len(self.records))
+
+    def test_invalid_line_reports_its_number(self):
+        path = os.path.join(self.directory, 'cards.ndjson.gz')
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write('{"id": "base1-1"}\n\n{"id": \n')
+
+        with self.assertRaisesRegex(ValueError, 'ligne 3'):
+            list(iter_seed(path))
+
+    def test_seed_records_slices_without_loading(self):
+        path = os.path.join(self.directory, 'cards.ndjson.gz')
+        write_seed(path, self.records)
+        records = SeedRecords(path)
+
+        self.assertEqual(len(records), 7)
+        self.assertEqual(records[2:5], self.records[2:5])
+        self.assertEqual(records[5:], self.records[5:])
+        self.assertEqual(records[0], self.records[0])
+        self.assertEqual(records[-1], self.records[-1])
+        self.assertEqual(records[::2], self.records[::2])
+        with self.assertRaises(IndexError):
+            records[7]
@@ -1,6 +1,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .card_manager import PokemonCardManager
+from .seed_io import SeedRecords, find_seed
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
@@ -20,11 +21,8 @@ class PokemonCardView(APIView):
         try:
             manager = PokemonCardManager()
             if not manager.cards_data:
-                import json
-                import os
-                seed_path = os.path.join(os.path.dirname(__file__), '..', 'seeds', 'pokemon_cards_seed.json')
-                with open(seed_path, 'r') as f:
-                    manager.cards_data = json.load(f)
+                # Lu en flux: seule la page demandée est gardée en mémoire
+                manager.cards_data = SeedRecords(find_seed('pokemon_cards_seed'))
             
             paginator = self.pagination_class()
             paginated_cards = paginator.paginate_queryset(manager.cards_data, request)
@@ -5,35 +5,77 @@ import numpy as np
 from PIL import Image
 import requests
 from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import json
 import base64
+import argparse
+import queue
+import threading
+import time
+import heapq
+import uuid
+import datetime
 
 from transformers import CLIPProcessor, CLIPModel
 import torch
-import cv2
-import imagehash
 from tqdm import tqdm
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 django.setup()
 
-from api.models import Card
+from api.models import Card, CardFeatures
+from api.image_cache import ImageCache
+from api.async_downloader import BackgroundDownloader, DEFAULT_MAX_CONCURRENCY, DEFAULT_PER_HOST_LIMIT
+from api.cv_features import CVFeaturePool, CVFeatureThreads, HIST_SIZE
+from api.yolo11.embedding_artifact import write_artifact
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q, F, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 BATCH_SIZE = 16
 MAX_WORKERS = 4
 PREFETCH_BUFFER = 50
 
+# Concurrence de chaque étape du pipeline (CLIP et écriture en base restent sur un seul thread)
+DOWNLOAD_WORKERS = 8
+DECODE_WORKERS = 2
+CV_WORKERS = MAX_WORKERS
+BATCH_MAX_WAIT = 1.0
+
+# Reprise après interruption et nouvelles tentatives des téléchargements en échec
+JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'precompute_journal.jsonl')
+MAX_DOWNLOAD_ATTEMPTS = 4
+RETRY_BASE_DELAY = 2.0
+
+# Artefact d'embeddings (float16 + métadonnées) réécrit après chaque run, chargeable par l'identification sans la base
+ARTIFACT_PATH = settings.CARD_EMBEDDINGS_ARTIFACT or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'card_embeddings'
+)
+
+# À incrémenter dès que le modèle ou le calcul des features change: toutes les cartes seront recalculées
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+FEATURE_VERSION = f"{CLIP_MODEL_NAME}:v1"
+
+HEAVY_FEATURE_FIELDS = ('features__clip_embedding', 'features__descriptors', 'features__histogram')
+SAVED_FIELDS = ['clip_embedding', 'phash', 'histogram', 'descriptors', 'image_hash', 'version', 'image_url', 'updated_at']
+WRITE_BATCH_SIZE = 100
+
+# Image source des features: la vignette (images.small) suffit pour CLIP à 224px, voir api/benchmark_artwork_resolution.py
+RESOLUTIONS = ('small', 'large')
+DEFAULT_RESOLUTION = 'large'
+
 class OptimizedFeatureExtractor:
     def __init__(self):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"Utilisation de: {self.device}")
 
-        self.clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(self.device)
-        self.clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+        self.clip_model = CLIPModel.from_pretrained(CLIP_MODEL_NAME).to(self.device)
+        self.clip_processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
 
         self.session = requests.Session()
         retry_strategy = Retry(
@@ -45,7 +87,17 @@ class OptimizedFeatureExtractor:
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
 
-        self.orb = cv2.ORB_create(nfeatures=100)
+        self.image_cache = ImageCache(session=self.session)
+        self.revalidate_images = False
+        self.resolution = DEFAULT_RESOLUTION
+        # BackgroundDownloader (httpx) si configuré, sinon la session requests
+        self.async_downloader = None
+
+        # ORB par thread par défaut, remplacé par un CVFeaturePool avec --cv-processes
+        self.cv_backend = CVFeatureThreads()
+        self.unchanged_count = 0
+        self.rows_written = 0
+        self.write_time = 0.0
 
     def serialize_numpy_array(self, arr):
         return base64.b64encode(arr.tobytes()).decode('utf-8')
@@ -54,35 +106,46 @@ class OptimizedFeatureExtractor:
         return json.dumps(lst)
 
     def download_image(self, url, timeout=10):
+        image, _ = self.download_image_with_hash(url, timeout)
+        return image
+
+    def download_image_with_hash(self, url, timeout=10):
+        """Retourne l'image et le SHA-256 de son contenu brut"""
         try:
-            response = self.session.get(url, timeout=timeout, stream=True)
-            response.raise_for_status()
-            return Image.open(BytesIO(response.content)).convert("RGB")
+            content, image_hash = self.fetch_image_bytes(url, timeout)
+            return self.decode_image(content), image_hash
         except Exception as e:
             print(f"Erreur téléchargement {url}: {e}")
-            return None
+            return None, None
+
+    def fetch_image_bytes(self, url, timeout=10):
+        """Contenu de l'image via le cache disque, et son SHA-256"""
+        if self.async_downloader is not None:
+            cached = self.async_downloader.run(
+                self.image_cache.fetch_async(url, self.async_downloader.downloader, revalidate=self.revalidate_images)
+            )
+        else:
+            cached = self.image_cache.fetch(url, timeout=timeout, revalidate=self.revalidate_images)
+        return cached.read_bytes(), cached.sha256
+
+    def source_url(self, card):
+        """URL de l'image utilisée pour les features, selon la résolution (la grande image à défaut de vignette)"""
+        if self.resolution == 'small' and card.image_url_small:
+            return card.image_url_small
+        return card.image_url
+
+    def source_url_expression(self):
+        """Équivalent SQL de source_url, pour comparer avec l'URL suivie dans CardFeatures"""
+        if self.resolution == 'small':
+            return Coalesce(NullIf(F('image_url_small'), Value('')), F('image_url'))
+        return F('image_url')
+
+    def decode_image(self, content):
+        return Image.open(BytesIO(content)).convert("RGB")
 
     def extract_features_single(self, image):
         try:
-            image_np = np.array(image)
-            cv_image = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
-
-            phash = str(imagehash.phash(image))
-
-            hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
-            hist = cv2.calcHist([hsv], [0, 1], None, [180, 256], [0, 180, 0, 256])
-            cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
-            hist_flat = hist.flatten().tolist()
-
-            _, descriptors = self.orb.detectAndCompute(cv_image, None)
-            if descriptors is None:
-                descriptors = np.zeros((1, 32), dtype=np.uint8)
-
-            return {
-                'phash': phash,
-                'histogram': hist_flat,
-                'descriptors': descriptors.tobytes()
-            }
+            return self.cv_backend.extract(image)
         except Exception as e:
             print(f"Erreur extraction features: {e}")
             return None
@@ -114,157 +177,672 @@ class OptimizedFeatureExtractor:
             print(f"Erreur batch CLIP: {e}")
             return [None] * len(images)
 
-    def process_cards_parallel(self, cards):
-        results = []
-
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            print("Téléchargement des images...")
-            download_futures = {
-                executor.submit(self.download_image, card.image_url): card
-                for card in cards
-            }
+    def is_content_unchanged(self, card, image_hash):
+        """Même image source et features déjà calculées avec la version courante"""
+        features = card_features(card)
+        return (
+            image_hash is not None
+            and features.image_hash == image_hash
+            and features.version == FEATURE_VERSION
+        )
 
-            images_data = []
-            for future in tqdm(as_completed(download_futures), total=len(cards)):
-                card = download_futures[future]
-                try:
-                    image = future.result()
-                    images_data.append((card, image))
-                except Exception as e:
-                    print(f"Erreur pour {card}: {e}")
-                    images_data.append((card, None))
-
-        print("Extraction des features CV...")
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            cv_futures = {
-                executor.submit(self.extract_features_single, image): (card, image)
-                for card, image in images_data
-            }
-
-            for future in tqdm(as_completed(cv_futures), total=len(images_data)):
-                card, image = cv_futures[future]
+    def prepare_card(self, card, clip_embedding, features):
+        """
+        Valide les features avec NumPy et les place sur le CardFeatures de la carte
+        Returns:
+            bool: False si une des features est invalide (la carte n'est pas écrite)
+        """
+        if clip_embedding is None or features is None:
+            print(f"Données manquantes pour {card}")
+            return False
+
+        clip_array = as_finite_vector(clip_embedding)
+        if clip_array is None:
+            print(f"Erreur: embedding CLIP invalide pour {card}")
+            return False
+
+        histogram = features.get('histogram')
+        if not isinstance(histogram, bytes) or len(histogram) != HIST_SIZE:
+            print(f"Erreur: histogramme invalide pour {card}")
+            return False
+
+        phash = features.get('phash')
+        if not isinstance(phash, str):
+            print(f"Erreur: phash invalide pour {card}")
+            return False
+
+        descriptors = features.get('descriptors')
+        if not isinstance(descriptors, bytes):
+            print(f"Erreur: descripteurs invalides pour {card}")
+            return False
+
+        card_feature_row = card_features(card)
+        card_feature_row.clip_embedding = clip_array.tolist()
+        card_feature_row.phash = phash
+        card_feature_row.histogram = histogram
+        card_feature_row.descriptors = descriptors
+        card_feature_row.version = FEATURE_VERSION
+        card_feature_row.image_url = self.source_url(card)
+        card_feature_row.updated_at = timezone.now()
+        return True
+
+    def save_cards_safely(self, cards_data, show_progress=True):
+        cards = [
+            card for card, clip_embedding, features in cards_data
+            if self.prepare_card(card, clip_embedding, features)
+        ]
+
+        saved_cards = []
+        chunks = range(0, len(cards), WRITE_BATCH_SIZE)
+        for i in tqdm(chunks, desc="Sauvegarde", disable=not show_progress):
+            saved_cards.extend(self.write_cards(cards[i:i + WRITE_BATCH_SIZE]))
+        return saved_cards
+
+    def write_cards(self, cards):
+        """
+        Écrit les features d'un lot de cartes dans une transaction: un bulk_update pour les lignes
+        CardFeatures existantes, un bulk_create pour les nouvelles
+        Si le lot échoue, seules ses cartes sont réécrites une par une pour isoler les lignes fautives
+        Returns:
+            list: Cartes effectivement écrites
+        """
+        start = time.perf_counter()
+        existing = [card.features for card in cards if not card.features._state.adding]
+        created = [card.features for card in cards if card.features._state.adding]
+        try:
+            with transaction.atomic():
+                if existing:
+                    CardFeatures.objects.bulk_update(existing, SAVED_FIELDS)
+                if created:
+                    CardFeatures.objects.bulk_create(created)
+            for features in created:
+                features._state.adding = False
+            saved_cards = list(cards)
+        except Exception as e:
+            print(f"Erreur écriture groupée de {len(cards)} cartes: {e}, écriture ligne par ligne")
+            saved_cards = []
+            for card in cards:
                 try:
-                    features = future.result()
-                    results.append((card, image, features))
-                except Exception as e:
-                    print(f"Erreur features pour {card}: {e}")
-                    results.append((card, image, None))
-
-        return results
-
-    def save_cards_safely(self, cards_data):
-        saved_count = 0
-
-        for card, clip_embedding, features in tqdm(cards_data, desc="Sauvegarde"):
-            try:
-                if clip_embedding is not None and features is not None:
-
-                    if isinstance(clip_embedding, np.ndarray):
-                        clip_embedding_list = clip_embedding.tolist()
-                    else:
-                        clip_embedding_list = clip_embedding
-
-                    if not isinstance(clip_embedding_list, list) or not all(isinstance(x, (int, float)) for x in clip_embedding_list):
-                        print(f"Erreur: embedding CLIP invalide pour {card}")
-                        continue
-
-                    histogram = features['histogram']
-                    if not isinstance(histogram, list) or not all(isinstance(x, (int, float)) for x in histogram):
-                        print(f"Erreur: histogramme invalide pour {card}")
-                        continue
-
-                    phash = features['phash']
-                    if not isinstance(phash, str):
-                        print(f"Erreur: phash invalide pour {card}")
-                        continue
-
-                    descriptors = features['descriptors']
-                    if not isinstance(descriptors, bytes):
-                        print(f"Erreur: descripteurs invalides pour {card}")
-                        continue
-
-                    card.clip_embedding = clip_embedding_list
-                    card.phash = phash
-                    card.histogram = histogram
-                    card.descriptors = descriptors
-
-                    try:
-                        card.save(update_fields=['clip_embedding', 'phash', 'histogram', 'descriptors'])
-                        saved_count += 1
-                    except Exception as save_error:
-                        print(f"Erreur lors de la sauvegarde de {card}: {save_error}")
-                        try:
-                            card.clip_embedding = clip_embedding_list
-                            card.save(update_fields=['clip_embedding'])
-                            print(f"  - clip_embedding OK pour {card}")
-                        except Exception as e:
-                            print(f"  - Erreur clip_embedding: {e}")
-
-                        try:
-                            card.phash = phash
-                            card.save(update_fields=['phash'])
-                            print(f"  - phash OK pour {card}")
-                        except Exception as e:
-                            print(f"  - Erreur phash: {e}")
-
-                        try:
-                            card.histogram = histogram
-                            card.save(update_fields=['histogram'])
-                            print(f"  - histogram OK pour {card}")
-                        except Exception as e:
-                            print(f"  - Erreur histogram: {e}")
-
-                        try:
-                            card.descriptors = descriptors
-                            card.save(update_fields=['descriptors'])
-                            print(f"  - descriptors OK pour {card}")
-                        except Exception as e:
-                            print(f"  - Erreur descriptors: {e}")
-                else:
-                    print(f"Données manquantes pour {card}")
-
-            except Exception as e:
-                print(f"Erreur générale pour {card}: {e}")
-                continue
-
-        return saved_count
+                    with transaction.atomic():
+                        card.features.save()
+                    saved_cards.append(card)
+                except Exception as save_error:
+                    print(f"Erreur lors de la sauvegarde de {card}: {save_error}")
+
+        self.write_time += time.perf_counter() - start
+        self.rows_written += len(saved_cards)
+        return saved_cards
+
+    def mark_unchanged(self, card):
+        """Le contenu n'a pas changé: seule l'URL suivie est mise à jour"""
+        self.unchanged_count += 1
+        features = card_features(card)
+        source_url = self.source_url(card)
+        if features.image_url != source_url:
+            features.image_url = source_url
+            features.save(update_fields=['image_url'])
+
+    def select_cards(self, incremental=True, check_content=False, since=None):
+        """
+        Sélectionne les cartes à traiter
+        Args:
+            incremental: Ne garder que les cartes sans features, calculées avec une autre
+                version, ou dont l'URL source (selon la résolution) a changé depuis le dernier calcul
+            check_content: Garder aussi toutes les cartes déjà calculées pour comparer
+                le hash du contenu de leur image
+            since: Ne garder que les cartes modifiées (updated_at) depuis cette date
+        Returns:
+            QuerySet: Cartes à traiter, avec leurs CardFeatures (colonnes lourdes différées)
+        """
+        queryset = Card.objects.select_related('features').defer(*HEAVY_FEATURE_FIELDS).order_by('id')
+        if since is not None:
+            queryset = queryset.filter(updated_at__gte=since)
+        if not incremental or check_content:
+            return queryset
+        return queryset.filter(
+            Q(features__isnull=True)
+            | Q(features__clip_embedding__isnull=True)
+            | ~Q(features__version=FEATURE_VERSION)
+            | ~Q(features__image_url=self.source_url_expression())
+        )
 
-    def process_all_cards(self):
-        cards = list(Card.objects.all())
+    def process_all_cards(self, incremental=True, check_content=False, since=None, resume=False,
+                          journal_path=JOURNAL_PATH, **pipeline_options):
+        cards = list(self.select_cards(incremental, check_content, since))
+        mode = "complet" if not incremental else "incrémental"
+        print(f"Traitement de {len(cards)} cartes (mode {mode}, version {FEATURE_VERSION}, images {self.resolution})")
+        self.unchanged_count = 0
+        self.rows_written = 0
+        self.write_time = 0.0
+
+        journal = CheckpointJournal(journal_path)
+        previous = journal.load() if resume else None
+        resumed_count = 0
+        if previous is not None and not previous['finished']:
+            print(f"Reprise du run {previous['run_id']} après le lot {previous['last_chunk']} "
+                  f"({len(previous['done_ids'])} cartes déjà terminées)")
+            remaining = [card for card in cards if card.pk not in previous['done_ids']]
+            resumed_count = len(cards) - len(remaining)
+            cards = remaining
+        elif resume:
+            print("Aucun run interrompu à reprendre")
+            previous = None
         total_cards = len(cards)
-        print(f"Traitement de {total_cards} cartes")
-
-        chunk_size = PREFETCH_BUFFER
-        total_saved = 0
-
-        for i in range(0, total_cards, chunk_size):
-            chunk = cards[i:i + chunk_size]
-            print(f"\nChunk {i//chunk_size + 1}/{(total_cards + chunk_size - 1)//chunk_size}")
+        journal.start(resume=previous is not None, options={
+            'incremental': incremental,
+            'check_content': check_content,
+            'since': since.isoformat() if since else None,
+            'version': FEATURE_VERSION,
+            'resolution': self.resolution,
+        })
 
-            results = self.process_cards_parallel(chunk)
+        pipeline = FeaturePipeline(self, check_content=check_content, journal=journal, **pipeline_options)
+        total_saved = pipeline.run(cards)
+        pipeline.print_report()
 
-            print("Extraction embeddings CLIP...")
-            images = [image for _, image, _ in results]
+        failed_count = total_cards - total_saved - self.unchanged_count
+        journal.finish(done=total_saved, failed=failed_count, unchanged=self.unchanged_count)
 
-            clip_embeddings = []
-            for j in range(0, len(images), BATCH_SIZE):
-                batch_images = images[j:j + BATCH_SIZE]
-                batch_embeddings = self.extract_clip_embeddings_batch(batch_images)
-                clip_embeddings.extend(batch_embeddings)
-
-            cards_to_save = []
-            for (card, image, features), clip_embedding in zip(results, clip_embeddings):
-                if features is not None and clip_embedding is not None:
-                    cards_to_save.append((card, clip_embedding, features))
+        print(f"\nTraitement terminé! Total: {total_saved}/{total_cards} cartes sauvegardées")
+        print(f"Résumé: {total_saved} terminées, {resumed_count + self.unchanged_count} ignorées "
+              f"({resumed_count} déjà faites, {self.unchanged_count} contenu inchangé), {failed_count} en échec "
+              f"(dont {pipeline.failed_downloads} téléchargements après {MAX_DOWNLOAD_ATTEMPTS} tentatives)")
+        if self.write_time > 0:
+            print(f"Écriture en base: {self.rows_written} lignes en {self.write_time:.2f}s "
+                  f"({self.rows_written / self.write_time:.0f} lignes/s)")
+        if self.async_downloader is not None:
+            download_stats = self.async_downloader.downloader.stats.summary()
+            print(f"Téléchargements: {download_stats['files']} fichiers, {download_stats['bytes'] / 1e6:.1f} Mo, "
+                  f"{download_stats['files_per_sec']} fichiers/s, {download_stats['mb_per_sec']} Mo/s, "
+                  f"{download_stats['retries']} nouvelles tentatives, {download_stats['errors']} erreurs")
+        cache_stats = self.image_cache.summary()
+        print(f"Cache images: {cache_stats['hit']} hits, {cache_stats['revalidated']} revalidées, "
+              f"{cache_stats['miss']} téléchargées ({cache_stats['downloaded_bytes'] / 1e6:.1f} Mo), "
+              f"{cache_stats['evicted']} évincées, {cache_stats['total_bytes'] / 1e6:.1f} Mo sur disque")
+
+
+class CheckpointJournal:
+    """
+    Journal JSONL de progression d'un run: début, cartes terminées par lot écrit, échecs définitifs, fin
+    Un nouveau run remplace le journal, un run repris (--resume) y ajoute ses événements.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.run_id = None
+        self.chunk = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Returns:
+            dict: run_id, finished, last_chunk, done_ids, failed_ids du dernier run, ou None
+        """
+        if not os.path.exists(self.path):
+            return None
+        state = None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # dernière ligne tronquée par un arrêt brutal
+                kind = event.get('event')
+                if kind == 'start':
+                    if state is None or not event.get('resume'):
+                        state = {'run_id': event['run_id'], 'done_ids': set(), 'failed_ids': set(), 'last_chunk': 0}
+                    state['finished'] = False
+                elif state is None:
+                    continue
+                elif kind == 'done':
+                    state['done_ids'].update(event['ids'])
+                    state['failed_ids'].difference_update(event['ids'])
+                    state['last_chunk'] = event['chunk']
+                elif kind == 'failed':
+                    state['failed_ids'].add(event['id'])
+                elif kind == 'end':
+                    state['finished'] = True
+        return state
+
+    def start(self, resume=False, options=None):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        previous = self.load() if resume else None
+        if previous is not None:
+            self.run_id = previous['run_id']
+            self.chunk = previous['last_chunk']
+        else:
+            self.run_id = uuid.uuid4().hex
+            self.chunk = 0
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        self._write({'event': 'start', 'run_id': self.run_id, 'resume': resume, 'options': options or {}})
+
+    def record_done(self, card_ids):
+        with self._lock:
+            self.chunk += 1
+            chunk = self.chunk
+        self._write({'event': 'done', 'chunk': chunk, 'ids': list(card_ids)})
+
+    def record_failed(self, card_id, error, attempts):
+        self._write({'event': 'failed', 'id': card_id, 'error': error, 'attempts': attempts})
+
+    def finish(self, **summary):
+        self._write({'event': 'end', **summary})
+        self._file.close()
+        self._file = None
+
+    def _write(self, event):
+        event['at'] = time.time()
+        with self._lock:
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+
+
+def parse_since(value):
+    """Date (AAAA-MM-JJ) ou date-heure ISO 8601 pour --since"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise argparse.ArgumentTypeError(f"Date invalide: {value}")
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def card_features(card):
+    """CardFeatures de la carte, créé (non sauvegardé) si elle n'en a pas encore"""
+    try:
+        return card.features
+    except CardFeatures.DoesNotExist:
+        card.features = CardFeatures(card=card)
+        return card.features
+
+
+def as_finite_vector(values):
+    """Vecteur float32 à une dimension, non vide et sans NaN/inf, sinon None"""
+    try:
+        array = np.asarray(values, dtype=np.float32)
+    except (TypeError, ValueError):
+        return None
+    if array.ndim != 1 or array.size == 0 or not np.isfinite(array).all():
+        return None
+    return array
+
+
+def export_embedding_artifact(directory=ARTIFACT_PATH):
+    """
+    Écrit l'artefact d'embeddings (api/yolo11/embedding_artifact.py) des cartes calculées avec la version courante
+    Returns:
+        dict: Manifeste de l'artefact
+    """
+    rows = (
+        CardFeatures.objects.filter(version=FEATURE_VERSION, clip_embedding__isnull=False)
+        .select_related('card__set')
+        .only('card_id', 'clip_embedding', 'card__name', 'card__number', 'card__rarity',
+              'card__price', 'card__price_currency', 'card__set__title')
+        .order_by('card_id')
+    )
+    embeddings, cards = [], []
+    for features in rows.iterator(chunk_size=WRITE_BATCH_SIZE):
+        card = features.card
+        vector = as_finite_vector(features.clip_embedding)
+        if vector is None or (embeddings and vector.shape != embeddings[0].shape):
+            print(f"Embedding invalide ignoré pour {card}")
+            continue
+        embeddings.append(vector)
+        cards.append({
+            "id": card.id,
+            "name": card.name,
+            "number": card.number,
+            "rarity": card.rarity,
+            "price": str(card.price),
+            "set_name": card.set.title if card.set else None
+        })
+
+    matrix = np.stack(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+    manifest = write_artifact(directory, matrix, cards, FEATURE_VERSION, CLIP_MODEL_NAME)
+    print(f"Artefact d'embeddings: {manifest['count']} cartes x {manifest['dim']} ({manifest['dtype']}) "
+          f"dans {directory}")
+    return manifest
+
+
+_END = object()
+
+
+class StageStats:
+    """Compteurs d'une étape du pipeline"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, duration, processed, dropped=0, errors=0):
+        with self._lock:
+            self.busy_time += duration
+            self.processed += processed
+            self.dropped += dropped
+            self.errors += errors
+
+
+class QueueMonitor(threading.Thread):
+    """Échantillonne périodiquement l'occupation des files entre étapes"""
+
+    def __init__(self, queues, interval=0.2):
+        super().__init__(daemon=True)
+        self.queues = queues
+        self.interval = interval
+        self.samples = {name: [] for name in queues}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for name, q in self.queues.items():
+                self.samples[name].append(q.qsize())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class FeaturePipeline:
+    """
+    Pipeline producteur/consommateur: téléchargement -> décodage -> features CV -> CLIP -> base
+    Les étapes sont reliées par des files bornées: chaque étape avance dès que des cartes
+    sont disponibles, et une étape lente bloque les précédentes au lieu d'accumuler les images en mémoire.
+    """
+
+    def __init__(self, extractor, check_content=False, journal=None, download_workers=DOWNLOAD_WORKERS,
+                 decode_workers=DECODE_WORKERS, cv_workers=CV_WORKERS, queue_size=PREFETCH_BUFFER,
+                 batch_size=BATCH_SIZE):
+        self.extractor = extractor
+        self.check_content = check_content
+        self.journal = journal
+        self.workers = {
+            'download': download_workers,
+            'decode': decode_workers,
+            'cv': cv_workers,
+        }
+        self.batch_size = batch_size
+        self.queues = {
+            name: queue.Queue(maxsize=queue_size)
+            for name in ('cards', 'downloaded', 'decoded', 'features', 'embedded')
+        }
+        self.stats = []
+        self.threads = []
+        self.total_saved = 0
+        self.elapsed = 0.0
+        self.monitor = None
+        self.progress = None
+
+        # Cartes en attente d'un nouvel essai de téléchargement: (échéance, ordre, carte)
+        self.failed_downloads = 0
+        self._attempts = {}
+        self._retry_heap = []
+        self._retry_seq = 0
+        self._unresolved = 0
+        self._retry_lock = threading.Lock()
+
+    def run(self, cards):
+        q = self.queues
+        self.progress = tqdm(total=len(cards), desc="Cartes")
+        self.monitor = QueueMonitor(q)
+        start = time.perf_counter()
+        self.monitor.start()
+
+        self._start_stage('download', self._download, q['cards'], q['downloaded'], self.workers['download'])
+        self._start_stage('decode', self._decode, q['downloaded'], q['decoded'], self.workers['decode'])
+        self._start_stage('cv', self._extract_cv, q['decoded'], q['features'], self.workers['cv'])
+        self._start_stage('clip', self._embed_batch, q['features'], q['embedded'], batch_size=self.batch_size)
+        self._start_stage('save', self._save_batch, q['embedded'], None, batch_size=WRITE_BATCH_SIZE)
+
+        self._unresolved = len(cards)
+        for card in cards:
+            q['cards'].put(card)
+        self._feed_retries(q['cards'])
+        q['cards'].put(_END)
+
+        for thread in self.threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - start
+        self.monitor.stop()
+        self.progress.close()
+        return self.total_saved
+
+    def _start_stage(self, name, handler, in_queue, out_queue, workers=1, batch_size=1):
+        """
+        Lance les threads d'une étape
+        Args:
+            handler: Reçoit une liste d'éléments et renvoie ceux à transmettre à l'étape suivante
+            batch_size: Au-delà de 1, les éléments sont regroupés (lot partiel après BATCH_MAX_WAIT)
+        """
+        stats = StageStats(name, workers)
+        self.stats.append(stats)
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def worker():
+            finished = False
+            while not finished:
+                batch, finished = self._next_batch(in_queue, batch_size)
+                if not batch:
+                    continue
+                step_start = time.perf_counter()
+                try:
+                    outputs = handler(batch)
+                    errors = 0
+                except Exception as e:
+                    print(f"Erreur étape {name}: {e}")
+                    outputs, errors = [], len(batch)
+                duration = time.perf_counter() - step_start
+                stats.record(duration, len(batch) - errors, errors=errors,
+                             dropped=len(batch) - errors - len(outputs) if out_queue is not None else 0)
+                if out_queue is not None:
+                    for output in outputs:
+                        out_queue.put(output)
+                    self.progress.update(len(batch) - len(outputs))
+                else:
+                    self.progress.update(len(batch))
+
+            connections.close_all()
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and out_queue is not None:
+                out_queue.put(_END)
+
+        for i in range(workers):
+            thread = threading.Thread(target=worker, name=f"pipeline-{name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _next_batch(self, in_queue, batch_size):
+        """Renvoie (lot, fin du flux); le marqueur de fin est remis dans la file pour les autres workers"""
+        item = in_queue.get()
+        if item is _END:
+            in_queue.put(_END)
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + BATCH_MAX_WAIT
+        while len(batch) < batch_size:
+            try:
+                item = in_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _END:
+                in_queue.put(_END)
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _feed_retries(self, cards_queue):
+        """Remet les cartes en file à leur échéance, jusqu'à ce que chaque téléchargement ait abouti ou échoué définitivement"""
+        while True:
+            now = time.monotonic()
+            with self._retry_lock:
+                if self._unresolved == 0:
+                    return
+                due = []
+                while self._retry_heap and self._retry_heap[0][0] <= now:
+                    due.append(heapq.heappop(self._retry_heap)[2])
+            for card in due:
+                cards_queue.put(card)
+            time.sleep(0.05)
+
+    def _download(self, cards):
+        results = []
+        for card in cards:
+            try:
+                content, image_hash = self.extractor.fetch_image_bytes(self.extractor.source_url(card))
+                results.append((card, content, image_hash))
+                with self._retry_lock:
+                    self._unresolved -= 1
+            except Exception as e:
+                self._download_failed(card, e)
+        return results
 
-            print("Sauvegarde en base...")
-            saved_count = self.save_cards_safely(cards_to_save)
-            total_saved += saved_count
+    def _download_failed(self, card, error):
+        with self._retry_lock:
+            attempts = self._attempts.get(card.pk, 0) + 1
+            self._attempts[card.pk] = attempts
+            if attempts < MAX_DOWNLOAD_ATTEMPTS:
+                delay = RETRY_BASE_DELAY * 2 ** (attempts - 1)
+                self._retry_seq += 1
+                heapq.heappush(self._retry_heap, (time.monotonic() + delay, self._retry_seq, card))
+            else:
+                self._unresolved -= 1
+                self.failed_downloads += 1
+
+        if attempts < MAX_DOWNLOAD_ATTEMPTS:
+            print(f"Erreur téléchargement {self.extractor.source_url(card)} (tentative {attempts}/{MAX_DOWNLOAD_ATTEMPTS}): "
+                  f"{error}, nouvel essai dans {delay:.0f}s")
+            # La carte repassera dans le pipeline: elle compte comme un élément de plus
+            self.progress.total += 1
+            self.progress.refresh()
+        else:
+            print(f"Échec définitif du téléchargement {self.extractor.source_url(card)}: {error}")
+            if self.journal is not None:
+                self.journal.record_failed(card.pk, str(error), attempts)
+
+    def _decode(self, items):
+        results = []
+        for card, content, image_hash in items:
+            if self.check_content and self.extractor.is_content_unchanged(card, image_hash):
+                self.extractor.mark_unchanged(card)
+                continue
+            card_features(card).image_hash = image_hash
+            results.append((card, self.extractor.decode_image(content)))
+        return results
 
-            print(f"Chunk terminé: {saved_count}/{len(chunk)} cartes sauvegardées")
+    def _extract_cv(self, items):
+        results = []
+        for card, image in items:
+            features = self.extractor.extract_features_single(image)
+            if features is not None:
+                results.append((card, image, features))
+        return results
 
-        print(f"\nTraitement terminé! Total: {total_saved}/{total_cards} cartes sauvegardées")
+    def _embed_batch(self, items):
+        embeddings = self.extractor.extract_clip_embeddings_batch([image for _, image, _ in items])
+        return [
+            (card, clip_embedding, features)
+            for (card, _, features), clip_embedding in zip(items, embeddings)
+            if clip_embedding is not None
+        ]
+
+    def _save_batch(self, items):
+        saved_cards = self.extractor.save_cards_safely(items, show_progress=False)
+        self.total_saved += len(saved_cards)
+        if self.journal is not None and saved_cards:
+            self.journal.record_done([card.pk for card in saved_cards])
+        return []
+
+    def print_report(self):
+        elapsed = max(self.elapsed, 1e-9)
+        print(f"\nPipeline: {elapsed:.1f}s")
+        print(f"{'Étape':<10}{'workers':>8}{'traités':>9}{'écartés':>9}{'erreurs':>9}{'débit/s':>9}{'occupation':>12}")
+        for stats in self.stats:
+            busy = stats.busy_time / (elapsed * stats.workers)
+            print(f"{stats.name:<10}{stats.workers:>8}{stats.processed:>9}{stats.dropped:>9}{stats.errors:>9}"
+                  f"{stats.processed / elapsed:>9.1f}{busy:>11.0%}")
+
+        print(f"\n{'File':<12}{'capacité':>10}{'moyenne':>10}{'max':>6}")
+        for name, q in self.queues.items():
+            samples = self.monitor.samples[name] or [0]
+            print(f"{name:<12}{q.maxsize:>10}{sum(samples) / len(samples):>10.1f}{max(samples):>6}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Précalcule les features (CLIP, phash, histogramme, ORB) des cartes')
+    parser.add_argument('--full', action='store_true', help='Recalculer toutes les cartes')
+    parser.add_argument('--check-content', action='store_true',
+                        help='Retélécharger les images déjà traitées et ne recalculer que celles dont le contenu a changé')
+    parser.add_argument('--download-backend', choices=('httpx', 'requests'), default='httpx',
+                        help='httpx: téléchargements asyncio avec limites globale et par hôte; requests: threads bloquants')
+    parser.add_argument('--max-connections', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help='Téléchargements simultanés au total (httpx)')
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST_LIMIT,
+                        help='Téléchargements simultanés par hôte (httpx)')
+    parser.add_argument('--download-workers', type=int, default=DOWNLOAD_WORKERS,
+                        help='Threads de téléchargement (requests)')
+    parser.add_argument('--decode-workers', type=int, default=DECODE_WORKERS)
+    parser.add_argument('--cv-workers', type=int, default=CV_WORKERS)
+    parser.add_argument('--cv-processes', type=int, default=0,
+                        help='Calculer les features CV dans N processus (0: threads du processus principal)')
+    parser.add_argument('--queue-size', type=int, default=PREFETCH_BUFFER, help='Capacité de chaque file entre étapes')
+    parser.add_argument('--resume', action='store_true',
+                        help='Reprendre le dernier run interrompu en sautant les cartes déjà terminées')
+    parser.add_argument('--since', type=parse_since, default=None,
+                        help='Ne traiter que les cartes modifiées depuis cette date (AAAA-MM-JJ ou ISO 8601)')
+    parser.add_argument('--journal', type=str, default=JOURNAL_PATH, help='Fichier journal de progression')
+    parser.add_argument('--revalidate-images', action='store_true',
+                        help='Revalider (ETag/Last-Modified) toutes les images en cache, même récentes')
+    parser.add_argument('--artifact', type=str, default=ARTIFACT_PATH,
+                        help='Dossier de l\'artefact d\'embeddings réécrit en fin de run')
+    parser.add_argument('--no-artifact', action='store_true', help='Ne pas réécrire l\'artefact d\'embeddings')
+    parser.add_argument('--export-only', action='store_true',
+                        help='Réécrire l\'artefact depuis la base sans rien recalculer')
+    parser.add_argument('--resolution', choices=RESOLUTIONS, default=DEFAULT_RESOLUTION,
+                        help='small: vignettes images.small (bien moins d\'octets à télécharger et décoder); large: images pleine taille')
+    args = parser.parse_args()
+
+    if args.export_only:
+        export_embedding_artifact(args.artifact)
+        sys.exit(0)
+
     extractor = OptimizedFeatureExtractor()
-    extractor.process_all_cards()
+    extractor.revalidate_images = args.revalidate_images
+    extractor.resolution = args.resolution
+    download_workers = args.download_workers
+    if args.download_backend == 'httpx':
+        extractor.async_downloader = BackgroundDownloader(max_concurrency=args.max_connections, per_host_limit=args.per_host)
+        # Les threads de l'étape ne font qu'attendre la boucle asyncio: un par téléchargement simultané
+        download_workers = args.max_connections
+    if args.cv_processes > 0:
+        extractor.cv_backend = CVFeaturePool(args.cv_processes)
+        extractor.cv_backend.warm_up()
+    try:
+        extractor.process_all_cards(
+            incremental=not args.full,
+            check_content=args.check_content,
+            since=args.since,
+            resume=args.resume,
+            journal_path=args.journal,
+            download_workers=download_workers,
+            decode_workers=args.decode_workers,
+            # Un thread par processus suffit à garder le pool occupé
+            cv_workers=args.cv_processes or args.cv_workers,
+            queue_size=args.queue_size,
+        )
+    finally:
+        extractor.cv_backend.shutdown()
+        if extractor.async_downloader is not None:
+            extractor.async_downloader.close()
+    if not args.no_artifact:
+        export_embedding_artifact(args.artifact)